@@ -0,0 +1,461 @@
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass, replace
+from functools import cached_property
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from guardian.benchmark import GENERATED_AT, SimulatedClock, SyntheticFleet, generate_fleet, parse_scale
+from guardian.decision_engine import DecisionEngine
+from guardian.features import INSTANCE_TYPES, REGION_COORDINATES, distance_km
+from guardian.ml_engine import MLEngine
+from guardian.models import CloudPricing, CloudProvider, FleetWorkload, WorkloadPlacementPolicy
+from guardian.price_history import PriceHistory
+from guardian.stability import MigrationCostModel, PlacementHistory
+from guardian.tables import OptionTable, PROVIDER_CODES, PricingTable, categorical
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_STEP = 3600.0 # Seconds between replayed decision ticks
+SHARED_ARRAYS = ["timestamps", "spot", "on_demand", "latency", "cost", "predicted_latency", "confidence", "changed"]
+
+Sku = Tuple[CloudProvider, str, str]
+# Policy fields to override in every policy of the fleet, e.g. {"savings_threshold": 0.1}
+Variant = Dict[str, Any]
+
+
+def resample(timestamps: np.ndarray, values: np.ndarray, grid: np.ndarray) -> np.ndarray:
+    """
+    Last value at or before each grid point; NaN before the first sample.
+    """
+    idx = np.searchsorted(timestamps, grid, side="right") - 1
+    out = np.full(len(grid), np.nan)
+    known = idx >= 0
+    out[known] = values[idx[known]]
+    return out
+
+
+@dataclass(frozen=True)
+class PriceTimeline:
+    """
+    Recorded prices and latencies on a regular grid of decision ticks.
+    Prices are NaN at ticks where a SKU was not on offer (yet); latencies are NaN
+    where nothing was measured for a region.
+    """
+    timestamps: np.ndarray # float64 [ticks]
+    skus: List[Sku]
+    spot: np.ndarray       # float64 [ticks, skus]
+    on_demand: np.ndarray  # float64 [ticks, skus]
+    regions: List[str]
+    latency: np.ndarray    # float64 [ticks, regions], observed ms
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    @classmethod
+    def from_history(
+        cls,
+        history: PriceHistory,
+        start: float,
+        end: float,
+        step: float = DEFAULT_STEP,
+        latency: Optional[Dict[str, Tuple[np.ndarray, np.ndarray]]] = None
+    ) -> "PriceTimeline":
+        """
+        Resample every SKU in `history`, in memory or on disk, to ticks `step` seconds
+        apart. `latency` maps region -> (timestamps, ms) of recorded measurements.
+        Raises ValueError if the history holds no SKUs.
+        """
+        grid = np.arange(start, end, step, dtype=np.float64)
+        skus = history.skus()
+        if not skus:
+            raise ValueError("Price history has no SKUs to replay")
+        spot = np.full((len(grid), len(skus)), np.nan)
+        on_demand = np.full((len(grid), len(skus)), np.nan)
+        for k, sku in enumerate(skus):
+            # From the beginning, so a SKU priced before `start` is on offer at the first tick
+            series = history.range(*sku, end=end)
+            spot[:, k] = resample(series.timestamps, series.spot, grid)
+            on_demand[:, k] = resample(series.timestamps, series.on_demand, grid)
+
+        latency = latency or {}
+        regions = sorted(latency)
+        observed = np.full((len(grid), len(regions)), np.nan)
+        for r, region in enumerate(regions):
+            timestamps, ms = latency[region]
+            order = np.argsort(timestamps, kind="stable")
+            observed[:, r] = resample(np.asarray(timestamps, dtype=float)[order], np.asarray(ms, dtype=float)[order], grid)
+        return cls(timestamps=grid, skus=skus, spot=spot, on_demand=on_demand, regions=regions, latency=observed)
+
+    @cached_property
+    def catalog(self) -> PricingTable:
+        """
+        Every SKU of the timeline, without prices.
+        """
+        region_codes, region_names = categorical([sku[1] for sku in self.skus])
+        instance_codes, instance_names = categorical([sku[2] for sku in self.skus])
+        n = len(self.skus)
+        return PricingTable(
+            provider_codes=np.array([PROVIDER_CODES[sku[0]] for sku in self.skus], dtype=np.int8),
+            region_codes=region_codes,
+            instance_codes=instance_codes,
+            price_on_demand=np.full(n, np.nan),
+            price_spot=np.full(n, np.nan),
+            timestamps=np.full(n, np.datetime64(GENERATED_AT, "us")),
+            region_names=region_names,
+            instance_names=instance_names
+        )
+
+    def pricing(self, tick: int) -> Tuple[np.ndarray, PricingTable]:
+        """
+        Indices and prices of the SKUs on offer at a tick.
+        """
+        offered = np.flatnonzero(~np.isnan(self.spot[tick]) & ~np.isnan(self.on_demand[tick]))
+        table = replace(self.catalog.take(offered), price_on_demand=self.on_demand[tick, offered], price_spot=self.spot[tick, offered])
+        return offered, table
+
+
+def synthetic_timeline(pricing: Sequence[CloudPricing], days: float = 30.0, step: float = DEFAULT_STEP, seed: int = 0) -> PriceTimeline:
+    """
+    Deterministic month of spot prices and latencies for a SKU catalog: spot prices
+    random-walk between 15% and 90% of on-demand with occasional spikes, latencies
+    follow distance from HOME_COORDINATES with noise and congestion episodes.
+    """
+    rng = np.random.default_rng(seed)
+    ticks = int(days * 86400 / step)
+    start = GENERATED_AT.timestamp()
+    timestamps = start + step * np.arange(ticks, dtype=np.float64)
+
+    on_demand = np.array([p.price_on_demand for p in pricing], dtype=float)
+    ratio = np.array([p.price_spot / p.price_on_demand for p in pricing], dtype=float)
+    steps = rng.normal(0.0, 0.03, size=(ticks, len(pricing)))
+    walk = np.clip(ratio * np.exp(np.cumsum(steps, axis=0)), 0.15, 0.9)
+    spikes = rng.random((ticks, len(pricing))) < 0.01
+    spot = np.round(on_demand * np.where(spikes, np.minimum(walk * 2.5, 1.0), walk), 4)
+
+    regions = sorted({p.region for p in pricing})
+    base = np.array([20.0 + distance_km(*REGION_COORDINATES[r]) / 100.0 if r in REGION_COORDINATES else 120.0 for r in regions])
+    congestion = rng.random((ticks, len(regions))) < 0.02
+    latency = np.round(base * rng.uniform(0.9, 1.1, size=(ticks, len(regions))) * np.where(congestion, 3.0, 1.0), 1)
+
+    return PriceTimeline(
+        timestamps=timestamps,
+        skus=[(p.provider, p.region, p.instance_type) for p in pricing],
+        spot=spot,
+        on_demand=np.tile(on_demand, (ticks, 1)),
+        regions=regions,
+        latency=latency
+    )
+
+
+def parameter_grid(**axes: Sequence[Any]) -> List[Variant]:
+    """
+    Every combination of the given policy field values, e.g.
+    parameter_grid(cost_weight=[20, 40], savings_threshold=[0.1, 0.2]) -> 4 variants.
+    """
+    names = list(axes)
+    return [dict(zip(names, values)) for values in itertools.product(*(axes[name] for name in names))]
+
+
+def instance_counts(shapes: np.ndarray, skus: Sequence[Sku]) -> np.ndarray:
+    """
+    [shapes, skus] instances of each SKU a workload shape needs, as the model's
+    training data assumes. Unknown instance types count as 2 vCPU / 8 GB.
+    """
+    capacity = np.array([INSTANCE_TYPES.get(sku[2].split("-gen")[0], (2, 8, "general"))[:2] for sku in skus], dtype=float).reshape(-1, 2)
+    return np.ceil(np.maximum(shapes[:, None, 0] / capacity[None, :, 0], shapes[:, None, 1] / capacity[None, :, 1]))
+
+
+async def predict_timeline(ml_engine: MLEngine, timeline: PriceTimeline, shapes: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    Model predictions for every (tick, shape, SKU), NaN for SKUs not on offer.
+    Ticks whose prices did not change reuse the previous tick's predictions; they
+    are marked in `changed` so replays can reuse their option tables too.
+    """
+    ticks, n_shapes, n_skus = len(timeline), len(shapes), len(timeline.skus)
+    cost = np.full((ticks, n_shapes, n_skus), np.nan)
+    latency = np.full((ticks, n_shapes, n_skus), np.nan)
+    confidence = np.full((ticks, n_shapes, n_skus), np.nan)
+    changed = np.ones(ticks, dtype=bool)
+
+    for t in range(ticks):
+        if t > 0 and np.array_equal(timeline.spot[t], timeline.spot[t - 1], equal_nan=True) and np.array_equal(timeline.on_demand[t], timeline.on_demand[t - 1], equal_nan=True):
+            cost[t], latency[t], confidence[t] = cost[t - 1], latency[t - 1], confidence[t - 1]
+            changed[t] = False
+            continue
+        offered, pricing = timeline.pricing(t)
+        for s, table in enumerate(await ml_engine.predict_tables(shapes, pricing)):
+            cost[t, s, offered] = table.predicted_cost
+            latency[t, s, offered] = table.predicted_latency
+            confidence[t, s, offered] = table.confidence_score
+
+    return {"cost": cost, "predicted_latency": latency, "confidence": confidence, "changed": changed}
+
+
+@dataclass(frozen=True)
+class VariantResult:
+    variant: Variant
+    cost: float            # $ spent by the fleet over the replay
+    baseline_cost: float   # $ had no workload moved
+    migration_cost: float  # $ of one-off migration costs
+    savings: float         # baseline_cost - cost - migration_cost
+    migrations: int
+    sla_violations: int    # Workload ticks spent above the policy's max_latency_ms
+    violation_hours: float
+
+
+@dataclass
+class ReplayData:
+    """
+    Everything a replay reads: the timeline, the model's predictions and the fleet.
+    Arrays are shared read-only between worker processes through memory-mapped .npy
+    files, so a sweep holds one copy of them however many workers it runs.
+    """
+    arrays: Dict[str, np.ndarray]
+    skus: List[Sku]
+    regions: List[str]
+    shapes: np.ndarray
+    workloads: List[FleetWorkload]
+    policies: List[WorkloadPlacementPolicy]
+    owners: List[int]
+
+    def save(self, directory: Path):
+        for name in SHARED_ARRAYS:
+            np.save(directory / f"{name}.npy", self.arrays[name])
+
+    def mapped(self, directory: Path) -> "ReplayData":
+        arrays = {name: np.load(directory / f"{name}.npy", mmap_mode="r") for name in SHARED_ARRAYS}
+        return ReplayData(arrays, self.skus, self.regions, self.shapes, self.workloads, self.policies, self.owners)
+
+
+async def replay(data: ReplayData, variant: Variant, cost_model: Optional[MigrationCostModel] = None) -> VariantResult:
+    """
+    Step one policy variant through the timeline. At every tick each workload is
+    offered the predicted options through DecisionEngine, as FleetOptimizer would;
+    recommendations are applied immediately, and cost and latency are then accrued
+    at the recorded (not predicted) prices and latencies until the next tick.
+    """
+    arrays = data.arrays
+    timestamps, spot = arrays["timestamps"], arrays["spot"]
+    observed_latency, changed = arrays["latency"], arrays["changed"]
+    policies = [policy.model_copy(update=variant) for policy in data.policies]
+    cost_model = cost_model or MigrationCostModel()
+    clock = SimulatedClock(start=float(timestamps[0]))
+    engine = DecisionEngine(cost_model=cost_model, history=PlacementHistory(clock=clock.time))
+
+    codes = np.array([PROVIDER_CODES[sku[0]] for sku in data.skus], dtype=np.int8)
+    sku_regions = np.array([sku[1] for sku in data.skus], dtype=object)
+    sku_types = np.array([sku[2] for sku in data.skus], dtype=object)
+    sku_index = {sku: k for k, sku in enumerate(data.skus)}
+    region_index = {region: r for r, region in enumerate(data.regions)}
+    sku_region = np.array([region_index.get(sku[1], -1) for sku in data.skus])
+    instances = instance_counts(data.shapes, data.skus)
+
+    resources = np.array([[w.cpu_cores, w.memory_gb] for w in data.workloads], dtype=float).reshape(-1, 2)
+    shape_of = [int(np.flatnonzero((data.shapes == row).all(axis=1))[0]) for row in resources]
+    states = [w.current_state.model_copy() for w in data.workloads]
+    baseline = np.array([w.current_state.current_cost for w in data.workloads], dtype=float)
+    home_region = [region_index.get(w.current_state.current_region, -1) for w in data.workloads]
+    placement = [-1] * len(data.workloads) # SKU each workload runs on; -1 while still where it started
+
+    # Each tick's decisions hold until the next tick; the last one for a regular step
+    durations = np.diff(timestamps, append=timestamps[-1] + (timestamps[-1] - timestamps[-2] if len(timestamps) > 1 else DEFAULT_STEP))
+    tables: List[Tuple[OptionTable, np.ndarray]] = []
+    spent = migration_cost = violation_hours = 0.0
+    migrations = violations = 0
+
+    for t in range(len(timestamps)):
+        clock.now, dt = float(timestamps[t]), float(durations[t])
+        if changed[t] or not tables:
+            tables = []
+            for s in range(len(data.shapes)):
+                offered = np.flatnonzero(~np.isnan(arrays["cost"][t, s]))
+                tables.append((OptionTable(
+                    cloud_codes=codes[offered],
+                    regions=sku_regions[offered],
+                    predicted_cost=np.asarray(arrays["cost"][t, s, offered]),
+                    predicted_latency=np.asarray(arrays["predicted_latency"][t, s, offered]),
+                    confidence_score=np.asarray(arrays["confidence"][t, s, offered]),
+                    instance_types=sku_types[offered]
+                ), offered))
+
+        for w, workload in enumerate(data.workloads):
+            state, s, k = states[w], shape_of[w], placement[w]
+            if k >= 0:
+                price = spot[t, k]
+                if not np.isnan(price): # A withdrawn SKU keeps its last price
+                    state.current_cost = float(instances[s, k] * price * 24)
+                r = sku_region[k]
+            else:
+                r = home_region[w]
+            if r >= 0 and not np.isnan(observed_latency[t, r]):
+                state.current_latency = float(observed_latency[t, r])
+
+            policy = policies[data.owners[w]]
+            table, offered = tables[s]
+            recommendation = await engine.generate_recommendation(state, table, policy, data_gb=workload.data_gb)
+            if recommendation is not None:
+                option = recommendation.recommended_option
+                k = sku_index[(option.cloud, option.region, option.instance_type)]
+                i = int(np.searchsorted(offered, k))
+                migration_cost += float(cost_model.cost(state, table, workload.data_gb)[i])
+                migrations += 1
+                engine.history.record_move(state.namespace, state.workload_name, option.cloud, option.region)
+                placement[w] = k
+                state.current_cloud, state.current_region = option.cloud, option.region
+                state.current_cost = float(instances[s, k] * spot[t, k] * 24)
+                r = sku_region[k]
+                state.current_latency = float(observed_latency[t, r]) if r >= 0 and not np.isnan(observed_latency[t, r]) else option.predicted_latency
+
+            spent += state.current_cost * dt / 86400
+            if state.current_latency > policy.max_latency_ms:
+                violations += 1
+                violation_hours += dt / 3600
+
+    baseline_cost = float(baseline.sum() * durations.sum() / 86400)
+    return VariantResult(
+        variant=dict(variant),
+        cost=round(spent, 2),
+        baseline_cost=round(baseline_cost, 2),
+        migration_cost=round(migration_cost, 2),
+        savings=round(baseline_cost - spent - migration_cost, 2),
+        migrations=migrations,
+        sla_violations=violations,
+        violation_hours=round(violation_hours, 2)
+    )
+
+
+# Per-process replay data, set up once by the pool initializer
+_worker_data: Optional[ReplayData] = None
+
+
+def _init_worker(data: ReplayData, directory: str):
+    global _worker_data
+    _worker_data = data.mapped(Path(directory))
+
+
+def _replay_chunk(variants: List[Variant]) -> List[VariantResult]:
+    async def run():
+        return [await replay(_worker_data, variant) for variant in variants]
+    return asyncio.run(run())
+
+
+async def backtest(
+    fleet: SyntheticFleet,
+    timeline: PriceTimeline,
+    variants: Sequence[Variant],
+    ml_engine: Optional[MLEngine] = None,
+    processes: Optional[int] = None,
+    chunksize: Optional[int] = None
+) -> List[VariantResult]:
+    """
+    Replay `timeline` for the fleet's workloads and policies once per variant.
+
+    Predictions do not depend on the policy, so the model runs once up front; the
+    variants are then replayed in a process pool (`processes=0` replays in this
+    process), each worker reading the shared arrays through memory maps. Results
+    come back in variant order. The fleet's own pricing is ignored in favor of the
+    timeline.
+    """
+    if ml_engine is None:
+        ml_engine = MLEngine()
+    shapes = np.unique(np.array([[w.cpu_cores, w.memory_gb] for w in fleet.workloads], dtype=float).reshape(-1, 2), axis=0)
+
+    started = time.perf_counter()
+    predictions = await predict_timeline(ml_engine, timeline, shapes)
+    logger.info("Predicted %s ticks x %s shapes x %s SKUs in %.1fs", len(timeline), len(shapes), len(timeline.skus), time.perf_counter() - started)
+
+    arrays = dict(predictions, timestamps=timeline.timestamps, spot=timeline.spot, on_demand=timeline.on_demand, latency=timeline.latency)
+    data = ReplayData(arrays, timeline.skus, timeline.regions, shapes, fleet.workloads, fleet.policies, fleet.owners)
+    variants = list(variants)
+    processes = min(os.cpu_count() or 1, len(variants)) if processes is None else processes
+
+    started = time.perf_counter()
+    if processes == 0:
+        results = [await replay(data, variant) for variant in variants]
+    else:
+        chunksize = chunksize or max(1, len(variants) // (processes * 4))
+        chunks = [variants[i:i + chunksize] for i in range(0, len(variants), chunksize)]
+        with tempfile.TemporaryDirectory(prefix="guardian-backtest-") as directory:
+            data.save(Path(directory))
+            # The initializer only carries the fleet; arrays are dropped and re-mapped from disk
+            shared = ReplayData({}, data.skus, data.regions, shapes, data.workloads, data.policies, data.owners)
+            with ProcessPoolExecutor(max_workers=processes, initializer=_init_worker, initargs=(shared, directory)) as pool:
+                loop = asyncio.get_running_loop()
+                chunk_results = await asyncio.gather(*(loop.run_in_executor(pool, _replay_chunk, chunk) for chunk in chunks))
+        results = [result for chunk in chunk_results for result in chunk]
+    logger.info("Replayed %s variants in %.1fs", len(variants), time.perf_counter() - started)
+    return results
+
+
+def load_latency(path: str) -> Dict[str, Tuple[np.ndarray, np.ndarray]]:
+    """
+    Recorded latencies from JSON: {"region": [[timestamp, ms], ...], ...}.
+    """
+    with open(path) as f:
+        recorded = json.load(f)
+    return {
+        region: (np.array([s[0] for s in samples], dtype=float), np.array([s[1] for s in samples], dtype=float))
+        for region, samples in recorded.items()
+    }
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Replay pricing history through the decision pipeline for a grid of policy variants.")
+    parser.add_argument("--fleet", type=parse_scale, default=parse_scale("200x4x100"),
+                        help="Synthetic fleet as WORKLOADSxPOLICIESxSKUS (default: 200x4x100)")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the synthetic fleet and timeline")
+    parser.add_argument("--history", help="PriceHistory directory to replay instead of synthetic prices")
+    parser.add_argument("--latency", help="Recorded latencies as JSON {region: [[timestamp, ms], ...]}")
+    parser.add_argument("--days", type=float, default=30.0, help="Days of history to replay")
+    parser.add_argument("--step", type=float, default=DEFAULT_STEP, help="Seconds between decision ticks")
+    parser.add_argument("--cost-weight", type=int, nargs="+", default=[20, 40, 60, 80])
+    parser.add_argument("--latency-weight", type=int, nargs="+", default=[10, 20, 40, 60])
+    parser.add_argument("--savings-threshold", type=float, nargs="+", default=[0.05, 0.1, 0.2, 0.3])
+    parser.add_argument("--processes", type=int, help="Worker processes (default: one per core, 0: none)")
+    parser.add_argument("--output", help="Write JSON results to this file instead of stdout")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING, format="%(message)s")
+    fleet = generate_fleet(*args.fleet, seed=args.seed)
+    if args.history:
+        history = PriceHistory(args.history)
+        end = time.time()
+        try:
+            timeline = PriceTimeline.from_history(history, end - args.days * 86400, end, args.step, load_latency(args.latency) if args.latency else None)
+        except ValueError as e:
+            parser.error(f"{args.history}: {e}")
+    else:
+        timeline = synthetic_timeline(fleet.pricing, days=args.days, step=args.step, seed=args.seed)
+
+    variants = parameter_grid(cost_weight=args.cost_weight, latency_weight=args.latency_weight, savings_threshold=args.savings_threshold)
+    print(f"Replaying {len(timeline)} ticks for {len(fleet.workloads)} workloads x {len(variants)} variants...", file=sys.stderr)
+    results = asyncio.run(backtest(fleet, timeline, variants, processes=args.processes))
+
+    ranked = sorted(results, key=lambda r: (r.sla_violations, -r.savings))
+    output = json.dumps({
+        "ticks": len(timeline),
+        "step_seconds": args.step,
+        "workloads": len(fleet.workloads),
+        "results": [asdict(r) for r in ranked],
+    }, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,378 @@
+import argparse
+import asyncio
+import heapq
+import itertools
+import json
+import logging
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Awaitable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from guardian.decision_engine import DecisionEngine
+from guardian.features import INSTANCE_TYPES
+from guardian.metrics_collector import MetricsCollector
+from guardian.migration_orchestrator import MigrationOrchestrator
+from guardian.ml_engine import MLEngine
+from guardian.models import CloudPricing, CloudProvider, FleetWorkload, PlacementRecommendation, WorkloadCurrentState, WorkloadPlacementPolicy
+from guardian.stability import MigrationCostModel, PlacementHistory
+from guardian.tables import PricingTable
+
+logger = logging.getLogger(__name__)
+
+RESULTS_FORMAT_VERSION = 1
+DEFAULT_SCALES = ["100x4x50", "1000x16x200", "5000x64x500"] # workloads x policies x SKUs
+STAGES = ["collect", "predict", "decide", "orchestrate"]
+
+# Known regions and instance types per provider; see features.REGION_COORDINATES
+REGIONS: Dict[CloudProvider, List[str]] = {
+    CloudProvider.AWS: ["us-east-1", "us-east-2", "us-west-1", "us-west-2", "eu-west-1", "eu-central-1", "ap-southeast-1", "ap-northeast-1"],
+    CloudProvider.GCP: ["us-central1", "us-east1", "us-east4", "us-west1", "europe-west1", "europe-west4", "asia-east1", "asia-southeast1"],
+    CloudProvider.AZURE: ["eastus", "eastus2", "westus", "westus2", "centralus", "northeurope", "westeurope", "southeastasia"],
+}
+INSTANCES: Dict[CloudProvider, List[str]] = {
+    CloudProvider.AWS: ["m5.large", "m5.xlarge", "m5.4xlarge", "c5.large", "c5.xlarge", "r5.large"],
+    CloudProvider.GCP: ["e2-standard-2", "e2-standard-4", "n2-standard-16", "c2-standard-4", "n2-highmem-2"],
+    CloudProvider.AZURE: ["D2s_v3", "D4s_v3", "D16s_v3", "F2s_v2", "E2s_v3"],
+}
+# Fixed so generated fleets compare equal across runs
+GENERATED_AT = datetime(2024, 1, 1)
+SHAPES = [(0.5, 1.0), (1.0, 2.0), (2.0, 4.0), (2.0, 8.0), (4.0, 16.0), (8.0, 32.0), (16.0, 64.0)]
+
+
+@dataclass
+class SyntheticFleet:
+    """
+    Deterministic fleet for benchmarks: the SKUs on offer, the policies, and the
+    workloads each policy matches.
+    """
+    pricing: List[CloudPricing]
+    policies: List[WorkloadPlacementPolicy]
+    workloads: List[FleetWorkload]
+    owners: List[int] # workload -> index of its policy
+
+
+def generate_fleet(workloads: int, policies: int, skus: int, seed: int = 0) -> SyntheticFleet:
+    """
+    N workloads spread round-robin over M policies, with K SKUs across the known
+    regions. The same arguments always produce the same fleet.
+    """
+    rng = np.random.default_rng(seed)
+
+    catalog = [
+        (provider, region, instance_type)
+        for provider in REGIONS
+        for region in REGIONS[provider]
+        for instance_type in INSTANCES[provider]
+    ]
+    order = rng.permutation(len(catalog))
+    pricing = []
+    for k in range(skus):
+        provider, region, instance_type = catalog[order[k % len(catalog)]]
+        generation = k // len(catalog)
+        if generation:
+            # Past the catalog, unknown instance generations (the model sees NaN shape features)
+            instance_type = f"{instance_type}-gen{generation}"
+        vcpu, memory, _ = INSTANCE_TYPES.get(instance_type.split("-gen")[0], (2, 8, "general"))
+        on_demand = round((0.04 * vcpu + 0.005 * memory) * rng.uniform(0.8, 1.3), 4)
+        pricing.append(CloudPricing(
+            provider=provider, region=region, instance_type=instance_type,
+            price_on_demand=on_demand, price_spot=round(on_demand * rng.uniform(0.2, 0.5), 4),
+            timestamp=GENERATED_AT
+        ))
+
+    providers = list(REGIONS)
+    fleet_policies = []
+    for _ in range(policies):
+        allowed = [p for p in providers if rng.random() < 0.7] or [providers[int(rng.integers(len(providers)))]]
+        fleet_policies.append(WorkloadPlacementPolicy(
+            workload_selector={},
+            cost_weight=int(rng.integers(20, 70)),
+            latency_weight=int(rng.integers(10, 50)),
+            savings_threshold=float(rng.uniform(0.05, 0.3)),
+            max_latency_ms=int(rng.integers(60, 200)),
+            allowed_clouds=allowed
+        ))
+
+    fleet_workloads = []
+    for i in range(workloads):
+        provider = providers[int(rng.integers(len(providers)))]
+        region = REGIONS[provider][int(rng.integers(len(REGIONS[provider])))]
+        cpu, memory = SHAPES[int(rng.integers(len(SHAPES)))]
+        fleet_workloads.append(FleetWorkload(
+            current_state=WorkloadCurrentState(
+                workload_name=f"workload-{i}",
+                namespace=f"ns-{i % policies}",
+                current_cloud=provider,
+                current_region=region,
+                current_cost=round(max(cpu / 2, memory / 8) * 0.1 * 24 * rng.uniform(0.6, 1.6), 2),
+                current_latency=float(rng.uniform(20, 150))
+            ),
+            cpu_cores=cpu,
+            memory_gb=memory,
+            data_gb=float(rng.choice([0.0, 10.0, 100.0, 500.0]))
+        ))
+
+    return SyntheticFleet(pricing=pricing, policies=fleet_policies, workloads=fleet_workloads, owners=[i % policies for i in range(workloads)])
+
+
+class SyntheticPricingSource:
+    name = "synthetic"
+
+    def __init__(self, pricing: List[CloudPricing]):
+        self.table = PricingTable.from_pricing(pricing)
+        self.ttl = float("inf")
+        self.timeout = None
+
+    async def fetch(self) -> PricingTable:
+        return self.table
+
+    def fallback(self) -> PricingTable:
+        return PricingTable.from_rows([])
+
+    async def close(self):
+        pass
+
+
+class SimulatedClock:
+    """
+    Discrete-event clock for code that waits through an injectable `sleep`.
+
+    Sleeps never wait in real time: `run()` lets every task proceed until it is
+    blocked, then jumps straight to the earliest pending wake-up. Concurrent sleeps
+    overlap as they would in real time, so `now` ends at the simulated makespan.
+    """
+
+    def __init__(self, start: float = 0.0, settle_rounds: int = 8):
+        self.now = start
+        self.settle_rounds = settle_rounds # Event loop passes for woken tasks to reach their next sleep
+        self._timers: List[Tuple[float, int, asyncio.Future]] = []
+        self._seq = itertools.count()
+
+    def time(self) -> float:
+        return self.now
+
+    async def sleep(self, seconds: float):
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._timers, (self.now + max(seconds, 0.0), next(self._seq), future))
+        await future
+
+    async def run(self, *aws: Awaitable[Any]) -> List[Any]:
+        tasks = [asyncio.ensure_future(aw) for aw in aws]
+        while not all(task.done() for task in tasks):
+            for _ in range(self.settle_rounds):
+                await asyncio.sleep(0)
+            if not self._timers:
+                continue
+            self.now = max(self.now, self._timers[0][0])
+            while self._timers and self._timers[0][0] <= self.now:
+                _, _, future = heapq.heappop(self._timers)
+                if not future.cancelled():
+                    future.set_result(None)
+        return [task.result() for task in tasks]
+
+
+@dataclass
+class StageTimings:
+    samples: Dict[str, List[float]] = field(default_factory=lambda: {stage: [] for stage in STAGES})
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        summary = {}
+        for stage, values in self.samples.items():
+            if not values:
+                continue
+            ms = np.asarray(values) * 1000.0
+            summary[stage] = {
+                "count": len(ms),
+                "mean_ms": round(float(ms.mean()), 4),
+                "p50_ms": round(float(np.percentile(ms, 50)), 4),
+                "p95_ms": round(float(np.percentile(ms, 95)), 4),
+                "p99_ms": round(float(np.percentile(ms, 99)), 4),
+                "total_ms": round(float(ms.sum()), 4),
+            }
+        return summary
+
+
+async def run_pipeline(fleet: SyntheticFleet, ml_engine: MLEngine, timings: StageTimings, clock: SimulatedClock) -> Dict[str, Any]:
+    """
+    One pass of collect -> predict -> decide -> orchestrate over the fleet, the way
+    FleetOptimizer and the migration queue drive it. Orchestration runs on the
+    simulated clock, so migrations cost no real time.
+    """
+    collector = MetricsCollector(sources=[SyntheticPricingSource(fleet.pricing)])
+    decision_engine = DecisionEngine(
+        cost_model=MigrationCostModel(),
+        history=PlacementHistory(clock=clock.time),
+        price_trend=collector.price_trend,
+        trend_ratios=collector.trend_ratios
+    )
+    orchestrator = MigrationOrchestrator(sleep=clock.sleep)
+
+    start = time.perf_counter()
+    snapshot = await collector.refresh(force=True)
+    timings.samples["collect"].append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    resources = np.array([[w.cpu_cores, w.memory_gb] for w in fleet.workloads], dtype=float)
+    shapes, shape_index = np.unique(resources, axis=0, return_inverse=True)
+    tables = await ml_engine.predict_tables(shapes, snapshot.table, snapshot_version=snapshot.version)
+    timings.samples["predict"].append(time.perf_counter() - start)
+
+    recommendations: List[PlacementRecommendation] = []
+    for workload, owner, shape in zip(fleet.workloads, fleet.owners, shape_index.reshape(-1)):
+        start = time.perf_counter()
+        recommendation = await decision_engine.generate_recommendation(
+            workload.current_state, tables[shape], fleet.policies[owner], data_gb=workload.data_gb
+        )
+        timings.samples["decide"].append(time.perf_counter() - start)
+        if recommendation:
+            recommendations.append(recommendation)
+
+    async def migrate(recommendation: PlacementRecommendation) -> bool:
+        start = time.perf_counter()
+        succeeded = await orchestrator.execute_migration(recommendation)
+        timings.samples["orchestrate"].append(time.perf_counter() - start)
+        if succeeded:
+            option = recommendation.recommended_option
+            decision_engine.history.record_move(recommendation.namespace, recommendation.workload_name, option.cloud, option.region)
+        return succeeded
+
+    simulated_start = clock.now
+    results = await clock.run(*(migrate(r) for r in recommendations))
+    await collector.close()
+    return {
+        "recommendations": len(recommendations),
+        "migrations_succeeded": sum(results),
+        "simulated_migration_seconds": round(clock.now - simulated_start, 3),
+    }
+
+
+async def benchmark_scale(workloads: int, policies: int, skus: int, repeats: int = 3, seed: int = 0, ml_engine: Optional[MLEngine] = None) -> Dict[str, Any]:
+    """
+    Benchmark one fleet size: `repeats` timed passes, then one pass under
+    tracemalloc for peak memory (kept separate since tracing slows everything down).
+    """
+    fleet = generate_fleet(workloads, policies, skus, seed=seed)
+    if ml_engine is None:
+        ml_engine = MLEngine()
+    await ml_engine.ensure_trained() # Training is not part of the pipeline being measured
+
+    timings = StageTimings()
+    start = time.perf_counter()
+    for _ in range(repeats):
+        outcome = await run_pipeline(fleet, ml_engine, timings, SimulatedClock())
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    try:
+        await run_pipeline(fleet, ml_engine, StageTimings(), SimulatedClock())
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "workloads": workloads,
+        "policies": policies,
+        "skus": skus,
+        "repeats": repeats,
+        "throughput_workloads_per_s": round(workloads * repeats / elapsed, 2),
+        "stages": timings.summary(),
+        "peak_memory_mb": round(peak / 2 ** 20, 2),
+        **outcome,
+    }
+
+
+def parse_scale(scale: str) -> Tuple[int, int, int]:
+    try:
+        workloads, policies, skus = (int(part) for part in scale.lower().split("x"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Scale must look like 1000x16x200 (workloads x policies x SKUs), got {scale!r}")
+    return workloads, policies, skus
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """
+    Regressions of `results` against a baseline run: stage p50 latencies or
+    throughput more than `tolerance` worse at the same scale.
+    """
+    def key(result):
+        return result["workloads"], result["policies"], result["skus"]
+
+    previous = {key(result): result for result in baseline.get("results", [])}
+    regressions = []
+    for result in results["results"]:
+        before = previous.get(key(result))
+        if before is None:
+            continue
+        scale = "x".join(str(n) for n in key(result))
+        for stage, stats in result["stages"].items():
+            old = before["stages"].get(stage, {}).get("p50_ms")
+            if old and stats["p50_ms"] > old * (1 + tolerance):
+                regressions.append(f"{scale} {stage} p50 {old:.3f}ms -> {stats['p50_ms']:.3f}ms")
+        if result["throughput_workloads_per_s"] < before["throughput_workloads_per_s"] * (1 - tolerance):
+            regressions.append(f"{scale} throughput {before['throughput_workloads_per_s']} -> {result['throughput_workloads_per_s']} workloads/s")
+    return regressions
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run_benchmarks(scales: Sequence[Tuple[int, int, int]], repeats: int = 3, seed: int = 0) -> Dict[str, Any]:
+    ml_engine = MLEngine()
+    results = []
+    for workloads, policies, skus in scales:
+        print(f"Benchmarking {workloads} workloads x {policies} policies x {skus} SKUs...", file=sys.stderr)
+        results.append(await benchmark_scale(workloads, policies, skus, repeats=repeats, seed=seed, ml_engine=ml_engine))
+    return {
+        "format": RESULTS_FORMAT_VERSION,
+        "commit": git_commit(),
+        "created_at": datetime.utcnow().isoformat(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "seed": seed,
+        "results": results,
+    }
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the Guardian placement pipeline on synthetic fleets.")
+    parser.add_argument("--scales", nargs="+", type=parse_scale, default=[parse_scale(s) for s in DEFAULT_SCALES],
+                        help="Fleet sizes as WORKLOADSxPOLICIESxSKUS (default: %(default)s)")
+    parser.add_argument("--repeats", type=int, default=3, help="Timed passes per scale")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the synthetic fleet generator")
+    parser.add_argument("--output", help="Write JSON results to this file instead of stdout")
+    parser.add_argument("--baseline", help="JSON results of an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed slowdown vs. the baseline before failing")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING, format="%(message)s")
+    results = asyncio.run(run_benchmarks(args.scales, repeats=args.repeats, seed=args.seed))
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
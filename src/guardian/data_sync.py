@@ -0,0 +1,207 @@
+import asyncio
+import hashlib
+import logging
+import os
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 4 * 1024 * 1024
+# Stop delta passes once a pass copies no more than this; the rest goes in the frozen final pass
+DEFAULT_CONVERGE_BYTES = 64 * 1024 * 1024
+DEFAULT_MAX_PASSES = 8
+# Writes within this window of hashing a file may not change its mtime (coarse
+# filesystem clocks), so such files are always re-hashed instead of trusting stat()
+RACY_WINDOW_NS = 1_000_000_000
+
+
+@dataclass
+class FileManifest:
+    """
+    A source file as of the last time it was copied.
+    """
+    size: int
+    mtime_ns: int
+    hashed_at_ns: int
+    chunks: List[bytes]
+
+
+@dataclass
+class SyncPass:
+    files_scanned: int = 0
+    files_changed: int = 0
+    files_deleted: int = 0
+    chunks_copied: int = 0
+    bytes_scanned: int = 0 # Read and hashed
+    bytes_copied: int = 0 # Written to the target, i.e. egress
+    seconds: float = 0.0
+
+
+@dataclass
+class SyncReport:
+    passes: List[SyncPass] = field(default_factory=list)
+
+    @property
+    def bytes_copied(self) -> int:
+        return sum(p.bytes_copied for p in self.passes)
+
+
+class DeltaSync:
+    """
+    Incrementally mirrors a source directory into a target directory.
+
+    Files are compared chunk by chunk using content hashes and only changed chunks
+    are written. A migration first calls converge(), which does the bulk copy and
+    then delta passes while the workload keeps writing, until a pass copies little
+    enough. After writes are frozen, final_sync() copies what is left, so the freeze
+    lasts as long as copying the writes since the last pass, not the whole dataset.
+
+    Files whose size and mtime have not changed since they were hashed are skipped
+    without reading them. The target is hashed once, on the first pass, so a sync
+    into a partially copied target (e.g. after a restart) only fills in the gaps.
+    """
+
+    def __init__(
+        self,
+        source: Union[str, Path],
+        target: Union[str, Path],
+        chunk_size: int = CHUNK_SIZE,
+        converge_bytes: int = DEFAULT_CONVERGE_BYTES,
+        max_passes: int = DEFAULT_MAX_PASSES
+    ):
+        self.source = Path(source)
+        self.target = Path(target)
+        self.chunk_size = chunk_size
+        self.converge_bytes = converge_bytes
+        self.max_passes = max_passes
+        self.report = SyncReport()
+
+        self._source: Dict[str, FileManifest] = {} # relative path -> what was last copied
+        self._target: Optional[Dict[str, List[bytes]]] = None # relative path -> chunk hashes on the target
+
+    async def converge(self) -> List[SyncPass]:
+        """
+        Bulk copy, then delta passes until a pass copies at most `converge_bytes`, stops
+        shrinking (writes outpace the copy) or `max_passes` is reached.
+        """
+        passes: List[SyncPass] = []
+        while True:
+            result = await asyncio.to_thread(self.sync_pass)
+            passes.append(result)
+            if result.bytes_copied <= self.converge_bytes or len(passes) >= self.max_passes:
+                break
+            if len(passes) > 1 and result.bytes_copied >= passes[-2].bytes_copied:
+                break
+        return passes
+
+    async def final_sync(self) -> SyncPass:
+        """
+        Last pass, run while writes to the source are frozen.
+        """
+        return await asyncio.to_thread(self.sync_pass)
+
+    def sync_pass(self) -> SyncPass:
+        started = time.monotonic()
+        stats = SyncPass()
+        self.target.mkdir(parents=True, exist_ok=True)
+        if self._target is None:
+            self._target = self._scan_target(stats)
+
+        seen = set()
+        for rel, path in self._walk(self.source):
+            try:
+                st = path.stat()
+            except FileNotFoundError:
+                continue # Deleted while walking; removed from the target below
+            seen.add(rel)
+            stats.files_scanned += 1
+            known = self._source.get(rel)
+            if (
+                known is not None
+                and rel in self._target
+                and known.size == st.st_size
+                and known.mtime_ns == st.st_mtime_ns
+                and st.st_mtime_ns < known.hashed_at_ns - RACY_WINDOW_NS
+            ):
+                continue
+            try:
+                self._copy_file(rel, path, st, stats)
+            except FileNotFoundError:
+                seen.discard(rel)
+
+        for rel in set(self._target) - seen:
+            (self.target / rel).unlink(missing_ok=True)
+            self._target.pop(rel)
+            self._source.pop(rel, None)
+            stats.files_deleted += 1
+
+        stats.seconds = time.monotonic() - started
+        self.report.passes.append(stats)
+        logger.info(
+            "Sync pass %s: %s bytes in %s chunks (%s files changed, %s deleted) in %.2fs",
+            len(self.report.passes), stats.bytes_copied, stats.chunks_copied, stats.files_changed, stats.files_deleted, stats.seconds
+        )
+        return stats
+
+    def _copy_file(self, rel: str, path: Path, st: os.stat_result, stats: SyncPass):
+        hashed_at = time.time_ns()
+        dest = self.target / rel
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        target_chunks = self._target.get(rel, [])
+
+        chunks: List[bytes] = []
+        changed = False
+        with path.open("rb") as src, dest.open("r+b" if dest.exists() else "w+b") as dst:
+            offset = 0
+            while True:
+                data = src.read(self.chunk_size)
+                if not data:
+                    break
+                digest = hashlib.blake2b(data, digest_size=16).digest()
+                stats.bytes_scanned += len(data)
+                index = len(chunks)
+                if index >= len(target_chunks) or target_chunks[index] != digest:
+                    dst.seek(offset)
+                    dst.write(data)
+                    stats.chunks_copied += 1
+                    stats.bytes_copied += len(data)
+                    changed = True
+                chunks.append(digest)
+                offset += len(data)
+
+            if changed or len(chunks) != len(target_chunks) or rel not in self._target:
+                dst.truncate(offset)
+                changed = True
+
+        os.chmod(dest, st.st_mode & 0o7777)
+        if changed:
+            stats.files_changed += 1
+        self._target[rel] = chunks
+        self._source[rel] = FileManifest(size=st.st_size, mtime_ns=st.st_mtime_ns, hashed_at_ns=hashed_at, chunks=chunks)
+
+    def _scan_target(self, stats: SyncPass) -> Dict[str, List[bytes]]:
+        manifest = {}
+        for rel, path in self._walk(self.target):
+            chunks = []
+            with path.open("rb") as f:
+                while True:
+                    data = f.read(self.chunk_size)
+                    if not data:
+                        break
+                    chunks.append(hashlib.blake2b(data, digest_size=16).digest())
+                    stats.bytes_scanned += len(data)
+            manifest[rel] = chunks
+        return manifest
+
+    def _walk(self, root: Path) -> Iterator[Tuple[str, Path]]:
+        """
+        Regular files under root as (relative path, path); symlinks and special files are skipped.
+        """
+        for dirpath, _, filenames in os.walk(root):
+            for filename in filenames:
+                path = Path(dirpath) / filename
+                if path.is_file() and not path.is_symlink():
+                    yield path.relative_to(root).as_posix(), path
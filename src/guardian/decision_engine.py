@@ -1,93 +1,199 @@
+import dataclasses
 import logging
-from typing import List, Optional
+import numpy as np
+from typing import Callable, List, Optional, Union
+from guardian.metrics_collector import PriceTrend
 from guardian.models import (
-    WorkloadCurrentState, 
-    PlacementOption, 
-    WorkloadPlacementPolicy, 
+    CloudProvider,
+    WorkloadCurrentState,
+    PlacementOption,
+    WorkloadPlacementPolicy,
     PlacementRecommendation
 )
+from guardian.stability import MigrationCostModel, PlacementHistory
+from guardian.tables import OptionTable, PricingTable, PROVIDER_CODES, PROVIDERS
 
 logger = logging.getLogger(__name__)
 
+# Number of ranked options kept on a recommendation (best + fallbacks)
+DEFAULT_TOP_K = 5
+
+# (provider, region, instance_type) -> recent spot price trend of that SKU
+TrendLookup = Callable[[CloudProvider, str, str], Optional[PriceTrend]]
+# pricing table -> PriceTrend.ratio of each of its rows, computed once per table
+TrendRatios = Callable[[PricingTable], np.ndarray]
+
 class DecisionEngine:
-    def __init__(self):
+    """
+    Picks the best placement for a workload under its policy.
+
+    Given a migration cost model, placement history and/or price trends, decisions
+    are cost-aware: options are compared at their recent average price plus the
+    migration cost amortized over the policy's dwell time, workloads are left
+    alone during their cooldown, and moving a workload Guardian already moved
+    needs `hysteresis` more savings. This keeps spot price flapping from making
+    workloads ping-pong between clouds. Moves enter the history once they have
+    actually happened (see MigrationQueue), not when they are recommended.
+    """
+
+    def __init__(
+        self,
+        top_k: int = DEFAULT_TOP_K,
+        cost_model: Optional[MigrationCostModel] = None,
+        history: Optional[PlacementHistory] = None,
+        price_trend: Optional[TrendLookup] = None,
+        trend_ratios: Optional[TrendRatios] = None
+    ):
+        self.top_k = top_k
+        self.cost_model = cost_model
+        self.history = history
+        self.price_trend = price_trend
+        self.trend_ratios = trend_ratios
         logger.info("DecisionEngine initialized")
 
     async def generate_recommendation(
-        self, 
-        current_state: WorkloadCurrentState, 
-        options: List[PlacementOption], 
-        policy: WorkloadPlacementPolicy
+        self,
+        current_state: WorkloadCurrentState,
+        options: Union[List[PlacementOption], OptionTable],
+        policy: WorkloadPlacementPolicy,
+        data_gb: float = 0.0
     ) -> Optional[PlacementRecommendation]:
         """
         Evaluate options against the policy and current state to recommend a migration.
         Returns None if staying put is the best option or no option meets criteria.
+        The recommendation carries the next best options meeting the savings threshold
+        as ranked alternatives. In cost-aware mode savings are net of the amortized
+        migration cost of moving `data_gb` of data.
         """
-        logger.info(f"Evaluating {len(options)} placement options for {current_state.workload_name}")
-        
-        best_option: Optional[PlacementOption] = None
-        max_score = -1.0
-        
-        # Calculate current utility score
-        current_score = self._calculate_score(
-            current_state.current_cost, 
-            current_state.current_latency, 
-            policy
-        )
-        
-        valid_options = []
-        
-        for option in options:
-            # 1. Compliance Check
-            if option.cloud not in policy.allowed_clouds:
-                continue
-                
-            # 2. Latency Constraint Check
-            if option.predicted_latency > policy.max_latency_ms:
-                continue
-            
-            score = self._calculate_score(option.predicted_cost, option.predicted_latency, policy)
-            
-            if score > max_score:
-                max_score = score
-                best_option = option
-                
-        if not best_option:
-            logger.info("No valid placement options found matching policy constraints.")
+        table = options if isinstance(options, OptionTable) else OptionTable.from_options(options)
+        logger.debug("Evaluating %s placement options for %s", len(table), current_state.workload_name)
+
+        if self.history is not None and self.history.in_cooldown(current_state.namespace, current_state.workload_name, policy.cooldown_minutes * 60):
+            logger.debug("%s was moved recently; cooling down", current_state.workload_name)
+            return None
+
+        # Rank on effective costs (trend-adjusted, plus amortized migration cost) when cost-aware
+        effective = self.effective_costs(current_state, table, policy, data_gb)
+        ranking = dataclasses.replace(table, predicted_cost=effective)
+        ranked = self.rank_options(ranking, policy, self.top_k)
+
+        if len(ranked) == 0:
+            logger.debug("No valid placement options found matching policy constraints.")
             return None
-            
-        # 3. Improvement Threshold Check
+
+        best_option = table.option(ranked[0])
+
+        # 4. Improvement Threshold Check
         # Does the best option offer enough savings?
-        estimated_savings = current_state.current_cost - best_option.predicted_cost
+        estimated_savings = current_state.current_cost - effective[ranked[0]]
         savings_percent = estimated_savings / current_state.current_cost if current_state.current_cost > 0 else 0
-        
-        logger.info(f"Best option: {best_option.cloud}/{best_option.region}. Savings: {savings_percent:.1%}")
-        
-        if savings_percent >= policy.savings_threshold:
+        threshold = policy.savings_threshold
+        if self.history is not None and self.history.has_moved(current_state.namespace, current_state.workload_name):
+            threshold += policy.hysteresis
+
+        logger.debug("Best option: %s/%s. Savings: %.1f%%", best_option.cloud, best_option.region, savings_percent * 100)
+
+        if savings_percent >= threshold:
+             alternatives = [
+                 table.option(i) for i in ranked[1:]
+                 if self._savings_percent(current_state, effective[i]) >= threshold
+             ]
              return PlacementRecommendation(
                  workload_name=current_state.workload_name,
                  namespace=current_state.namespace,
                  current_state=current_state,
                  recommended_option=best_option,
-                 estimated_savings=round(estimated_savings, 2)
+                 estimated_savings=round(estimated_savings, 2),
+                 alternatives=alternatives
              )
-        
+
         # Also migrate if latency is significantly better? (Optional logic extension)
-        
+
         return None
 
-    def _calculate_score(self, cost: float, latency: float, policy: WorkloadPlacementPolicy) -> float:
+    def effective_costs(self, current_state: WorkloadCurrentState, table: OptionTable, policy: WorkloadPlacementPolicy, data_gb: float = 0.0) -> np.ndarray:
+        """
+        Daily cost of each option as decisions see it: the predicted cost scaled to
+        the SKU's recent average spot price, plus the amortized migration cost.
+        Without a cost model or price trends this is just the predicted cost.
+        Tables predicted from a pricing table look their trends up as one vector
+        shared by every workload; other option sets fall back to per-SKU lookups.
+        """
+        costs = table.predicted_cost
+        if self.trend_ratios is not None and table.pricing is not None:
+            costs = costs * self.trend_ratios(table.pricing)
+        elif self.price_trend is not None and table.instance_types is not None:
+            ratios = np.ones(len(table))
+            for i, (code, region, instance_type) in enumerate(zip(table.cloud_codes, table.regions, table.instance_types)):
+                trend = self.price_trend(PROVIDERS[code], region, instance_type) if instance_type else None
+                if trend is not None:
+                    ratios[i] = trend.ratio
+            costs = costs * ratios
+        if self.cost_model is not None:
+            costs = costs + self.cost_model.amortized(current_state, table, data_gb, policy.dwell_time_hours)
+        return costs
+
+    def rank_options(self, table: OptionTable, policy: WorkloadPlacementPolicy, top_k: Optional[int] = None) -> np.ndarray:
+        """
+        Return indices of the top-k options satisfying the policy, best first.
+        Compliance and latency constraints are applied as masks and all options are
+        scored in one vectorized pass. Ties keep the original option order.
+        """
+        scores = self.score_options(table, policy)
+        return self._top_k(scores, top_k)
+
+    def score_options(self, table: OptionTable, policy: WorkloadPlacementPolicy) -> np.ndarray:
+        """
+        Score every option; options violating the policy score -inf.
+        """
+        # 1. Compliance Check
+        allowed = np.zeros(len(PROVIDER_CODES), dtype=bool)
+        allowed[[PROVIDER_CODES[c] for c in policy.allowed_clouds]] = True
+        valid = allowed[table.cloud_codes]
+
+        # 2. Latency Constraint Check
+        valid &= table.predicted_latency <= policy.max_latency_ms
+
+        # 3. Prediction Confidence Check
+        valid &= table.confidence_score >= policy.min_confidence
+
+        scores = self._calculate_score(table.predicted_cost, table.predicted_latency, policy, table.confidence_score)
+        return np.where(valid, scores, -np.inf)
+
+    def _top_k(self, scores: np.ndarray, top_k: Optional[int]) -> np.ndarray:
+        valid = np.flatnonzero(scores > -np.inf)
+        k = len(valid) if top_k is None else min(top_k, len(valid))
+        if k == 0:
+            return valid[:0]
+
+        candidates = valid
+        if k < len(valid):
+            # Partition first so only k candidates (plus ties at the boundary) get sorted
+            threshold = np.partition(scores[valid], len(valid) - k)[len(valid) - k]
+            candidates = valid[scores[valid] >= threshold]
+
+        order = np.lexsort((candidates, -scores[candidates]))
+        return candidates[order][:k]
+
+    def _savings_percent(self, current_state: WorkloadCurrentState, predicted_cost: float) -> float:
+        if current_state.current_cost <= 0:
+            return 0
+        return (current_state.current_cost - predicted_cost) / current_state.current_cost
+
+    def _calculate_score(self, cost: float, latency: float, policy: WorkloadPlacementPolicy, confidence: float = 1.0) -> float:
         """
         Calculate a utility score (higher is better).
         Simple weighted sum interpretation: minimize cost and latency.
         Inverted so higher is better.
+        Predictions the model is unsure about are discounted by confidence_weight.
+        Also works element-wise on NumPy arrays of costs and latencies.
         """
         # Normalize (rough heuristics)
         norm_cost = cost / 100.0 # Assume $100 is "high" daily cost reference
         norm_latency = latency / 100.0 # Assume 100ms is "high" latency
-        
+
         # Score = 100 - (Weighted Cost + Weighted Latency)
         # We want to MINIMIZE the weighted sum.
         penalty = (policy.cost_weight * norm_cost) + (policy.latency_weight * norm_latency)
+        penalty += policy.confidence_weight * (1.0 - confidence)
         return 1000.0 - penalty
-
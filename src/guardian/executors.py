@@ -0,0 +1,60 @@
+import asyncio
+import functools
+import logging
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class WorkerPool:
+    """
+    Runs CPU-bound work off the event loop.
+
+    Inference goes to a thread pool (sklearn/NumPy release the GIL in the heavy
+    parts), training to a process pool so long fits never compete with the loop
+    for the GIL. Each pool admits a bounded number of pending jobs; callers beyond
+    that wait for a slot, which pushes back on whoever produces the work instead
+    of growing an unbounded queue.
+    """
+
+    def __init__(
+        self,
+        inference_workers: Optional[int] = None,
+        training_workers: int = 1,
+        max_pending_inference: int = 32,
+        max_pending_training: int = 2,
+        training_processes: bool = True
+    ):
+        self.inference_workers = inference_workers or min(8, os.cpu_count() or 1)
+        self.training_workers = training_workers
+        self.inference_executor: Executor = ThreadPoolExecutor(
+            max_workers=self.inference_workers, thread_name_prefix="guardian-inference"
+        )
+        self.training_executor: Executor = (
+            ProcessPoolExecutor(max_workers=training_workers)
+            if training_processes
+            else ThreadPoolExecutor(max_workers=training_workers, thread_name_prefix="guardian-training")
+        )
+        self._inference_slots = asyncio.Semaphore(max_pending_inference)
+        self._training_slots = asyncio.Semaphore(max_pending_training)
+        logger.info("WorkerPool initialized (%s inference threads, %s training workers)", self.inference_workers, training_workers)
+
+    async def run_inference(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        return await self._submit(self.inference_executor, self._inference_slots, fn, *args, **kwargs)
+
+    async def run_training(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """
+        `fn` and its arguments must be picklable when training runs in processes.
+        """
+        return await self._submit(self.training_executor, self._training_slots, fn, *args, **kwargs)
+
+    async def _submit(self, executor: Executor, slots: asyncio.Semaphore, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        async with slots:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(executor, functools.partial(fn, *args, **kwargs))
+
+    def shutdown(self, wait: bool = False):
+        self.inference_executor.shutdown(wait=wait, cancel_futures=True)
+        self.training_executor.shutdown(wait=wait, cancel_futures=True)
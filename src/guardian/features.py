@@ -0,0 +1,235 @@
+import logging
+from typing import Dict, Hashable, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from guardian.models import CloudPricing, CloudProvider
+from guardian.tables import PROVIDER_CODES, PricingTable
+
+logger = logging.getLogger(__name__)
+
+# Model inputs, in column order
+FEATURE_SCHEMA = [
+    "cpu_cores", "memory_gb",                                   # Workload
+    "provider_idx", "region_idx", "region_lat", "region_lon",  # Location
+    "instance_vcpu", "instance_memory_gb", "instance_family",  # SKU shape
+    "price_on_demand", "price_spot", "spot_discount",          # Pricing
+]
+WORKLOAD_FEATURES = 2
+CANDIDATE_FEATURES = len(FEATURE_SCHEMA) - WORKLOAD_FEATURES
+
+# region -> (latitude, longitude) of the provider's data centers
+REGION_COORDINATES: Dict[str, Tuple[float, float]] = {
+    # AWS
+    "us-east-1": (38.9, -77.4), "us-east-2": (40.0, -83.0), "us-west-1": (37.4, -121.9), "us-west-2": (45.8, -119.7),
+    "eu-west-1": (53.3, -6.3), "eu-central-1": (50.1, 8.7), "ap-southeast-1": (1.3, 103.8), "ap-northeast-1": (35.7, 139.7),
+    # GCP
+    "us-central1": (41.3, -95.9), "us-east1": (33.2, -80.0), "us-east4": (39.0, -77.5), "us-west1": (45.6, -121.2),
+    "europe-west1": (50.4, 3.8), "europe-west4": (53.4, 6.8), "asia-east1": (24.1, 120.7), "asia-southeast1": (1.3, 103.8),
+    # Azure
+    "eastus": (37.4, -79.4), "eastus2": (36.7, -78.4), "westus": (37.8, -122.4), "westus2": (47.2, -119.9),
+    "centralus": (41.6, -93.6), "northeurope": (53.3, -6.3), "westeurope": (52.4, 4.9), "southeastasia": (1.3, 103.8),
+}
+REGION_INDEX: Dict[str, int] = {region: idx for idx, region in enumerate(REGION_COORDINATES)}
+
+INSTANCE_FAMILIES = ["general", "compute", "memory", "gpu"]
+
+# instance_type -> (vCPU, memory_gb, family)
+INSTANCE_TYPES: Dict[str, Tuple[float, float, str]] = {
+    # AWS
+    "m5.large": (2, 8, "general"), "m5.xlarge": (4, 16, "general"), "m5.4xlarge": (16, 64, "general"),
+    "c5.large": (2, 4, "compute"), "c5.xlarge": (4, 8, "compute"), "r5.large": (2, 16, "memory"),
+    "p3.2xlarge": (8, 61, "gpu"),
+    # GCP
+    "e2-standard-2": (2, 8, "general"), "e2-standard-4": (4, 16, "general"), "n2-standard-16": (16, 64, "general"),
+    "c2-standard-4": (4, 16, "compute"), "n2-highmem-2": (2, 16, "memory"),
+    # Azure (Retail Prices API skuName and ARM-style names)
+    "D2s_v3": (2, 8, "general"), "D2s v3": (2, 8, "general"), "D4s_v3": (4, 16, "general"), "D4s v3": (4, 16, "general"),
+    "D16s_v3": (16, 64, "general"), "F2s_v2": (2, 4, "compute"), "F2s v2": (2, 4, "compute"), "E2s_v3": (2, 16, "memory"),
+}
+
+# Data center the operator and its users are assumed to be closest to, for distance features
+HOME_COORDINATES = (38.9, -77.4)
+
+
+def region_features(region: str) -> Tuple[float, float, float]:
+    """
+    (index, latitude, longitude); unknown regions get index -1 and NaN coordinates.
+    """
+    lat, lon = REGION_COORDINATES.get(region, (np.nan, np.nan))
+    return float(REGION_INDEX.get(region, -1)), lat, lon
+
+
+def instance_features(instance_type: str) -> Tuple[float, float, float]:
+    """
+    (vCPU, memory_gb, family index); unknown instance types get NaN.
+    """
+    if instance_type not in INSTANCE_TYPES:
+        return np.nan, np.nan, np.nan
+    vcpu, memory, family = INSTANCE_TYPES[instance_type]
+    return float(vcpu), float(memory), float(INSTANCE_FAMILIES.index(family))
+
+
+def distance_km(lat: float, lon: float, origin: Tuple[float, float] = HOME_COORDINATES) -> float:
+    """
+    Great-circle distance between a point and the origin.
+    """
+    lat1, lon1, lat2, lon2 = map(np.radians, (origin[0], origin[1], lat, lon))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return float(6371.0 * 2 * np.arcsin(np.sqrt(a)))
+
+
+def nominal_latency(region: str) -> float:
+    """
+    Distance-based latency in ms to a region before any measurement, as assumed by
+    the synthetic training data; NaN for regions with unknown coordinates.
+    """
+    _, lat, lon = region_features(region)
+    return 20.0 + distance_km(lat, lon) / 100.0
+
+
+class FeatureEncoder:
+    """
+    Turns (workload, candidate) pairs into model features.
+
+    Candidate features (location, SKU shape, pricing) are independent of the workload,
+    so they are encoded once per candidate. Rows are memoized per SKU and price, and
+    the assembled candidate matrix per pricing snapshot version, so unchanged
+    candidates are never re-encoded between ticks.
+    """
+
+    def __init__(self, max_cached_rows: int = 200000):
+        self.max_cached_rows = max_cached_rows
+        self._rows: Dict[Hashable, np.ndarray] = {}
+        self._matrix_version: Optional[Hashable] = None
+        self._matrix: Optional[np.ndarray] = None
+        self.rows_encoded = 0 # Rows computed (cache misses), for observability
+
+    def candidate_matrix(self, candidates: Union[Sequence[CloudPricing], PricingTable], version: Optional[Hashable] = None) -> np.ndarray:
+        """
+        (candidates x CANDIDATE_FEATURES) matrix. With a snapshot version, the matrix
+        for that version is returned from cache on repeated calls.
+        """
+        if version is not None and version == self._matrix_version and self._matrix is not None and len(self._matrix) == len(candidates):
+            return self._matrix
+
+        if isinstance(candidates, PricingTable):
+            matrix = self._table_matrix(candidates)
+            if version is not None:
+                self._matrix_version, self._matrix = version, matrix
+            return matrix
+
+        if len(self._rows) > self.max_cached_rows:
+            self._rows.clear()
+
+        matrix = np.empty((len(candidates), CANDIDATE_FEATURES))
+        for i, candidate in enumerate(candidates):
+            key = (candidate.provider, candidate.region, candidate.instance_type, candidate.price_on_demand, candidate.price_spot)
+            row = self._rows.get(key)
+            if row is None:
+                row = self._encode_candidate(candidate.provider, candidate.region, candidate.instance_type, candidate.price_on_demand, candidate.price_spot)
+                self._rows[key] = row
+                self.rows_encoded += 1
+            matrix[i] = row
+
+        if version is not None:
+            self._matrix_version, self._matrix = version, matrix
+        return matrix
+
+    def _table_matrix(self, table: PricingTable) -> np.ndarray:
+        """
+        Vectorized candidate features: location and SKU features are looked up once
+        per distinct region and instance type, then gathered by category code.
+        """
+        regions = np.array([region_features(region) for region in table.region_names], dtype=float).reshape(-1, 3)
+        instances = np.array([instance_features(instance_type) for instance_type in table.instance_names], dtype=float).reshape(-1, 3)
+        on_demand, spot = table.price_on_demand, table.price_spot
+
+        matrix = np.empty((len(table), CANDIDATE_FEATURES))
+        matrix[:, 0] = table.provider_codes
+        matrix[:, 1:4] = regions[table.region_codes]
+        matrix[:, 4:7] = instances[table.instance_codes]
+        matrix[:, 7] = on_demand
+        matrix[:, 8] = spot
+        with np.errstate(divide="ignore", invalid="ignore"):
+            matrix[:, 9] = np.where(on_demand > 0, 1.0 - spot / on_demand, 0.0)
+        self.rows_encoded += len(table)
+        return matrix
+
+    def encode(self, resources: np.ndarray, candidate_matrix: np.ndarray) -> np.ndarray:
+        """
+        Full feature matrix for every (workload, candidate) pair, one row per pair,
+        workload-major.
+        """
+        n_workloads, n_candidates = len(resources), len(candidate_matrix)
+        features = np.empty((n_workloads * n_candidates, len(FEATURE_SCHEMA)))
+        features[:, :WORKLOAD_FEATURES] = np.repeat(resources, n_candidates, axis=0)
+        features[:, WORKLOAD_FEATURES:] = np.tile(candidate_matrix, (n_workloads, 1))
+        return features
+
+    def encode_rows(
+        self,
+        resources: np.ndarray,
+        providers: Sequence[CloudProvider],
+        regions: Sequence[str],
+        instance_types: Sequence[Optional[str]],
+        prices_on_demand: Sequence[float],
+        prices_spot: Sequence[float]
+    ) -> np.ndarray:
+        """
+        Feature rows for individual (workload, placement) observations, e.g. outcomes.
+        """
+        features = np.empty((len(resources), len(FEATURE_SCHEMA)))
+        features[:, :WORKLOAD_FEATURES] = resources
+        for i, row in enumerate(zip(providers, regions, instance_types, prices_on_demand, prices_spot)):
+            features[i, WORKLOAD_FEATURES:] = self._encode_candidate(*row)
+        return features
+
+    def _encode_candidate(self, provider: CloudProvider, region: str, instance_type: Optional[str], price_on_demand: float, price_spot: float) -> np.ndarray:
+        region_idx, lat, lon = region_features(region)
+        vcpu, memory, family = instance_features(instance_type or "")
+        discount = 1.0 - price_spot / price_on_demand if price_on_demand > 0 else 0.0
+        return np.array([
+            PROVIDER_CODES.get(provider, 2), region_idx, lat, lon,
+            vcpu, memory, family,
+            price_on_demand, price_spot, discount,
+        ], dtype=float)
+
+
+def synthetic_training_set(seed: int = 42) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Synthetic (features, [cost, latency]) rows over the known regions and SKUs.
+    Cost follows the number of instances a workload needs at the spot price; latency
+    grows with distance from HOME_COORDINATES. In production this would come from a
+    database or Feature Store.
+    """
+    rng = np.random.default_rng(seed)
+    encoder = FeatureEncoder()
+    shapes = [(2, 4), (2, 8), (4, 16), (8, 32), (16, 64)]
+    providers = {
+        CloudProvider.AWS: ["us-east-1", "us-east-2", "us-west-2", "eu-west-1"],
+        CloudProvider.GCP: ["us-central1", "us-east4", "us-west1", "europe-west1"],
+        CloudProvider.AZURE: ["eastus", "westus2", "centralus", "westeurope"],
+    }
+    skus = {
+        CloudProvider.AWS: [("m5.large", 0.096), ("c5.large", 0.085), ("r5.large", 0.126)],
+        CloudProvider.GCP: [("e2-standard-2", 0.067), ("c2-standard-4", 0.209), ("n2-highmem-2", 0.131)],
+        CloudProvider.AZURE: [("D2s_v3", 0.096), ("F2s_v2", 0.085), ("E2s_v3", 0.126)],
+    }
+
+    rows, targets = [], []
+    for provider, regions in providers.items():
+        for region in regions:
+            base_latency = nominal_latency(region)
+            for instance_type, on_demand in skus[provider]:
+                vcpu, memory, _ = INSTANCE_TYPES[instance_type]
+                for cpu, mem in shapes:
+                    spot = on_demand * rng.uniform(0.25, 0.45)
+                    instances = np.ceil(max(cpu / vcpu, mem / memory))
+                    rows.append(encoder.encode_rows(np.array([[cpu, mem]]), [provider], [region], [instance_type], [on_demand], [spot])[0])
+                    targets.append([
+                        instances * spot * 24 * rng.uniform(0.95, 1.05), # $/day
+                        base_latency * rng.uniform(0.9, 1.1),
+                    ])
+
+    return np.array(rows), np.array(targets)
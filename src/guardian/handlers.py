@@ -1,95 +1,381 @@
 import kopf
 import asyncio
 import logging
-from typing import Dict, Any
+import json
+import os
+import socket
+from typing import Dict, Any, List, Optional, Tuple
 
-from guardian.metrics_collector import MetricsCollector
+from guardian.instrumentation import start_metrics_server
+from guardian.latency_probe import LatencyProber, default_endpoints
+from guardian.metrics_collector import MetricsCollector, default_pricing_sources
 from guardian.ml_engine import MLEngine
+from guardian.price_history import PriceHistory
+from guardian.model_store import ModelStore
+from guardian.executors import WorkerPool
+from guardian.outcomes import OutcomeLog
 from guardian.decision_engine import DecisionEngine
 from guardian.migration_orchestrator import MigrationOrchestrator
-from guardian.models import WorkloadPlacementPolicy, CloudProvider
+from guardian.migration_queue import QUEUED, RUNNING, MigrationQueue
+from guardian.migration_state import MigrationStateStore
+from guardian.placement_solver import PlacementSolver
+from guardian.scheduler import FleetOptimizer
+from guardian.sharding import KubernetesLeaseBackend, ReplicatedPricingSource, ShardCoordinator, SnapshotServer
+from guardian.stability import MigrationCostModel, PlacementHistory
+from guardian.models import WorkloadPlacementPolicy, CloudProvider, FleetConstraints, FleetWorkload, PlacementRecommendation
 
 # Global instances
 metrics_collector: MetricsCollector = None
 ml_engine: MLEngine = None
 decision_engine: DecisionEngine = None
 migration_orchestrator: MigrationOrchestrator = None
+migration_queue: MigrationQueue = None
+fleet_optimizer: FleetOptimizer = None
+worker_pool: WorkerPool = None
+outcome_log: OutcomeLog = None
+shard_coordinator: Optional[ShardCoordinator] = None
+snapshot_server: Optional[SnapshotServer] = None
+known_policies: Dict[str, Tuple[str, WorkloadPlacementPolicy]] = {} # Every policy seen, owned by this replica or not
+policy_migrations: Dict[str, Dict[str, float]] = {} # policy key -> migration ID -> estimated savings
+background_tasks: List[asyncio.Task] = []
+
+# Full sweeps are a safety net; price changes trigger re-evaluation as they happen
+OPTIMIZATION_INTERVAL = float(os.environ.get("GUARDIAN_OPTIMIZATION_INTERVAL", "600"))
+PRICE_CHANGE_THRESHOLD = float(os.environ.get("GUARDIAN_PRICE_CHANGE_THRESHOLD", "0.05"))
+MODEL_DIR = os.environ.get("GUARDIAN_MODEL_DIR", "/var/lib/guardian/models")
+STATE_DIR = os.environ.get("GUARDIAN_STATE_DIR", "/var/lib/guardian/migrations")
+PRICE_HISTORY_DIR = os.environ.get("GUARDIAN_PRICE_HISTORY_DIR", "/var/lib/guardian/prices")
+PRICE_HISTORY_RETENTION = float(os.environ.get("GUARDIAN_PRICE_HISTORY_RETENTION", str(30 * 24 * 3600)))
+PRICE_HISTORY_FLUSH_INTERVAL = float(os.environ.get("GUARDIAN_PRICE_HISTORY_FLUSH_INTERVAL", "300"))
+PROBE_SOURCE = os.environ.get("GUARDIAN_PROBE_SOURCE", "local") # Region the operator runs in
+PROBE_INTERVAL = float(os.environ.get("GUARDIAN_PROBE_INTERVAL", "60"))
+LATENCY_ENDPOINTS = json.loads(os.environ.get("GUARDIAN_LATENCY_ENDPOINTS", "{}")) # region -> tcp://host:port or http(s) URL
+INFERENCE_WORKERS = int(os.environ.get("GUARDIAN_INFERENCE_WORKERS", "0")) or None # 0: one per core, up to 8
+TRAINING_WORKERS = int(os.environ.get("GUARDIAN_TRAINING_WORKERS", "1"))
+RETRAIN_INTERVAL = float(os.environ.get("GUARDIAN_RETRAIN_INTERVAL", "600"))
+MIGRATION_CONCURRENCY = int(os.environ.get("GUARDIAN_MIGRATION_CONCURRENCY", "4"))
+REGION_MIGRATION_CONCURRENCY = int(os.environ.get("GUARDIAN_REGION_MIGRATION_CONCURRENCY", "1"))
+METRICS_PORT = int(os.environ.get("GUARDIAN_METRICS_PORT", "9090")) # 0 disables the Prometheus endpoint
+# Fleet-wide placement under capacity/budget limits instead of per-workload decisions
+PLACEMENT_SOLVER = os.environ.get("GUARDIAN_PLACEMENT_SOLVER", "false").lower() in ("1", "true", "yes")
+REGION_CAPACITY = json.loads(os.environ.get("GUARDIAN_REGION_CAPACITY", "{}")) # region -> CPU cores
+CLOUD_BUDGET = json.loads(os.environ.get("GUARDIAN_CLOUD_BUDGET", "{}")) # cloud -> max daily spend
+MAX_MIGRATIONS = int(os.environ.get("GUARDIAN_MAX_MIGRATIONS", "0")) or None # per optimization pass, 0: no cap
+# Horizontal scale-out: replicas split the policies between them and share one pricing leader
+SHARDING = os.environ.get("GUARDIAN_SHARDING", "false").lower() in ("1", "true", "yes")
+SHARD_BY = os.environ.get("GUARDIAN_SHARD_BY", "namespace") # namespace or policy
+REPLICA_ID = os.environ.get("GUARDIAN_REPLICA_ID") or socket.gethostname()
+REPLICA_ADDRESS = os.environ.get("GUARDIAN_REPLICA_ADDRESS") or socket.gethostname() # Pod IP, reachable by the other replicas
+SHARD_PORT = int(os.environ.get("GUARDIAN_SHARD_PORT", "8081"))
+LEASE_NAMESPACE = os.environ.get("GUARDIAN_LEASE_NAMESPACE", "default")
+LEASE_DURATION = float(os.environ.get("GUARDIAN_LEASE_DURATION", "15"))
 
 @kopf.on.startup()
 async def configure(settings: kopf.OperatorSettings, **_):
-    global metrics_collector, ml_engine, decision_engine, migration_orchestrator
-    
+    global metrics_collector, ml_engine, decision_engine, migration_orchestrator, migration_queue, fleet_optimizer, worker_pool, outcome_log
+    global shard_coordinator, snapshot_server
+
     settings.posting.level = logging.INFO
-    
-    metrics_collector = MetricsCollector()
-    ml_engine = MLEngine()
-    decision_engine = DecisionEngine()
-    migration_orchestrator = MigrationOrchestrator()
-    
-    # Pre-train the model on startup
-    await ml_engine.train()
-    
+
+    sources = None
+    if SHARDING:
+        # Every replica handles its own shard of the policies, so kopf must not pause
+        # the others the way it does for redundant operators
+        settings.peering.standalone = True
+        shard_coordinator = ShardCoordinator(
+            KubernetesLeaseBackend.in_cluster(LEASE_NAMESPACE),
+            REPLICA_ID,
+            address=f"{REPLICA_ADDRESS}:{SHARD_PORT}",
+            lease_duration=LEASE_DURATION
+        )
+        # Only the leader calls the cloud pricing APIs; followers copy its feeds
+        sources = [ReplicatedPricingSource(source, shard_coordinator) for source in default_pricing_sources()]
+
+    metrics_collector = MetricsCollector(
+        sources=sources,
+        price_history=open_price_history(),
+        latency_prober=LatencyProber(dict(default_endpoints(), **LATENCY_ENDPOINTS), source=PROBE_SOURCE)
+    )
+    # Model fits and inference run in worker pools so they never block the kopf event loop
+    worker_pool = WorkerPool(inference_workers=INFERENCE_WORKERS, training_workers=TRAINING_WORKERS)
+    ml_engine = MLEngine(model_store=open_model_store(), worker_pool=worker_pool)
+    # Cost-aware decisions: amortized migration cost, cooldowns/hysteresis and price trends
+    decision_engine = DecisionEngine(
+        cost_model=MigrationCostModel(),
+        history=PlacementHistory(),
+        price_trend=metrics_collector.price_trend,
+        trend_ratios=metrics_collector.trend_ratios
+    )
+    # Observed outcomes of executed migrations feed incremental retraining
+    outcome_log = OutcomeLog()
+    migration_orchestrator = MigrationOrchestrator(
+        outcome_log=outcome_log,
+        state_observer=metrics_collector.get_current_state,
+        price_lookup=metrics_collector.get_price
+    )
+    # Migrations run in the background; timers only enqueue them. Progress is
+    # checkpointed so migrations interrupted by a restart pick up where they stopped.
+    migration_queue = MigrationQueue(
+        migration_orchestrator,
+        max_concurrent=MIGRATION_CONCURRENCY,
+        region_concurrency=REGION_MIGRATION_CONCURRENCY,
+        state_store=open_state_store(),
+        history=decision_engine.history
+    )
+    migration_queue.start()
+    migration_queue.resume()
+    fleet_optimizer = FleetOptimizer(
+        metrics_collector,
+        ml_engine,
+        decision_engine,
+        workload_resolver=resolve_workloads,
+        interval=OPTIMIZATION_INTERVAL,
+        placement_solver=PlacementSolver(decision_engine) if PLACEMENT_SOLVER else None,
+        constraints=FleetConstraints(
+            region_capacity=REGION_CAPACITY,
+            cloud_budget={CloudProvider(cloud): budget for cloud, budget in CLOUD_BUDGET.items()},
+            max_migrations=MAX_MIGRATIONS
+        ),
+        price_change_threshold=PRICE_CHANGE_THRESHOLD,
+        on_recommendations=queue_migrations
+    )
+    fleet_optimizer.start()
+    if shard_coordinator is not None:
+        snapshot_server = SnapshotServer(metrics_collector, shard_coordinator, port=SHARD_PORT)
+        await snapshot_server.start()
+        shard_coordinator.add_listener(rebalance_shards)
+        try:
+            # Join (and maybe lead) before the first pricing refresh picks a source
+            await shard_coordinator.sync()
+        except Exception as e:
+            logging.warning("Initial shard membership sync failed: %s", e)
+        shard_coordinator.start()
+    if METRICS_PORT:
+        start_metrics_server(METRICS_PORT)
+    background_tasks.append(asyncio.create_task(metrics_collector.refresh_periodically()))
+    background_tasks.append(asyncio.create_task(metrics_collector.latency_prober.probe_periodically(PROBE_INTERVAL)))
+    if metrics_collector.price_history.directory is not None:
+        background_tasks.append(asyncio.create_task(metrics_collector.price_history.flush_periodically(PRICE_HISTORY_FLUSH_INTERVAL)))
+
+    # Warm start from the latest model artifact; only train (in the background) if there is none
+    if not ml_engine.load_latest():
+        background_tasks.append(asyncio.create_task(ml_engine.ensure_trained()))
+    if ml_engine.model_store is not None:
+        background_tasks.append(asyncio.create_task(ml_engine.watch_model_store()))
+    background_tasks.append(asyncio.create_task(ml_engine.retrain_periodically(outcome_log, interval=RETRAIN_INTERVAL)))
+
     logging.info("Guardian Operator started and components initialized.")
 
-@kopf.timer('guardian.io', 'v1alpha1', 'workloadplacementpolicies', interval=60.0)
+def open_model_store() -> Optional[ModelStore]:
+    try:
+        return ModelStore(MODEL_DIR)
+    except OSError as e:
+        logging.warning("Model store unavailable at %s (%s); models will not be persisted", MODEL_DIR, e)
+        return None
+
+def open_state_store() -> Optional[MigrationStateStore]:
+    try:
+        return MigrationStateStore(STATE_DIR)
+    except OSError as e:
+        logging.warning("Migration state store unavailable at %s (%s); migrations will not survive restarts", STATE_DIR, e)
+        return None
+
+def open_price_history() -> PriceHistory:
+    try:
+        return PriceHistory(PRICE_HISTORY_DIR, retention=PRICE_HISTORY_RETENTION)
+    except OSError as e:
+        logging.warning("Price history unavailable at %s (%s); keeping recent prices in memory only", PRICE_HISTORY_DIR, e)
+        return PriceHistory()
+
+@kopf.on.probe(id='model')
+def model_status(**_):
+    return {
+        "trained": ml_engine is not None and ml_engine.is_trained,
+        "version": ml_engine.model_version if ml_engine is not None else None
+    }
+
+@kopf.on.cleanup()
+async def shutdown(**_):
+    for task in background_tasks:
+        task.cancel()
+    if shard_coordinator is not None:
+        # Hand the shards and pricing leadership over right away
+        await shard_coordinator.stop()
+    if snapshot_server is not None:
+        await snapshot_server.stop()
+    if fleet_optimizer is not None:
+        await fleet_optimizer.stop()
+    if migration_queue is not None:
+        await migration_queue.close()
+    if migration_orchestrator is not None:
+        await migration_orchestrator.close()
+    if metrics_collector is not None:
+        try:
+            metrics_collector.price_history.flush()
+        except OSError as e:
+            logging.warning("Final price history flush failed: %s", e)
+        await metrics_collector.close()
+    if worker_pool is not None:
+        worker_pool.shutdown()
+
+def shard_key(namespace: str, name: str) -> str:
+    return namespace if SHARD_BY == "namespace" else f"{namespace}/{name}"
+
+def owns_policy(key: str) -> bool:
+    if shard_coordinator is None:
+        return True
+    namespace, name = key.split("/", 1)
+    return shard_coordinator.owns(shard_key(namespace, name))
+
+def rebalance_shards(members: Tuple[str, ...]):
+    """
+    Drop the policies that moved to other replicas and take over the ones that moved
+    here, without waiting for their next timer run.
+    """
+    for key in list(fleet_optimizer.policies):
+        if not owns_policy(key):
+            fleet_optimizer.unregister(key)
+            policy_migrations.pop(key, None)
+    adopted = [key for key in known_policies if key not in fleet_optimizer.policies and owns_policy(key)]
+    for key in adopted:
+        fleet_optimizer.adopt(key, *known_policies[key])
+    logging.info("Shards rebalanced across %s replicas: %s policies owned, %s adopted", len(members), len(fleet_optimizer.policies), len(adopted))
+
+def queue_migrations(key: str, recommendations: List[PlacementRecommendation]):
+    """
+    Queue the migrations recommended by the fleet optimizer. This is the only place
+    recommendations are submitted; policy timers just report on them.
+    """
+    for recommendation in recommendations:
+        migration_id = migration_queue.submit(recommendation)
+        policy_migrations.setdefault(key, {})[migration_id] = recommendation.estimated_savings
+        logging.info("Policy %s: queued migration %s of %s to %s", key, migration_id, recommendation.workload_name, recommendation.recommended_option.cloud)
+
+def migration_status(key: str) -> List[Dict[str, Any]]:
+    """
+    Migrations queued for a policy that the queue still knows about.
+    """
+    migrations = []
+    tracked = policy_migrations.get(key, {})
+    for migration_id in list(tracked):
+        record = migration_queue.get(migration_id)
+        if record is None:
+            tracked.pop(migration_id) # Aged out of the queue's history
+            continue
+        migrations.append({
+            "id": migration_id,
+            "workload": record.workload_name,
+            "state": record.state,
+            "attempts": record.attempts
+        })
+    return migrations
+
+def parse_policy(spec: Dict[str, Any]) -> WorkloadPlacementPolicy:
+    """
+    Adapt a WorkloadPlacementPolicy CR spec to the internal model.
+    """
+    return WorkloadPlacementPolicy(
+        workload_selector=spec.get('workloadSelector', {}).get('matchLabels', {}),
+        cost_weight=spec.get('criteria', {}).get('cost', {}).get('weight', 40),
+        latency_weight=spec.get('criteria', {}).get('latency', {}).get('weight', 40),
+        compliance_weight= spec.get('criteria', {}).get('compliance', {}).get('weight', 20),
+        savings_threshold=spec.get('criteria', {}).get('cost', {}).get('threshold', 0.20),
+        max_latency_ms=spec.get('criteria', {}).get('latency', {}).get('maxAcceptable', 100),
+        min_confidence=spec.get('criteria', {}).get('confidence', {}).get('minimum', 0.0),
+        confidence_weight=spec.get('criteria', {}).get('confidence', {}).get('weight', 0),
+        dwell_time_hours=spec.get('migration', {}).get('dwellTimeHours', 168.0),
+        cooldown_minutes=spec.get('migration', {}).get('cooldownMinutes', 60.0),
+        hysteresis=spec.get('migration', {}).get('hysteresis', 0.05),
+        allowed_clouds=[CloudProvider(c) for c in spec.get('criteria', {}).get('compliance', {}).get('allowedClouds', ['aws', 'gcp', 'azure'])]
+    )
+
+async def resolve_workloads(namespace: str, policy: WorkloadPlacementPolicy) -> List[FleetWorkload]:
+    """
+    Resolve the workloads matched by a policy's selector from the workload cache.
+    Workloads without scheduled pods yet have no placement and are skipped.
+    """
+    workloads = []
+    for info in metrics_collector.workload_cache.resolve(namespace, policy.workload_selector):
+        try:
+            current_state = await metrics_collector.get_current_state(info.name, namespace)
+        except LookupError as e:
+            logging.debug("Skipping %s/%s: %s", namespace, info.name, e)
+            continue
+        workloads.append(FleetWorkload(current_state=current_state, cpu_cores=info.cpu_cores, memory_gb=info.memory_gb))
+    return workloads
+
+# Watch streams keep the workload cache current; no API calls on the optimization path
+@kopf.on.event('apps', 'v1', 'deployments')
+def watch_deployments(event: Dict[str, Any], **_):
+    if metrics_collector is not None:
+        metrics_collector.workload_cache.on_deployment(event.get('type'), event['object'])
+
+@kopf.on.event('', 'v1', 'pods')
+def watch_pods(event: Dict[str, Any], **_):
+    if metrics_collector is not None:
+        metrics_collector.workload_cache.on_pod(event.get('type'), event['object'])
+
+@kopf.on.event('', 'v1', 'nodes')
+def watch_nodes(event: Dict[str, Any], **_):
+    if metrics_collector is not None:
+        metrics_collector.workload_cache.on_node(event.get('type'), event['object'])
+
+@kopf.on.delete('guardian.io', 'v1alpha1', 'workloadplacementpolicies', optional=True)
+async def forget_policy(name: str, namespace: str, **kwargs):
+    known_policies.pop(f"{namespace}/{name}", None)
+    policy_migrations.pop(f"{namespace}/{name}", None)
+    if fleet_optimizer is not None:
+        fleet_optimizer.unregister(f"{namespace}/{name}")
+
+@kopf.timer('guardian.io', 'v1alpha1', 'workloadplacementpolicies', interval=OPTIMIZATION_INTERVAL)
 async def optimize_placement(spec: Dict[str, Any], status: Dict[str, Any], name: str, namespace: str, **kwargs):
     """
     Periodic optimization loop.
+    Makes sure this policy is part of the shared fleet-wide optimization pass and
+    reports on its migrations. The optimizer queues them as it recommends them,
+    both on its sweeps and right after price changes.
     """
-    logging.info(f"Running optimization loop for policy: {name}")
-    
-    # Adapt spec to model
+    logging.info("Running optimization loop for policy: %s", name)
+
     try:
-        policy = WorkloadPlacementPolicy(
-            workload_selector=spec.get('workloadSelector', {}).get('matchLabels', {}),
-            cost_weight=spec.get('criteria', {}).get('cost', {}).get('weight', 40),
-            latency_weight=spec.get('criteria', {}).get('latency', {}).get('weight', 40),
-            compliance_weight= spec.get('criteria', {}).get('compliance', {}).get('weight', 20),
-            savings_threshold=spec.get('criteria', {}).get('cost', {}).get('threshold', 0.20),
-            max_latency_ms=spec.get('criteria', {}).get('latency', {}).get('maxAcceptable', 100),
-            allowed_clouds=[CloudProvider(c) for c in spec.get('criteria', {}).get('compliance', {}).get('allowedClouds', ['aws', 'gcp', 'azure'])]
-        )
+        policy = parse_policy(spec)
     except Exception as e:
-        logging.error(f"Failed to parse policy {name}: {e}")
+        logging.error("Failed to parse policy %s: %s", name, e)
         return
-    
-    # 1. Collect Data
-    pricing_data = await metrics_collector.collect_pricing()
-    
-    # Assume 1 workload matches for this demo
-    workload_name = "payment-processor" # In real app, we'd list pods matching selector
-    
-    current_state = await metrics_collector.get_current_state(workload_name, namespace)
-    
-    # 2. Predict (ML)
-    # Mock resources for the workload
-    cpu = 4.0
-    mem = 16.0
-    
-    options = await ml_engine.predict(cpu, mem, pricing_data)
-    
-    # 3. Decide (Policy)
-    recommendation = await decision_engine.generate_recommendation(current_state, options, policy)
-    
-    if recommendation:
-        logging.info(f"Recommendation generated: Move to {recommendation.recommended_option.cloud}")
-        
-        # 4. Orchestrate (Execute)
-        # Check if migration is enabled in status or spec (ignoring for simple demo, assume yes)
-        success = await migration_orchestrator.execute_migration(recommendation)
-        
-        if success:
-             return {
-                 "lastOptimization": kopf.logger.name,
-                 "status": "Migrated",
-                 "currentCloud": recommendation.recommended_option.cloud,
-                 "savings": recommendation.estimated_savings
-             }
-    else:
-        logging.info(f"No migration recommended for {name}")
+
+    key = f"{namespace}/{name}"
+    known_policies[key] = (namespace, policy)
+    if not owns_policy(key):
+        # Another replica's shard; its owner updates the status
+        fleet_optimizer.unregister(key)
+        policy_migrations.pop(key, None)
+        return
+
+    # 1-4. Collect, Predict and Decide happen once per tick for the whole fleet, and
+    # the recommended migrations are queued in the background by queue_migrations
+    await fleet_optimizer.recommendations_for(key, namespace, policy)
+
+    migrations = migration_status(key)
+    active = [m for m in migrations if m["state"] in (QUEUED, RUNNING)]
+    if not active:
+        logging.info("No migration in progress for %s", name)
+        return {
+            "lastOptimization": "No change",
+            "currentCloud": current_cloud(key),
+            "migrations": migrations
+        }
 
     return {
-        "lastOptimization": "No change",
-        "currentCloud": "aws" # Mock
+        "lastOptimization": kopf.logger.name,
+        "status": "MigrationQueued",
+        "currentCloud": current_cloud(key), # Updated once migrations complete
+        "savings": round(sum(policy_migrations[key][m["id"]] for m in active), 2),
+        "migrations": migrations
     }
 
+def current_cloud(key: str) -> Optional[str]:
+    """
+    Cloud most of the policy's workloads run on, as of their last evaluation.
+    """
+    clouds = [w.current_state.current_cloud.value for w in fleet_optimizer.workloads.get(key, [])]
+    return max(set(clouds), key=clouds.count) if clouds else None
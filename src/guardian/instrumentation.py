@@ -0,0 +1,109 @@
+import logging
+import time
+from functools import lru_cache
+from typing import Optional
+
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, start_http_server
+
+logger = logging.getLogger(__name__)
+
+# Guardian's own registry, so tests and embedders do not collide with the process-wide default
+REGISTRY = CollectorRegistry(auto_describe=True)
+
+FAST_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SLOW_BUCKETS = (0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1800.0)
+
+STAGE_SECONDS = Histogram(
+    "guardian_stage_duration_seconds", "Duration of control loop stages (collect, predict, decide, migrate)",
+    ["stage"], buckets=FAST_BUCKETS + (30.0, 60.0, 300.0), registry=REGISTRY
+)
+DECISION_LATENCY_SECONDS = Histogram(
+    "guardian_decision_latency_seconds", "Time from a significant price change to the resulting placement decisions",
+    buckets=FAST_BUCKETS + (30.0, 60.0), registry=REGISTRY
+)
+INFERENCE_SECONDS = Histogram(
+    "guardian_model_inference_seconds", "Duration of batched model inference calls",
+    buckets=FAST_BUCKETS, registry=REGISTRY
+)
+INFERENCE_ROWS = Counter(
+    "guardian_model_inference_rows_total", "(workload, candidate) pairs scored by the model", registry=REGISTRY
+)
+PRICING_CACHE_REQUESTS = Counter(
+    "guardian_pricing_cache_requests_total", "Pricing snapshot reads by result (hit, stale, miss)",
+    ["result"], registry=REGISTRY
+)
+PRICING_FETCH_FAILURES = Counter(
+    "guardian_pricing_fetch_failures_total", "Failed pricing feed fetches", ["feed"], registry=REGISTRY
+)
+PRICING_MOCK_FALLBACKS = Counter(
+    "guardian_pricing_mock_fallbacks_total", "Feeds served from mock fallback data", ["feed"], registry=REGISTRY
+)
+PRICING_SNAPSHOT_VERSION = Gauge(
+    "guardian_pricing_snapshot_version", "Version of the latest published pricing snapshot", registry=REGISTRY
+)
+RECOMMENDATIONS = Counter(
+    "guardian_recommendations_total", "Placement recommendations produced", registry=REGISTRY
+)
+MIGRATION_PHASE_SECONDS = Histogram(
+    "guardian_migration_phase_duration_seconds", "Duration of individual migration phases",
+    ["phase"], buckets=SLOW_BUCKETS, registry=REGISTRY
+)
+MIGRATIONS = Counter(
+    "guardian_migrations_total", "Finished migrations by outcome (succeeded, failed)", ["result"], registry=REGISTRY
+)
+MIGRATIONS_IN_FLIGHT = Gauge(
+    "guardian_migrations_in_flight", "Migrations queued or running", registry=REGISTRY
+)
+
+
+class Timer:
+    """
+    Context manager observing the seconds spent in its block into a histogram.
+    """
+    __slots__ = ("histogram", "start")
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self) -> "Timer":
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.start)
+
+
+@lru_cache(maxsize=None)
+def _stage(stage: str):
+    # Label lookups take a lock; resolve each stage's child once
+    return STAGE_SECONDS.labels(stage=stage)
+
+
+def span(stage: str) -> Timer:
+    """
+    Time a control loop stage: `with span("predict"): ...`
+    """
+    return Timer(_stage(stage))
+
+
+@lru_cache(maxsize=None)
+def _phase(phase: str):
+    return MIGRATION_PHASE_SECONDS.labels(phase=phase)
+
+
+def phase_timer(phase: str) -> Timer:
+    return Timer(_phase(phase))
+
+
+def start_metrics_server(port: int, addr: str = "0.0.0.0") -> Optional[int]:
+    """
+    Serve the registry in Prometheus text format on http://addr:port/metrics.
+    Returns the port, or None if it could not be bound.
+    """
+    try:
+        start_http_server(port, addr=addr, registry=REGISTRY)
+    except OSError as e:
+        logger.warning("Metrics endpoint unavailable on port %s (%s)", port, e)
+        return None
+    logger.info("Serving Prometheus metrics on %s:%s", addr, port)
+    return port
@@ -0,0 +1,246 @@
+import asyncio
+import logging
+import math
+import random
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+from urllib.parse import urlsplit
+
+from guardian.features import REGION_COORDINATES
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_QUANTILES = (0.5, 0.95, 0.99)
+# Seconds of probes that make up the rolling aggregates, split into this many slots
+DEFAULT_PROBE_WINDOW = 900.0
+DEFAULT_WINDOW_SLOTS = 6
+
+
+def default_endpoints() -> Dict[str, str]:
+    """
+    Public regional API endpoints to probe. Only AWS and GCP publish per-region
+    hostnames; other regions need configured endpoints.
+    """
+    endpoints = {}
+    for region in REGION_COORDINATES:
+        if region.count("-") == 2: # AWS, e.g. us-east-1
+            endpoints[region] = f"tcp://ec2.{region}.amazonaws.com:443"
+        elif "-" in region: # GCP, e.g. us-central1
+            endpoints[region] = f"https://{region}-aiplatform.googleapis.com/"
+    return endpoints
+
+
+class LatencySketch:
+    """
+    Streaming quantile sketch with bounded relative error (DDSketch-style).
+
+    Values are counted in logarithmic buckets, so quantiles are within
+    `relative_accuracy` of the true value using a few hundred counters however many
+    samples are added. Sketches merge by adding counts.
+    """
+
+    def __init__(self, relative_accuracy: float = 0.01):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.buckets: Dict[int, int] = defaultdict(int)
+        self.count = 0
+        self.zeros = 0 # Values too small to bucket (< 1 microsecond)
+
+    def add(self, value: float):
+        if value <= 1e-3:
+            self.zeros += 1
+        else:
+            self.buckets[math.ceil(math.log(value) / self._log_gamma)] += 1
+        self.count += 1
+
+    def merge(self, other: "LatencySketch"):
+        for index, count in other.buckets.items():
+            self.buckets[index] += count
+        self.zeros += other.zeros
+        self.count += other.count
+
+    def quantile(self, q: float) -> Optional[float]:
+        if self.count == 0:
+            return None
+        rank = q * (self.count - 1)
+        seen = self.zeros
+        if rank < seen:
+            return 0.0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if rank < seen:
+                # Midpoint of the bucket (gamma^(i-1), gamma^i] in relative terms
+                return 2 * self.gamma ** index / (self.gamma + 1)
+        return 2 * self.gamma ** max(self.buckets) / (self.gamma + 1)
+
+
+class RollingSketch:
+    """
+    Quantiles over the last `window` seconds: one sketch per time slot, with slots
+    older than the window dropped as time moves on.
+    """
+
+    def __init__(self, window: float = DEFAULT_PROBE_WINDOW, slots: int = DEFAULT_WINDOW_SLOTS, relative_accuracy: float = 0.01, clock: Callable[[], float] = time.monotonic):
+        self.slot_seconds = window / slots
+        self.slots = slots
+        self.relative_accuracy = relative_accuracy
+        self.clock = clock
+        self._slots: Dict[int, LatencySketch] = {}
+
+    def add(self, value: float):
+        slot = int(self.clock() // self.slot_seconds)
+        sketch = self._slots.get(slot)
+        if sketch is None:
+            sketch = self._slots[slot] = LatencySketch(self.relative_accuracy)
+            for old in [s for s in self._slots if s <= slot - self.slots]:
+                del self._slots[old]
+        sketch.add(value)
+
+    def merged(self) -> LatencySketch:
+        oldest = int(self.clock() // self.slot_seconds) - self.slots + 1
+        merged = LatencySketch(self.relative_accuracy)
+        for slot, sketch in self._slots.items():
+            if slot >= oldest:
+                merged.merge(sketch)
+        return merged
+
+    def quantiles(self, qs: Sequence[float] = DEFAULT_QUANTILES) -> Dict[float, float]:
+        merged = self.merged()
+        return {q: merged.quantile(q) for q in qs} if merged.count else {}
+
+
+@dataclass(frozen=True)
+class ProbeResult:
+    region: str
+    endpoint: str
+    latency_ms: Optional[float] # None if the probe failed or timed out
+    error: Optional[str] = None
+
+
+class LatencyProber:
+    """
+    Measures round-trip latency to per-region endpoints.
+
+    `tcp://host:port` endpoints time the TCP handshake; `http(s)://` endpoints time a
+    HEAD request up to the response headers over a pooled connection. Probes run
+    concurrently, at most `max_concurrency` at a time, and each round is spread over
+    `spread` seconds with random offsets so probes do not leave in one burst.
+    Results feed rolling p50/p95/p99 sketches per (source, region).
+    """
+
+    def __init__(
+        self,
+        endpoints: Optional[Dict[str, str]] = None,
+        source: str = "local",
+        max_concurrency: int = 256,
+        timeout: float = 2.0,
+        spread: float = 0.1,
+        window: float = DEFAULT_PROBE_WINDOW,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.endpoints = default_endpoints() if endpoints is None else dict(endpoints)
+        self.source = source # Where the probes run from, e.g. the operator's own region
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.spread = spread
+        self.window = window
+        self.clock = clock
+        self.sketches: Dict[Tuple[str, str], RollingSketch] = {}
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._session = None # Shared aiohttp.ClientSession, created lazily
+        logger.info("LatencyProber initialized with %s endpoints", len(self.endpoints))
+
+    async def probe_all(self, regions: Optional[Sequence[str]] = None) -> List[ProbeResult]:
+        """
+        Probe the given regions (default: all with an endpoint) once, concurrently.
+        """
+        regions = [r for r in (regions if regions is not None else self.endpoints) if r in self.endpoints]
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        results = await asyncio.gather(*(self._probe_jittered(region) for region in regions))
+
+        failed = [r for r in results if r.latency_ms is None]
+        if failed:
+            logger.warning("%s/%s latency probes failed, e.g. %s: %s", len(failed), len(results), failed[0].region, failed[0].error)
+        return list(results)
+
+    async def probe(self, region: str) -> ProbeResult:
+        endpoint = self.endpoints[region]
+        url = urlsplit(endpoint)
+        try:
+            if url.scheme == "tcp":
+                latency = await asyncio.wait_for(self._time_tcp(url.hostname, url.port), timeout=self.timeout)
+            else:
+                latency = await asyncio.wait_for(self._time_http(endpoint), timeout=self.timeout)
+        except Exception as e:
+            return ProbeResult(region, endpoint, None, f"{type(e).__name__}: {e}")
+
+        self._sketch(region).add(latency)
+        return ProbeResult(region, endpoint, latency)
+
+    def quantiles(self, region: str, qs: Sequence[float] = DEFAULT_QUANTILES) -> Dict[float, float]:
+        """
+        Rolling latency quantiles in ms from this prober's source to a region; empty
+        if the region has no recent successful probes.
+        """
+        sketch = self.sketches.get((self.source, region))
+        return sketch.quantiles(qs) if sketch is not None else {}
+
+    async def probe_periodically(self, interval: float = 60.0, jitter: float = 0.1):
+        """
+        Probe every endpoint about every `interval` seconds, +/- `jitter` of it.
+        """
+        while True:
+            try:
+                await self.probe_all()
+            except Exception as e:
+                logger.warning("Latency probe round failed: %s", e)
+            await asyncio.sleep(interval * random.uniform(1 - jitter, 1 + jitter))
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    async def _probe_jittered(self, region: str) -> ProbeResult:
+        if self.spread > 0:
+            await asyncio.sleep(random.uniform(0, self.spread))
+        async with self._semaphore:
+            return await self.probe(region)
+
+    async def _time_tcp(self, host: str, port: int) -> float:
+        start = time.perf_counter()
+        _, writer = await asyncio.open_connection(host, port)
+        latency = (time.perf_counter() - start) * 1000.0
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except OSError:
+            pass
+        return latency
+
+    async def _time_http(self, url: str) -> float:
+        session = await self._get_session()
+        start = time.perf_counter()
+        async with session.head(url, allow_redirects=False) as resp:
+            latency = (time.perf_counter() - start) * 1000.0
+            await resp.release()
+        return latency
+
+    async def _get_session(self):
+        if self._session is None or self._session.closed:
+            import aiohttp
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.max_concurrency, ttl_dns_cache=300)
+            )
+        return self._session
+
+    def _sketch(self, region: str) -> RollingSketch:
+        key = (self.source, region)
+        sketch = self.sketches.get(key)
+        if sketch is None:
+            sketch = self.sketches[key] = RollingSketch(window=self.window, clock=self.clock)
+        return sketch
@@ -1,157 +1,448 @@
 import asyncio
 import logging
-import random
-from typing import List, Dict
-from datetime import datetime
+import time
+import numpy as np
+from dataclasses import dataclass, field, replace
+from functools import cached_property
+from types import MappingProxyType
+from typing import Callable, List, Dict, Mapping, Optional, Sequence, Tuple, Union
 
+from guardian.features import REGION_COORDINATES, nominal_latency
 from guardian.models import CloudPricing, CloudProvider, WorkloadCurrentState
+from guardian.instrumentation import PRICING_CACHE_REQUESTS, PRICING_FETCH_FAILURES, PRICING_MOCK_FALLBACKS, PRICING_SNAPSHOT_VERSION
+from guardian.latency_probe import LatencyProber
+from guardian.price_history import PriceHistory
+from guardian.tables import PROVIDERS, OptionTable, PricingRow, PricingTable
+from guardian.workload_cache import WorkloadCache
+from guardian.pricing_sources import AwsSpotPricingSource, AzureRetailPricingSource, GcpPricingSource, PricingSource
 
 logger = logging.getLogger(__name__)
 
+# Seconds to wait before retrying a feed whose fetch failed
+FAILURE_RETRY_SECONDS = 60.0
+# Seconds of spot price history that make up a SKU's price trend
+PRICE_TREND_WINDOW = 3600.0
+
+
+@dataclass(frozen=True)
+class PricingSnapshot:
+    """
+    Immutable, monotonically versioned view of the pricing data of every provider feed,
+    held as one columnar table.
+    """
+    version: int
+    table: PricingTable
+    fetched_at: Mapping[str, float] # feed -> time.monotonic() of its last successful fetch
+    created_at: float = field(default_factory=time.monotonic)
+
+    def age(self, feed: str) -> float:
+        return time.monotonic() - self.fetched_at.get(feed, float("-inf"))
+
+    @cached_property
+    def items(self) -> Tuple[CloudPricing, ...]:
+        """
+        One CloudPricing per row, built on first use for API consumers.
+        """
+        return tuple(self.table.to_pricing())
+
+
+@dataclass(frozen=True)
+class PriceTrend:
+    """
+    Spot price of one SKU over the recent trend window.
+    """
+    current: float
+    mean: float
+    minimum: float
+    maximum: float
+    samples: int
+
+    @property
+    def ratio(self) -> float:
+        """
+        Window mean relative to the current price; > 1 means the current price is a dip.
+        """
+        return self.mean / self.current if self.current > 0 else 1.0
+
+
+@dataclass(frozen=True)
+class PriceChange:
+    """
+    Spot price change of one SKU between two snapshots; None if the SKU was added or removed.
+    """
+    provider: CloudProvider
+    region: str
+    instance_type: str
+    old_price: Optional[float]
+    new_price: Optional[float]
+
+    @property
+    def relative_change(self) -> float:
+        if self.old_price is None or self.new_price is None or self.old_price <= 0:
+            return float("inf")
+        return abs(self.new_price - self.old_price) / self.old_price
+
+
+@dataclass(frozen=True)
+class PricingDiff:
+    """
+    What changed between two consecutive pricing snapshots.
+    """
+    old_version: Optional[int]
+    new_version: int
+    changes: Tuple[PriceChange, ...]
+
+
+# Called with every non-empty diff when a snapshot is published
+PricingListener = Callable[[PricingDiff], None]
+
+
+def as_table(data: Union[PricingTable, Sequence[CloudPricing]]) -> PricingTable:
+    """
+    Feed data as a PricingTable; sources that still return CloudPricing lists are converted once.
+    """
+    return data if isinstance(data, PricingTable) else PricingTable.from_pricing(data)
+
+
+def default_pricing_sources() -> List[PricingSource]:
+    return [AwsSpotPricingSource(), AzureRetailPricingSource(), GcpPricingSource()]
+
+
 class MetricsCollector:
-    def __init__(self):
-        self.pricing_cache: Dict[str, CloudPricing] = {}
+    def __init__(
+        self,
+        sources: Optional[List[PricingSource]] = None,
+        provider_ttls: Optional[Dict[str, float]] = None,
+        provider_timeouts: Optional[Dict[str, float]] = None,
+        trend_window: float = PRICE_TREND_WINDOW,
+        price_history: Optional[PriceHistory] = None,
+        latency_prober: Optional[LatencyProber] = None,
+        workload_cache: Optional[WorkloadCache] = None
+    ):
+        self.pricing_cache: Dict[Tuple[CloudProvider, str, str], int] = {} # SKU -> row of the latest snapshot's table
+        self.trend_window = trend_window
+        self.price_history = price_history or PriceHistory() # Every fetched price, for trends, training and dashboards
+        self.latency_prober = latency_prober or LatencyProber()
+        self.workload_cache = workload_cache or WorkloadCache()
+        self.sources: Dict[str, PricingSource] = {source.name: source for source in (sources or default_pricing_sources())}
+        self.provider_ttls: Dict[str, float] = {name: source.ttl for name, source in self.sources.items()}
+        self.provider_ttls.update(provider_ttls or {})
+        self.provider_timeouts: Dict[str, float] = {name: source.timeout for name, source in self.sources.items()}
+        self.provider_timeouts.update(provider_timeouts or {})
+        self.snapshot: Optional[PricingSnapshot] = None
+
+        self._feed_data: Dict[str, Tuple[float, PricingTable]] = {}
+        self._recorded: Dict[str, PricingTable] = {} # Feed data last appended to the price history
+        self._retry_after: Dict[str, float] = {}
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._refreshing: Optional[asyncio.Task] = None
+        self._listeners: List[PricingListener] = []
+        self._trend_ratios: Optional[Tuple[PricingTable, np.ndarray]] = None # Last table and its trend ratios
         logger.info("MetricsCollector initialized")
 
     async def collect_pricing(self) -> List[CloudPricing]:
         """
-        Fetch pricing data. Tries real cloud APIs first; falls back to mock if fails (e.g., no credentials).
+        Return pricing data from the latest snapshot.
+        Tries real cloud APIs first; falls back to mock if fails (e.g., no credentials).
         """
-        logger.info("Collecting cloud pricing data...")
-        
-        data = []
-        try:
-            # Attempt to fetch real AWS spot prices
-            import boto3
-            from botocore.exceptions import NoCredentialsError, ClientError
-            
-            # Run in thread pool since boto3 is synchronous
-            def fetch_aws_spot():
-                session = boto3.Session()
-                ec2 = session.client('ec2', region_name='us-east-1')
-                # Request spot price history for last hour
-                response = ec2.describe_spot_price_history(
-                    InstanceTypes=['m5.large', 'c5.large', 'p3.2xlarge'],
-                    ProductDescriptions=['Linux/UNIX'],
-                    StartTime=datetime.utcnow() 
-                )
-                return response['SpotPriceHistory']
-
-            logger.info("Attempting to connect to AWS API for real-time spot prices...")
-            loop = asyncio.get_event_loop()
-            history = await loop.run_in_executor(None, fetch_aws_spot)
-            
-            for item in history:
-                # Naive mapping: Use spot price as is, assume on-demand is 3x (mocked) for comparison
-                price = float(item['SpotPrice'])
-                data.append(CloudPricing(
-                    provider=CloudProvider.AWS,
-                    region=item['AvailabilityZone'][:-1], # us-east-1a -> us-east-1
-                    instance_type=item['InstanceType'],
-                    price_on_demand=price * 3.5, # Mock ratio
-                    price_spot=price,
-                    timestamp=item['Timestamp']
-                ))
-            
-            logger.info(f"Successfully fetched {len(data)} real spot prices from AWS")
-            
-        except (ImportError, Exception) as e:
-            logger.warning(f"Could not fetch real AWS data ({type(e).__name__}: {str(e)}). Using MOCK data.")
-            # Fallback to Mock Data
-            data = [
-                CloudPricing(provider=CloudProvider.AWS, region="us-east-1", instance_type="m5.large", price_on_demand=0.096, price_spot=0.035),
-                CloudPricing(provider=CloudProvider.AWS, region="us-west-2", instance_type="m5.large", price_on_demand=0.10, price_spot=0.040),
-                CloudPricing(provider=CloudProvider.GCP, region="us-central1", instance_type="e2-standard-2", price_on_demand=0.067, price_spot=0.020),
-                CloudPricing(provider=CloudProvider.AZURE, region="eastus", instance_type="D2s_v3", price_on_demand=0.096, price_spot=0.025),
-            ]
-        
-        # Cache results
-        for item in data:
-            key = f"{item.provider}-{item.region}-{item.instance_type}"
-            self.pricing_cache[key] = item
-            
-        # --- Multi-Cloud Support ---
-        # 2. Azure Spot Prices
+        snapshot = await self.latest_snapshot()
+        return list(snapshot.items)
+
+    async def latest_snapshot(self) -> PricingSnapshot:
+        """
+        Return the latest pricing snapshot without waiting on the network.
+        Stale feeds are revalidated in the background (stale-while-revalidate);
+        only the very first call, before any snapshot exists, awaits a fetch.
+        """
+        if self.snapshot is None:
+            PRICING_CACHE_REQUESTS.labels(result="miss").inc()
+            return await self.refresh()
+
+        if self.stale_feeds():
+            PRICING_CACHE_REQUESTS.labels(result="stale").inc()
+            if not self._refresh_in_flight():
+                self._refreshing = asyncio.create_task(self._revalidate())
+        else:
+            PRICING_CACHE_REQUESTS.labels(result="hit").inc()
+        return self.snapshot
+
+    def stale_feeds(self) -> List[str]:
+        now = time.monotonic()
+        return [
+            feed for feed in self.sources
+            if now >= self._retry_after.get(feed, 0.0) and (
+                feed not in self._feed_data or now - self._feed_data[feed][0] >= self.provider_ttls.get(feed, 0.0)
+            )
+        ]
+
+    def feed_data(self, feed: str) -> Optional[Tuple[float, PricingTable]]:
+        """
+        The data currently served for one feed and its age in seconds (infinite for fallback data).
+        """
+        if feed not in self._feed_data:
+            return None
+        fetched, data = self._feed_data[feed]
+        return time.monotonic() - fetched, data
+
+    def add_listener(self, listener: PricingListener):
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener: PricingListener):
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    async def refresh_periodically(self, max_interval: float = 60.0):
+        """
+        Refresh every feed as soon as its TTL expires, so price changes are published
+        (and listeners notified) without anyone polling. Sleeps until the next feed
+        goes stale, so an idle fleet does next to nothing.
+        """
+        while True:
+            if self.stale_feeds():
+                try:
+                    await self.refresh()
+                except Exception as e:
+                    logger.warning("Periodic pricing refresh failed: %s", e)
+            await asyncio.sleep(self._until_next_stale(max_interval))
+
+    def _until_next_stale(self, max_interval: float) -> float:
+        now = time.monotonic()
+        delay = max_interval
+        for feed in self.sources:
+            fetched = self._feed_data.get(feed, (float("-inf"), None))[0]
+            due = max(fetched + self.provider_ttls.get(feed, 0.0), self._retry_after.get(feed, 0.0))
+            delay = min(delay, due - now)
+        return max(delay, 1.0)
+
+    def get_price(self, provider: CloudProvider, region: str, instance_type: str) -> Optional[PricingRow]:
+        index = self.pricing_cache.get((provider, region, instance_type))
+        return self.snapshot.table[index] if index is not None else None
+
+    def price_trend(self, provider: CloudProvider, region: str, instance_type: str) -> Optional[PriceTrend]:
+        stats = self.price_history.stats(provider, region, instance_type, self.trend_window, percentiles=())
+        if stats is None:
+            # Unchanged for longer than the window; the last known price still holds
+            latest = self.price_history.latest(provider, region, instance_type)
+            if latest is None:
+                return None
+            _, price = latest
+            return PriceTrend(current=price, mean=price, minimum=price, maximum=price, samples=1)
+        return PriceTrend(
+            current=stats.current,
+            mean=stats.mean,
+            minimum=stats.minimum,
+            maximum=stats.maximum,
+            samples=stats.samples
+        )
+
+    def trend_ratios(self, table: PricingTable) -> np.ndarray:
+        """
+        PriceTrend.ratio of every row of a pricing table (1.0 without history), aligned
+        with its rows. Computed once per table, i.e. once per snapshot, and shared by
+        every decision made against it.
+        """
+        cached = self._trend_ratios
+        if cached is not None and cached[0] is table:
+            return cached[1]
+        ratios = np.ones(len(table))
+        for i, (code, region, instance_type) in enumerate(zip(table.provider_codes, table.regions, table.instance_types)):
+            trend = self.price_trend(PROVIDERS[code], region, instance_type)
+            if trend is not None:
+                ratios[i] = trend.ratio
+        ratios.setflags(write=False)
+        self._trend_ratios = (table, ratios)
+        return ratios
+
+    def calibrate_latency(self, table: OptionTable) -> OptionTable:
+        """
+        Replace the model's predicted latency of every option with the prober's rolling
+        p50 to its region, where the region has recent probes. Options in regions
+        without probes are scaled by the median measured/predicted ratio of the probed
+        ones. Tables with no probed region are returned as is.
+        """
+        if not len(table):
+            return table
+        regions, codes = np.unique(table.regions.astype(str), return_inverse=True)
+        measured = np.array([self.latency_prober.quantiles(region, (0.5,)).get(0.5, np.nan) for region in regions])[codes.reshape(-1)]
+        probed = ~np.isnan(measured)
+        if not probed.any():
+            return table
+
+        predicted = table.predicted_latency
+        comparable = probed & (predicted > 0)
+        ratio = float(np.median(measured[comparable] / predicted[comparable])) if comparable.any() else 1.0
+        return replace(table, predicted_latency=np.where(probed, measured, predicted * ratio))
+
+    def default_latency(self, region: str) -> float:
+        """
+        Expected latency in ms to a region without recent probes: its nominal,
+        distance-based latency (a typical region's for unknown coordinates), scaled by
+        the median measured/nominal ratio of the probed regions like calibrate_latency.
+        """
+        nominal = nominal_latency(region)
+        if np.isnan(nominal):
+            nominal = float(np.median([nominal_latency(known) for known in REGION_COORDINATES]))
+        ratios = []
+        for source, probed in self.latency_prober.sketches:
+            measured = self.latency_prober.quantiles(probed, (0.5,)).get(0.5) if source == self.latency_prober.source else None
+            expected = nominal_latency(probed)
+            if measured is not None and expected > 0:
+                ratios.append(measured / expected)
+        return nominal * float(np.median(ratios)) if ratios else nominal
+
+    async def refresh(self, force: bool = False) -> PricingSnapshot:
+        """
+        Refetch stale feeds (or all of them if force) and publish a new snapshot.
+        Concurrent callers join the refresh already in flight, and each feed has
+        at most one fetch in flight (single-flight).
+        """
+        if force or not self._refresh_in_flight():
+            self._refreshing = asyncio.create_task(self._refresh(force))
+        return await asyncio.shield(self._refreshing)
+
+    def _refresh_in_flight(self) -> bool:
+        return self._refreshing is not None and not self._refreshing.done()
+
+    async def _refresh(self, force: bool) -> PricingSnapshot:
+        feeds = list(self.sources) if force else self.stale_feeds()
+        # Wall-clock time is bounded by the slowest provider, not the sum
+        await asyncio.gather(*(self._fetch_feed(feed) for feed in feeds))
+
+        if feeds or self.snapshot is None:
+            self._publish()
+        return self.snapshot
+
+    async def _revalidate(self) -> Optional[PricingSnapshot]:
         try:
-            # Azure Retail Prices API (Public, no auth needed for basic price checking, easier for portfolio demo than full SDK auth dance)
-            # However, we'll implement a clean request pattern using aiohttp which we already have.
-            logger.info("Attempting to fetch Azure Spot prices...")
-            import aiohttp
-            
-            async def fetch_azure_retail():
-                url = "https://prices.azure.com/api/retail/prices?currencyCode='USD'&$filter=priceType eq 'Consumption' and (skuName eq 'D2s v3' or skuName eq 'F2s v2')"
-                async with aiohttp.ClientSession() as session:
-                    async with session.get(url) as resp:
-                        if resp.status == 200:
-                            return await resp.json()
-                        return None
-
-            azure_data = await fetch_azure_retail()
-            if azure_data and 'Items' in azure_data:
-                for item in azure_data['Items']:
-                    # Azure Retail API returns generic prices, spot is trickier, 
-                    # but for this SRE tool we'll treat 'Consumption' as base and mock a discount for spot
-                    # since simpler APIs don't always expose dynamic spot rates easily without a sub.
-                    base_price = item.get('retailPrice', 0.096)
-                    data.append(CloudPricing(
-                        provider=CloudProvider.AZURE,
-                        region=item.get('location', 'eastus'),
-                        instance_type=item.get('skuName', 'D2s_v3'),
-                        price_on_demand=base_price,
-                        price_spot=base_price * 0.3, # Mock spot discount (Azure Spot is often ~70-90% off)
-                        timestamp=datetime.utcnow()
-                    ))
-                logger.info(f"Fetched {len(azure_data['Items'])} Azure price items")
+            return await self._refresh(force=False)
         except Exception as e:
-            logger.warning(f"Could not fetch Azure data: {e}")
+            logger.warning("Background pricing refresh failed: %s", e)
+            return self.snapshot
+
+    async def _fetch_feed(self, feed: str) -> PricingTable:
+        task = self._inflight.get(feed)
+        if task is None:
+            task = asyncio.create_task(
+                asyncio.wait_for(self.sources[feed].fetch(), timeout=self.provider_timeouts.get(feed))
+            )
+            self._inflight[feed] = task
+            task.add_done_callback(lambda _, feed=feed: self._inflight.pop(feed, None))
 
-        # 3. GCP Spot Prices
         try:
-            logger.info("Attempting to fetch GCP machine types...")
-            # Using google-cloud-compute to at least verify credentials and list types
-            # Spot prices in GCP are static per region/month usually, so listing machine types is the connection check.
-            from google.cloud import compute_v1
-            
-            def fetch_gcp_zones():
-                client = compute_v1.ZonesClient()
-                request = compute_v1.ListZonesRequest(project="my-project-id", max_results=5) # Will fail if no creds
-                return client.list(request=request)
-
-            # verify we can load lib
-            # Real GCP pricing extraction usually involves parsing the SKU catalog which is huge.
-            # For this tool, we simulate the 'connect' check.
-            pass 
-
-        except ImportError:
-            pass
-        except Exception:
-            # Likely 'DefaultCredentialsError', expected in demo env
-            logger.warning("GCP Credentials not found, skipping real GCP fetch.")
+            data = await asyncio.shield(task)
+        except Exception as e:
+            # Keep serving the previous data for this feed; it stays stale and is retried later
+            logger.warning("Pricing fetch for %s failed (%s: %s)", feed, type(e).__name__, e)
+            PRICING_FETCH_FAILURES.labels(feed=feed).inc()
+            self._retry_after[feed] = time.monotonic() + min(FAILURE_RETRY_SECONDS, self.provider_ttls.get(feed, 0.0))
+            if feed not in self._feed_data:
+                fallback = as_table(self.sources[feed].fallback())
+                if len(fallback):
+                    logger.warning("Using MOCK data for %s", feed)
+                    PRICING_MOCK_FALLBACKS.labels(feed=feed).inc()
+                self._feed_data[feed] = (float("-inf"), fallback)
+            return self._feed_data[feed][1]
 
+        self._retry_after.pop(feed, None)
+        data = as_table(data)
+        self._feed_data[feed] = (time.monotonic(), data)
         return data
 
+    async def close(self):
+        for source in self.sources.values():
+            await source.close()
+        await self.latency_prober.close()
+
+    def _publish(self):
+        table = PricingTable.concat([data for _, data in self._feed_data.values()])
+        previous = self.snapshot
+        version = previous.version + 1 if previous else 1
+        self.snapshot = PricingSnapshot(
+            version=version,
+            table=table,
+            fetched_at=MappingProxyType({feed: fetched for feed, (fetched, _) in self._feed_data.items()})
+        )
+        PRICING_SNAPSHOT_VERSION.set(version)
+
+        # Newly fetched feeds are appended to the history
+        now = self.price_history.clock()
+        for feed, (_, data) in self._feed_data.items():
+            if self._recorded.get(feed) is not data:
+                self.price_history.append_table(data, now)
+                self._recorded[feed] = data
+
+        # Per-SKU index of the latest snapshot
+        cache = {key: index for index, key in enumerate(table.keys)}
+        diff = self._diff(previous.table if previous else None, self.pricing_cache, table, cache, previous.version if previous else None, version)
+        self.pricing_cache = cache
+        logger.info("Published pricing snapshot v%s with %s items (%s changed)", version, len(table), len(diff.changes))
+
+        if diff.changes:
+            for listener in list(self._listeners):
+                try:
+                    listener(diff)
+                except Exception as e:
+                    logger.error("Pricing listener failed: %s", e)
+
+    def _diff(
+        self,
+        old_table: Optional[PricingTable],
+        old: Dict[Tuple[CloudProvider, str, str], int],
+        new_table: PricingTable,
+        new: Dict[Tuple[CloudProvider, str, str], int],
+        old_version: Optional[int],
+        new_version: int
+    ) -> PricingDiff:
+        old_spot = old_table.price_spot.tolist() if old_table is not None else []
+        old_on_demand = old_table.price_on_demand.tolist() if old_table is not None else []
+        new_spot, new_on_demand = new_table.price_spot.tolist(), new_table.price_on_demand.tolist()
+        changes = []
+        for key, i in new.items():
+            j = old.get(key)
+            if j is None or old_spot[j] != new_spot[i] or old_on_demand[j] != new_on_demand[i]:
+                changes.append(PriceChange(*key, old_spot[j] if j is not None else None, new_spot[i]))
+        for key, j in old.items():
+            if key not in new:
+                changes.append(PriceChange(*key, old_spot[j], None))
+        return PricingDiff(old_version=old_version, new_version=new_version, changes=tuple(changes))
+
     async def measure_latency(self, workload_name: str, target_regions: List[str]) -> Dict[str, float]:
         """
-        Simulate measuring latency from the workload to various regions.
-        Real impl would use active probing or simple ping checks.
+        Probe the target regions and return their rolling median latency in ms.
+        Regions without an endpoint or without recent successful probes are left out.
         """
+        await self.latency_prober.probe_all(target_regions)
         results = {}
         for region in target_regions:
-            # Simulate latency between 20ms and 150ms
-            results[region] = round(random.uniform(20.0, 150.0), 1)
+            quantiles = self.latency_prober.quantiles(region, (0.5,))
+            if quantiles:
+                results[region] = round(quantiles[0.5], 1)
         return results
 
     async def get_current_state(self, workload_name: str, namespace: str) -> WorkloadCurrentState:
         """
-        Fetch current state of the workload from K8s.
+        Current placement of a workload from the workload cache. The daily cost is
+        each node type's spot price times the share of the node the pods request,
+        the same price basis as the model's candidate costs. Latency is the rolling
+        median probe latency to the region, or default_latency until it is probed.
         """
-        # Mock implementation
+        placement = self.workload_cache.placement(namespace, workload_name)
+        if placement is None:
+            raise LookupError(f"No scheduled pods known for {namespace}/{workload_name}")
+
+        cost = 0.0
+        for (cloud, region, instance_type), share in placement.node_shares.items():
+            pricing = self.get_price(cloud, region, instance_type)
+            if pricing is not None:
+                cost += pricing.price_spot * 24 * share
+        quantiles = self.latency_prober.quantiles(placement.region, (0.5,))
+        latency = quantiles[0.5] if quantiles else self.default_latency(placement.region)
+
         return WorkloadCurrentState(
             workload_name=workload_name,
             namespace=namespace,
-            current_cloud=CloudProvider.AWS,
-            current_region="us-east-1",
-            current_cost=2.30, # Daily cost
-            current_latency=35.0
+            current_cloud=placement.cloud,
+            current_region=placement.region,
+            current_cost=round(cost, 4),
+            current_latency=round(latency, 1)
         )
-
@@ -1,13 +1,105 @@
 import logging
 import asyncio
-from guardian.models import PlacementRecommendation, CloudProvider
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+from guardian.data_sync import DEFAULT_CONVERGE_BYTES, DeltaSync
+from guardian.instrumentation import phase_timer
+from guardian.models import PlacementRecommendation, CloudProvider, WorkloadCurrentState
+from guardian.outcomes import Outcome, OutcomeLog
+from guardian.tables import PricingRow
 
 logger = logging.getLogger(__name__)
 
+# (workload_name, namespace) -> observed state of the workload
+StateObserver = Callable[[str, str], Awaitable[WorkloadCurrentState]]
+# (provider, region, instance_type) -> current pricing of that SKU
+PriceLookup = Callable[[CloudProvider, str, str], Optional[PricingRow]]
+# migration -> (source, target) directories of the workload's data, or None if it is stateless
+VolumeLocator = Callable[[PlacementRecommendation], Optional[Tuple[Path, Path]]]
+# migration -> stops writes to the source volumes ahead of the final sync
+WriteFreezer = Callable[[PlacementRecommendation], Awaitable[None]]
+# seconds -> waits that long; asyncio.sleep, or a simulated clock in benchmarks
+Sleep = Callable[[float], Awaitable[None]]
+
+# Migration phases, in execution order
+PREFLIGHT = "preflight"
+PROVISION = "provision"
+SYNC = "sync"
+CUTOVER = "cutover"
+VERIFY = "verify"
+DECOMMISSION = "decommission"
+PHASES = [PREFLIGHT, PROVISION, SYNC, CUTOVER, VERIFY, DECOMMISSION]
+
+# Phases with side effects that are undone when a migration is rolled back. Syncing
+# only copies data (the source stays authoritative) and the others only read.
+REVERSIBLE_PHASES = {PROVISION, CUTOVER}
+
+# Simulated duration of each phase, in seconds
+DEFAULT_PHASE_DURATIONS: Dict[str, float] = {
+    PREFLIGHT: 1.0,
+    PROVISION: 2.0,
+    SYNC: 1.5,
+    CUTOVER: 1.0,
+    VERIFY: 1.0,
+    DECOMMISSION: 1.0,
+}
+
+# How long to wait for the workload cache to report a migrated workload on its target
+OUTCOME_TIMEOUT = 600.0
+OUTCOME_POLL_INTERVAL = 15.0
+
 class MigrationOrchestrator:
-    def __init__(self):
+    def __init__(
+        self,
+        outcome_log: Optional[OutcomeLog] = None,
+        state_observer: Optional[StateObserver] = None,
+        price_lookup: Optional[PriceLookup] = None,
+        phase_durations: Optional[Dict[str, float]] = None,
+        volume_locator: Optional[VolumeLocator] = None,
+        write_freezer: Optional[WriteFreezer] = None,
+        converge_bytes: int = DEFAULT_CONVERGE_BYTES,
+        sleep: Sleep = asyncio.sleep,
+        outcome_timeout: float = OUTCOME_TIMEOUT,
+        outcome_poll_interval: float = OUTCOME_POLL_INTERVAL
+    ):
+        self.outcome_log = outcome_log
+        self.state_observer = state_observer
+        self.price_lookup = price_lookup
+        self.phase_durations = dict(DEFAULT_PHASE_DURATIONS, **(phase_durations or {}))
+        self.volume_locator = volume_locator
+        self.write_freezer = write_freezer
+        self.converge_bytes = converge_bytes
+        self.sleep = sleep
+        self.outcome_timeout = outcome_timeout
+        self.outcome_poll_interval = outcome_poll_interval
+        self._outcome_tasks: Set[asyncio.Task] = set()
+        self._syncs: Dict[Tuple[str, str, CloudProvider, str], DeltaSync] = {} # In-flight volume syncs per migration
         logger.info("MigrationOrchestrator initialized")
 
+    async def execute_with_fallback(self, recommendation: PlacementRecommendation) -> Optional[PlacementRecommendation]:
+        """
+        Execute the recommended migration, falling back to the ranked alternatives
+        in order if it fails. Returns the recommendation that succeeded, if any.
+        """
+        for attempt in self.attempts(recommendation):
+            if await self.execute_migration(attempt):
+                return attempt
+            logger.warning("Falling back to next placement option for %s", recommendation.workload_name)
+        return None
+
+    def attempts(self, recommendation: PlacementRecommendation) -> List[PlacementRecommendation]:
+        """
+        The recommendation followed by one recommendation per ranked alternative.
+        """
+        return [recommendation] + [
+            recommendation.model_copy(update={
+                "recommended_option": option,
+                "estimated_savings": round(recommendation.current_state.current_cost - option.predicted_cost, 2),
+                "alternatives": []
+            })
+            for option in recommendation.alternatives
+        ]
+
     async def execute_migration(self, recommendation: PlacementRecommendation) -> bool:
         """
         Execute the migration plan.
@@ -22,37 +114,190 @@ class MigrationOrchestrator:
         target_cloud = recommendation.recommended_option.cloud
         target_region = recommendation.recommended_option.region
         
-        logger.info(f"STARTING MIGRATION: Moving {workload} from {recommendation.current_state.current_cloud} to {target_cloud} ({target_region})")
+        logger.info("STARTING MIGRATION: Moving %s from %s to %s (%s)", workload, recommendation.current_state.current_cloud, target_cloud, target_region)
         
+        completed = []
         try:
-            # Step 1: Pre-flight checks
-            logger.info(f"[{workload}] Pre-flight checks on {target_cloud}...")
-            await asyncio.sleep(1.0)
+            for phase in PHASES:
+                await self.run_phase(phase, recommendation)
+                completed.append(phase)
             
-            # Step 2: Provisioning
-            logger.info(f"[{workload}] Provisioning resources in {target_region}...")
-            await asyncio.sleep(2.0)
+            logger.info("MIGRATION COMPLETE: %s is now running on %s", workload, target_cloud)
+            self.observe_outcome(recommendation)
+            return True
             
+        except Exception as e:
+            failed_phase = PHASES[len(completed)]
+            logger.error("Migration failed for %s in phase %s: %s", workload, failed_phase, str(e))
+            if failed_phase != DECOMMISSION: # Traffic already runs on the target otherwise
+                await self.rollback(recommendation, completed)
+            return False
+
+    async def run_phase(self, phase: str, recommendation: PlacementRecommendation):
+        """
+        Run a single migration phase. Raises if the phase fails.
+        """
+        with phase_timer(phase):
+            await self._execute_phase(phase, recommendation)
+
+    async def _execute_phase(self, phase: str, recommendation: PlacementRecommendation):
+        workload = recommendation.workload_name
+        if phase == PREFLIGHT:
+            # Step 1: Pre-flight checks
+            logger.info("[%s] Pre-flight checks on %s...", workload, recommendation.recommended_option.cloud)
+        elif phase == PROVISION:
+            # Step 2: Provisioning
+            logger.info("[%s] Provisioning resources in %s...", workload, recommendation.recommended_option.region)
+        elif phase == SYNC:
             # Step 3: Data Sync / State replication
-            logger.info(f"[{workload}] Syncing data/volumes...")
-            await asyncio.sleep(1.5)
-            
+            # Bulk copy plus delta passes while the workload keeps serving writes
+            logger.info("[%s] Syncing data/volumes...", workload)
+            data_sync = self._data_sync(recommendation)
+            if data_sync is not None:
+                passes = await data_sync.converge()
+                logger.info("[%s] Synced %s bytes in %s passes, %s in the last one", workload, sum(p.bytes_copied for p in passes), len(passes), passes[-1].bytes_copied)
+                return
+        elif phase == CUTOVER:
             # Step 4: Traffic Cutover
-            logger.info(f"[{workload}] Switching DNS/Global Load Balancer...")
-            await asyncio.sleep(1.0)
-            
+            # Writes are frozen only for the final delta, so downtime follows the write rate
+            resumed = self._sync_key(recommendation) not in self._syncs
+            data_sync = self._data_sync(recommendation)
+            if data_sync is not None:
+                if resumed:
+                    # Resumed from a checkpoint after SYNC: the chunk hashes of that run are
+                    # gone, so re-hash source and target before the freeze, not during it
+                    passes = await data_sync.converge()
+                    logger.info("[%s] Re-synced %s bytes in %s passes after resuming", workload, sum(p.bytes_copied for p in passes), len(passes))
+                logger.info("[%s] Freezing writes for the final sync...", workload)
+                if self.write_freezer is not None:
+                    await self.write_freezer(recommendation)
+                final = await data_sync.final_sync()
+                logger.info("[%s] Final sync copied %s bytes in %.2fs", workload, final.bytes_copied, final.seconds)
+            logger.info("[%s] Switching DNS/Global Load Balancer...", workload)
+        elif phase == VERIFY:
             # Step 5: Verification
-            logger.info(f"[{workload}] Verifying health in new location...")
-            await asyncio.sleep(1.0)
-            
+            logger.info("[%s] Verifying health in new location...", workload)
+        elif phase == DECOMMISSION:
             # Step 6: Cleanup
-            logger.info(f"[{workload}] Decommissioning old resources in {recommendation.current_state.current_region}...")
-            await asyncio.sleep(1.0)
-            
-            logger.info(f"MIGRATION COMPLETE: {workload} is now running on {target_cloud}")
-            return True
-            
-        except Exception as e:
-            logger.error(f"Migration failed for {workload}: {str(e)}")
+            logger.info("[%s] Decommissioning old resources in %s...", workload, recommendation.current_state.current_region)
+            self._syncs.pop(self._sync_key(recommendation), None)
+        else:
+            raise ValueError(f"Unknown migration phase: {phase}")
+
+        await self.sleep(self.phase_durations.get(phase, 0.0))
+
+    async def rollback(self, recommendation: PlacementRecommendation, completed_phases: List[str]):
+        """
+        Undo the completed phases of a failed migration, most recent first.
+        """
+        for phase in reversed(completed_phases):
+            await self.rollback_phase(phase, recommendation)
+
+    async def rollback_phase(self, phase: str, recommendation: PlacementRecommendation):
+        """
+        Undo a single phase. Like the phases themselves this is idempotent, so an
+        interrupted rollback can simply be repeated.
+        """
+        self._syncs.pop(self._sync_key(recommendation), None)
+        if phase not in REVERSIBLE_PHASES:
+            return
+
+        workload = recommendation.workload_name
+        if phase == CUTOVER:
+            logger.info("[%s] Rolling back: switching traffic back to %s...", workload, recommendation.current_state.current_region)
+        elif phase == PROVISION:
+            logger.info("[%s] Rolling back: releasing resources in %s...", workload, recommendation.recommended_option.region)
+
+        await self.sleep(self.phase_durations.get(phase, 0.0))
+
+    def _data_sync(self, recommendation: PlacementRecommendation) -> Optional[DeltaSync]:
+        """
+        Volume sync of a migration, kept across phases so later passes only copy deltas.
+        """
+        if self.volume_locator is None:
+            return None
+        key = self._sync_key(recommendation)
+        if key not in self._syncs:
+            volumes = self.volume_locator(recommendation)
+            if volumes is None:
+                return None
+            self._syncs[key] = DeltaSync(*volumes, converge_bytes=self.converge_bytes)
+        return self._syncs[key]
+
+    def _sync_key(self, recommendation: PlacementRecommendation) -> Tuple[str, str, CloudProvider, str]:
+        option = recommendation.recommended_option
+        return (recommendation.namespace, recommendation.workload_name, option.cloud, option.region)
+
+    def phase_provider(self, phase: str, recommendation: PlacementRecommendation) -> CloudProvider:
+        """
+        Cloud whose API a phase talks to: the source for decommissioning, the target otherwise.
+        """
+        if phase == DECOMMISSION:
+            return recommendation.current_state.current_cloud
+        return recommendation.recommended_option.cloud
+
+    def observe_outcome(self, recommendation: PlacementRecommendation) -> Optional[asyncio.Task]:
+        """
+        Record the outcome of a completed migration in the background, so waiting
+        for it to show up does not hold up the next migration.
+        """
+        if self.outcome_log is None or self.state_observer is None or recommendation.cpu_cores is None:
+            return None
+        task = asyncio.create_task(self.record_outcome(recommendation))
+        self._outcome_tasks.add(task)
+        task.add_done_callback(self._outcome_tasks.discard)
+        return task
+
+    async def record_outcome(self, recommendation: PlacementRecommendation) -> bool:
+        """
+        Feed what the new placement actually costs and how it performs back to the outcome log.
+
+        The workload cache lags the cutover, so this waits until the workload is observed
+        on the target. Observations of the source placement would teach the model the
+        source's cost and latency for the target; if the target is never observed within
+        `outcome_timeout`, nothing is recorded. Returns True if an outcome was recorded.
+        """
+        if self.outcome_log is None or self.state_observer is None or recommendation.cpu_cores is None:
             return False
 
+        option = recommendation.recommended_option
+        waited = 0.0
+        while True:
+            try:
+                observed = await self.state_observer(recommendation.workload_name, recommendation.namespace)
+            except Exception as e:
+                logger.debug("Could not observe outcome for %s yet: %s", recommendation.workload_name, e)
+                observed = None
+            if observed is not None and (observed.current_cloud, observed.current_region) == (option.cloud, option.region):
+                break
+            if waited >= self.outcome_timeout:
+                logger.warning("Not recording outcome for %s: not observed on %s/%s within %ss", recommendation.workload_name, option.cloud, option.region, self.outcome_timeout)
+                return False
+            await self.sleep(self.outcome_poll_interval)
+            waited += self.outcome_poll_interval
+
+        option = recommendation.recommended_option
+        pricing = None
+        if self.price_lookup is not None and option.instance_type:
+            pricing = self.price_lookup(option.cloud, option.region, option.instance_type)
+
+        self.outcome_log.record(Outcome(
+            cpu_cores=recommendation.cpu_cores,
+            memory_gb=recommendation.memory_gb or 0.0,
+            cloud=option.cloud,
+            region=option.region,
+            observed_cost=observed.current_cost,
+            observed_latency=observed.current_latency,
+            instance_type=option.instance_type,
+            price_on_demand=pricing.price_on_demand if pricing else None,
+            price_spot=pricing.price_spot if pricing else None
+        ))
+        return True
+
+    async def close(self):
+        """
+        Stop waiting for the outcomes of completed migrations.
+        """
+        for task in list(self._outcome_tasks):
+            task.cancel()
+        await asyncio.gather(*self._outcome_tasks, return_exceptions=True)
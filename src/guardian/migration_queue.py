@@ -0,0 +1,369 @@
+import asyncio
+import logging
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from guardian.migration_orchestrator import (
+    CUTOVER,
+    DECOMMISSION,
+    PREFLIGHT,
+    PROVISION,
+    REVERSIBLE_PHASES,
+    SYNC,
+    VERIFY,
+    MigrationOrchestrator
+)
+from guardian.instrumentation import MIGRATIONS, MIGRATIONS_IN_FLIGHT, span
+from guardian.migration_state import MigrationCheckpoint, MigrationStateStore
+from guardian.models import CloudProvider, PlacementRecommendation
+from guardian.stability import PlacementHistory
+
+logger = logging.getLogger(__name__)
+
+# Migration states
+QUEUED = "Queued"
+RUNNING = "Running"
+SUCCEEDED = "Succeeded"
+FAILED = "Failed"
+
+# Control-plane calls per second allowed against each provider, across all migrations
+DEFAULT_PROVIDER_RATE_LIMITS: Dict[CloudProvider, float] = {
+    CloudProvider.AWS: 10.0,
+    CloudProvider.GCP: 10.0,
+    CloudProvider.AZURE: 10.0,
+}
+
+# Phases that hold a concurrency slot on the target cloud/region. Pre-flight only
+# reads, and decommissioning touches the source, so both run outside the slot and
+# overlap with other migrations to the same target.
+TARGET_PHASES = [PROVISION, SYNC, CUTOVER, VERIFY]
+
+# Phases that call the provider's control-plane API and are rate limited
+API_PHASES = {PREFLIGHT, PROVISION, CUTOVER, DECOMMISSION}
+
+
+class RateLimiter:
+    """
+    Token bucket: allows `rate` acquisitions per second with bursts of up to `burst`.
+    """
+
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        self.rate = rate
+        self.burst = burst if burst is not None else max(1.0, rate)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1.0:
+                    self._tokens -= 1.0
+                    return
+                await asyncio.sleep((1.0 - self._tokens) / self.rate)
+
+
+@dataclass
+class MigrationRecord:
+    """
+    Progress of one queued migration, including its fallback attempts.
+    """
+    migration_id: str
+    workload_name: str
+    namespace: str
+    state: str = QUEUED
+    phase: Optional[str] = None
+    target: Optional[Tuple[CloudProvider, str]] = None # (cloud, region) of the current attempt
+    attempts: int = 0
+    error: Optional[str] = None
+    result: Optional[PlacementRecommendation] = None # The attempt that succeeded
+    resumed: bool = False # Picked up from a checkpoint after a restart
+    submitted_at: float = field(default_factory=time.time)
+    finished_at: Optional[float] = None
+    finished: asyncio.Event = field(default_factory=asyncio.Event, repr=False, compare=False)
+
+    @property
+    def done(self) -> bool:
+        return self.state in (SUCCEEDED, FAILED)
+
+
+class MigrationQueue:
+    """
+    Runs migrations in the background so handlers return immediately with a migration ID.
+
+    At most `max_concurrent` migrations run at once, and at most `region_concurrency`
+    of them hold a given target cloud/region. Phases are pipelined: pre-flight of the
+    next migration to a target runs while the previous one is still syncing there.
+    Calls to each provider's API are rate limited across all migrations.
+
+    With a state store, progress is checkpointed after every phase and resume()
+    continues unfinished migrations after a restart from their last completed phase.
+    Phases are idempotent, so a failed phase is retried on its own; when an attempt
+    finally fails its completed phases are rolled back before the next alternative.
+
+    Successful migrations are recorded in the placement history, with the target
+    they actually moved to, for the decision engine's cooldowns and hysteresis.
+    """
+
+    def __init__(
+        self,
+        orchestrator: MigrationOrchestrator,
+        max_concurrent: int = 4,
+        region_concurrency: int = 1,
+        provider_rate_limits: Optional[Dict[CloudProvider, float]] = None,
+        state_store: Optional[MigrationStateStore] = None,
+        phase_retries: int = 2,
+        retry_delay: float = 1.0,
+        max_history: int = 1000,
+        history: Optional[PlacementHistory] = None
+    ):
+        self.orchestrator = orchestrator
+        self.max_concurrent = max_concurrent
+        self.region_concurrency = region_concurrency
+        self.state_store = state_store
+        self.phase_retries = phase_retries
+        self.retry_delay = retry_delay # Doubles with every retry of a phase
+        self.max_history = max_history
+        self.history = history
+
+        rate_limits = dict(DEFAULT_PROVIDER_RATE_LIMITS, **(provider_rate_limits or {}))
+        self._limiters: Dict[CloudProvider, RateLimiter] = {
+            provider: RateLimiter(rate) for provider, rate in rate_limits.items()
+        }
+        self._target_slots: Dict[Tuple[CloudProvider, str], asyncio.Semaphore] = {}
+        self._pending: "asyncio.Queue[Tuple[MigrationRecord, MigrationCheckpoint]]" = asyncio.Queue()
+        self._records: Dict[str, MigrationRecord] = {}
+        self._active: Dict[Tuple[str, str], str] = {} # (namespace, workload) -> migration ID
+        self._workers: List[asyncio.Task] = []
+        logger.info("MigrationQueue initialized (%s concurrent migrations, %s per region)", max_concurrent, region_concurrency)
+
+    def start(self):
+        if self._workers:
+            return
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.max_concurrent)]
+
+    async def close(self):
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def submit(self, recommendation: PlacementRecommendation) -> str:
+        """
+        Queue a migration and return its ID without waiting for it. A workload that is
+        already being migrated keeps its running migration; its ID is returned instead.
+        """
+        key = (recommendation.namespace, recommendation.workload_name)
+        if key in self._active:
+            return self._active[key]
+
+        record = MigrationRecord(
+            migration_id=uuid.uuid4().hex[:12],
+            workload_name=recommendation.workload_name,
+            namespace=recommendation.namespace
+        )
+        checkpoint = MigrationCheckpoint.start(record.migration_id, recommendation)
+        self._save(checkpoint)
+        self._enqueue(record, checkpoint)
+        logger.info("Queued migration %s for %s", record.migration_id, recommendation.workload_name)
+        return record.migration_id
+
+    def resume(self) -> List[str]:
+        """
+        Re-queue the migrations checkpointed by a previous run of the operator.
+        """
+        if self.state_store is None:
+            return []
+
+        resumed = []
+        for checkpoint in self.state_store.pending():
+            if checkpoint.migration_id in self._records:
+                continue
+            try:
+                recommendation = checkpoint.placement()
+            except ValueError as e:
+                logger.warning("Dropping migration checkpoint %s: %s", checkpoint.migration_id, e)
+                self.state_store.delete(checkpoint.migration_id)
+                continue
+            if (recommendation.namespace, recommendation.workload_name) in self._active:
+                continue
+
+            record = MigrationRecord(
+                migration_id=checkpoint.migration_id,
+                workload_name=recommendation.workload_name,
+                namespace=recommendation.namespace,
+                resumed=True
+            )
+            self._enqueue(record, checkpoint)
+            resumed.append(record.migration_id)
+
+        logger.info("Resumed %s checkpointed migrations", len(resumed))
+        return resumed
+
+    def get(self, migration_id: str) -> Optional[MigrationRecord]:
+        return self._records.get(migration_id)
+
+    async def wait(self, migration_id: str) -> MigrationRecord:
+        record = self._records[migration_id]
+        await record.finished.wait()
+        return record
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._active)
+
+    def _enqueue(self, record: MigrationRecord, checkpoint: MigrationCheckpoint):
+        self.start()
+        self._records[record.migration_id] = record
+        self._active[(record.namespace, record.workload_name)] = record.migration_id
+        MIGRATIONS_IN_FLIGHT.set(len(self._active))
+        self._pending.put_nowait((record, checkpoint))
+
+    async def _worker(self):
+        while True:
+            record, checkpoint = await self._pending.get()
+            try:
+                with span("migrate"):
+                    await self._execute(record, checkpoint)
+            except Exception as e:
+                logger.error("Migration %s crashed: %s", record.migration_id, e)
+                self._finish(record, checkpoint, FAILED, error=str(e))
+            finally:
+                self._pending.task_done()
+
+    async def _execute(self, record: MigrationRecord, checkpoint: MigrationCheckpoint):
+        """
+        Try the recommendation and then its alternatives, like execute_with_fallback,
+        starting from wherever the checkpoint left off.
+        """
+        record.state = RUNNING
+        attempts = self.orchestrator.attempts(checkpoint.placement())
+
+        while checkpoint.attempt < len(attempts):
+            attempt = attempts[checkpoint.attempt]
+            record.attempts = checkpoint.attempt + 1
+            record.target = (attempt.recommended_option.cloud, attempt.recommended_option.region)
+
+            if checkpoint.failed_phase is not None:
+                # Failed, or interrupted while rolling back: finish undoing it and move on
+                await self._rollback(record, attempt, checkpoint)
+                checkpoint.attempt += 1
+                checkpoint.completed_phases = []
+                checkpoint.failed_phase = None
+                self._save(checkpoint)
+                continue
+
+            try:
+                await self._migrate(record, attempt, checkpoint)
+            except Exception as e:
+                record.error = checkpoint.error = str(e)
+                logger.warning("Migration %s to %s/%s failed in %s: %s", record.migration_id, record.target[0], record.target[1], record.phase, e)
+                if record.phase == DECOMMISSION:
+                    # Traffic already runs on the target, so there is nothing to roll back
+                    self.orchestrator.observe_outcome(attempt)
+                    self._finish(record, checkpoint, SUCCEEDED, result=attempt, error=f"Source resources not decommissioned: {e}")
+                    return
+                checkpoint.failed_phase = record.phase
+                self._save(checkpoint)
+                continue
+
+            self.orchestrator.observe_outcome(attempt)
+            self._finish(record, checkpoint, SUCCEEDED, result=attempt)
+            return
+
+        self._finish(record, checkpoint, FAILED, error=record.error)
+
+    async def _migrate(self, record: MigrationRecord, recommendation: PlacementRecommendation, checkpoint: MigrationCheckpoint):
+        await self._run_phase(record, PREFLIGHT, recommendation, checkpoint)
+        remaining = [phase for phase in TARGET_PHASES if phase not in checkpoint.completed_phases]
+        if remaining:
+            async with self._target_slot(*record.target):
+                for phase in remaining:
+                    await self._run_phase(record, phase, recommendation, checkpoint)
+        await self._run_phase(record, DECOMMISSION, recommendation, checkpoint)
+
+    async def _run_phase(self, record: MigrationRecord, phase: str, recommendation: PlacementRecommendation, checkpoint: MigrationCheckpoint):
+        if phase in checkpoint.completed_phases:
+            return
+
+        record.phase = phase
+        for retry in range(self.phase_retries + 1):
+            await self._throttle(phase, recommendation)
+            try:
+                await self.orchestrator.run_phase(phase, recommendation)
+                break
+            except Exception as e:
+                if retry == self.phase_retries:
+                    raise
+                logger.warning("Phase %s of migration %s failed (%s); retrying", phase, record.migration_id, e)
+                await asyncio.sleep(self.retry_delay * 2 ** retry)
+
+        checkpoint.completed_phases.append(phase)
+        self._save(checkpoint)
+
+    async def _rollback(self, record: MigrationRecord, recommendation: PlacementRecommendation, checkpoint: MigrationCheckpoint):
+        """
+        Undo completed phases most recent first, checkpointing after each one.
+        """
+        for phase in reversed(list(checkpoint.completed_phases)):
+            if phase in REVERSIBLE_PHASES:
+                record.phase = phase
+                await self._throttle(phase, recommendation)
+                await self.orchestrator.rollback_phase(phase, recommendation)
+            checkpoint.completed_phases.remove(phase)
+            self._save(checkpoint)
+
+    async def _throttle(self, phase: str, recommendation: PlacementRecommendation):
+        if phase not in API_PHASES:
+            return
+        limiter = self._limiters.get(self.orchestrator.phase_provider(phase, recommendation))
+        if limiter is not None:
+            await limiter.acquire()
+
+    def _save(self, checkpoint: MigrationCheckpoint):
+        if self.state_store is not None:
+            self.state_store.save(checkpoint)
+
+    def _target_slot(self, cloud: CloudProvider, region: str) -> asyncio.Semaphore:
+        key = (cloud, region)
+        if key not in self._target_slots:
+            self._target_slots[key] = asyncio.Semaphore(self.region_concurrency)
+        return self._target_slots[key]
+
+    def _finish(
+        self,
+        record: MigrationRecord,
+        checkpoint: MigrationCheckpoint,
+        state: str,
+        result: Optional[PlacementRecommendation] = None,
+        error: Optional[str] = None
+    ):
+        record.state = state
+        record.result = result
+        record.error = error
+        record.finished_at = time.time()
+        record.finished.set()
+        self._active.pop((record.namespace, record.workload_name), None)
+        MIGRATIONS_IN_FLIGHT.set(len(self._active))
+        MIGRATIONS.labels(result=state.lower()).inc()
+        if self.state_store is not None:
+            self.state_store.delete(checkpoint.migration_id)
+
+        if state == SUCCEEDED and result is not None and self.history is not None:
+            option = result.recommended_option
+            self.history.record_move(record.namespace, record.workload_name, option.cloud, option.region)
+
+        if state == SUCCEEDED:
+            logger.info("Migration %s complete: %s is now running on %s", record.migration_id, record.workload_name, record.target[0])
+        else:
+            logger.error("Migration %s for %s failed after %s attempts", record.migration_id, record.workload_name, record.attempts)
+
+        # Forget the oldest finished migrations beyond max_history
+        finished = [mid for mid, r in self._records.items() if r.done]
+        for mid in finished[:max(0, len(self._records) - self.max_history)]:
+            del self._records[mid]
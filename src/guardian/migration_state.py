@@ -0,0 +1,84 @@
+import json
+import logging
+import re
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Union
+
+from guardian.model_store import atomic_write
+from guardian.models import PlacementRecommendation
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_PATTERN = re.compile(r"^migration-([0-9a-f]+)\.json$")
+
+
+@dataclass
+class MigrationCheckpoint:
+    """
+    Persisted progress of an unfinished migration.
+
+    `attempt` indexes MigrationOrchestrator.attempts(recommendation) (0 is the
+    recommended option, then the ranked alternatives) and `completed_phases` lists
+    the phases of that attempt that finished, in order.
+    """
+    migration_id: str
+    recommendation: Dict[str, Any] # PlacementRecommendation, JSON-serialized
+    attempt: int = 0
+    completed_phases: List[str] = field(default_factory=list)
+    failed_phase: Optional[str] = None
+    error: Optional[str] = None
+    updated_at: str = field(default_factory=lambda: datetime.utcnow().isoformat())
+
+    @classmethod
+    def start(cls, migration_id: str, recommendation: PlacementRecommendation) -> "MigrationCheckpoint":
+        return cls(migration_id=migration_id, recommendation=recommendation.model_dump(mode="json"))
+
+    def placement(self) -> PlacementRecommendation:
+        return PlacementRecommendation.model_validate(self.recommendation)
+
+
+class MigrationStateStore:
+    """
+    Directory of JSON checkpoints, one per unfinished migration.
+
+    Checkpoints are replaced atomically after every phase, so after a restart a
+    migration resumes from its last completed phase. Finished migrations are removed.
+    """
+
+    def __init__(self, directory: Union[str, Path]):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        logger.info("MigrationStateStore initialized at %s", self.directory)
+
+    def save(self, checkpoint: MigrationCheckpoint):
+        checkpoint.updated_at = datetime.utcnow().isoformat()
+        data = json.dumps(asdict(checkpoint), indent=2).encode()
+        atomic_write(self._path(checkpoint.migration_id), lambda f: f.write(data))
+
+    def load(self, migration_id: str) -> Optional[MigrationCheckpoint]:
+        path = self._path(migration_id)
+        if not path.exists():
+            return None
+        return MigrationCheckpoint(**json.loads(path.read_text()))
+
+    def delete(self, migration_id: str):
+        self._path(migration_id).unlink(missing_ok=True)
+
+    def pending(self) -> List[MigrationCheckpoint]:
+        """
+        Unfinished migrations, oldest update first.
+        """
+        found = []
+        for entry in self.directory.iterdir():
+            if not CHECKPOINT_PATTERN.match(entry.name):
+                continue
+            try:
+                found.append(MigrationCheckpoint(**json.loads(entry.read_text())))
+            except (OSError, ValueError, TypeError) as e:
+                logger.warning("Skipping unreadable migration checkpoint %s: %s", entry.name, e)
+        return sorted(found, key=lambda checkpoint: checkpoint.updated_at)
+
+    def _path(self, migration_id: str) -> Path:
+        return self.directory / f"migration-{migration_id}.json"
@@ -1,18 +1,112 @@
+import asyncio
+import copy
+import hashlib
+import json
+import joblib
 import logging
 import numpy as np
-import pandas as pd
-from typing import List, Tuple
+from typing import Any, Callable, List, Optional, Sequence, Tuple, Union
 from sklearn.ensemble import RandomForestRegressor
 from sklearn.multioutput import MultiOutputRegressor
-from guardian.models import CloudPricing, PlacementOption, CloudProvider
+from guardian.models import CloudPricing, PlacementOption
+from guardian.executors import WorkerPool
+from guardian.features import FEATURE_SCHEMA, FeatureEncoder, synthetic_training_set
+from guardian.instrumentation import INFERENCE_ROWS, INFERENCE_SECONDS, Timer
+from guardian.model_store import ModelStore
+from guardian.outcomes import OutcomeLog, Outcome
+from guardian.tables import OptionTable, PricingTable
 
 logger = logging.getLogger(__name__)
 
+# Artifacts trained on another feature schema are never loaded
+FEATURE_SCHEMA_HASH = hashlib.sha256(json.dumps(FEATURE_SCHEMA).encode()).hexdigest()[:16]
+
+def new_model(n_jobs: Optional[int] = None) -> MultiOutputRegressor:
+    # We predict (cost, latency)
+    return MultiOutputRegressor(RandomForestRegressor(n_estimators=100, random_state=42, n_jobs=n_jobs))
+
+def fit_model(X_train: np.ndarray, y_train: np.ndarray, n_jobs: Optional[int] = None) -> MultiOutputRegressor:
+    """
+    Fit a fresh model. Module-level so it can run in a training worker process.
+    """
+    model = new_model(n_jobs)
+    model.fit(X_train, y_train)
+    return model
+
+def extend_model(model: MultiOutputRegressor, X_new: np.ndarray, y_new: np.ndarray, new_trees: int, max_trees: int) -> MultiOutputRegressor:
+    """
+    Grow every forest by `new_trees` trees fit on the new samples only, then drop the
+    oldest trees beyond `max_trees`, so the ensemble covers a sliding window of data.
+    Works on a copy; the model passed in is left untouched.
+    """
+    model = copy.deepcopy(model)
+    for target, forest in enumerate(model.estimators_):
+        forest.set_params(warm_start=True, n_estimators=len(forest.estimators_) + new_trees)
+        forest.fit(X_new, y_new[:, target])
+        forest.estimators_ = forest.estimators_[-max_trees:]
+        forest.set_params(warm_start=False, n_estimators=len(forest.estimators_))
+    return model
+
+def forest_predict(model: MultiOutputRegressor, features: np.ndarray, n_jobs: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Mean and standard deviation of the per-tree predictions for every target, in one
+    pass over the trees (no separate model.predict call). Sums are accumulated instead
+    of stacking per-tree outputs, so memory stays O(rows).
+    """
+    X = np.ascontiguousarray(features, dtype=np.float32) # Trees predict on float32
+    n_rows, n_targets = len(X), len(model.estimators_)
+    mean = np.empty((n_rows, n_targets))
+    std = np.empty((n_rows, n_targets))
+
+    for target, forest in enumerate(model.estimators_):
+        trees = forest.estimators_
+        n_chunks = max(1, min(len(trees), joblib.effective_n_jobs(n_jobs)))
+        if n_rows < 1000:
+            n_chunks = 1 # Thread dispatch costs more than it saves on small batches
+
+        chunks = [trees[i::n_chunks] for i in range(n_chunks)]
+        if n_chunks == 1:
+            partials = [_accumulate_trees(chunks[0], X)]
+        else:
+            partials = joblib.Parallel(n_jobs=n_chunks, prefer="threads")(
+                joblib.delayed(_accumulate_trees)(chunk, X) for chunk in chunks
+            )
+
+        total = sum(p[0] for p in partials)
+        total_sq = sum(p[1] for p in partials)
+        mean[:, target] = total / len(trees)
+        std[:, target] = np.sqrt(np.maximum(total_sq / len(trees) - mean[:, target] ** 2, 0.0))
+
+    return mean, std
+
+def _accumulate_trees(trees: list, X: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    total = np.zeros(len(X))
+    total_sq = np.zeros(len(X))
+    for tree in trees:
+        prediction = tree.predict(X, check_input=False)
+        total += prediction
+        total_sq += prediction * prediction
+    return total, total_sq
+
+def confidence_from_spread(mean: np.ndarray, std: np.ndarray) -> np.ndarray:
+    """
+    Map per-tree spread to a 0-1 confidence: 1 when all trees agree, falling as the
+    relative standard deviation (averaged over targets) grows.
+    """
+    relative = std / np.maximum(np.abs(mean), 1e-6)
+    return 1.0 / (1.0 + relative.mean(axis=1))
+
 class MLEngine:
-    def __init__(self):
-        # We predict (cost, latency)
-        self.model = MultiOutputRegressor(RandomForestRegressor(n_estimators=100, random_state=42))
+    def __init__(self, model_store: Optional[ModelStore] = None, worker_pool: Optional[WorkerPool] = None, n_jobs: Optional[int] = -1):
+        self.model = new_model(n_jobs)
         self.is_trained = False
+        self.model_version: Optional[int] = None
+        self.model_store = model_store
+        self.worker_pool = worker_pool
+        self.n_jobs = n_jobs # Trees are fit/evaluated on all cores by default
+        self._training: Optional[asyncio.Task] = None
+        self._outcome_mark = 0 # OutcomeLog sequence number already learned from
+        self.feature_encoder = FeatureEncoder()
         logger.info("MLEngine initialized")
 
     async def train(self):
@@ -23,58 +117,196 @@ class MLEngine:
         logger.info("Training ML model on synthetic data...")
         
         # Synthetic Feature Engineering
-        # Features: [cpu_cores, memory_gb, provider_idx, region_idx]
-        # Targets: [cost, latency]
-        
-        # 0: AWS, 1: GCP, 2: Azure/Other
-        X_train = np.array([
-            [2, 4, 0, 0], [2, 4, 0, 1], [2, 4, 1, 0],  # Small workloads
-            [4, 16, 0, 0], [4, 16, 1, 0], [4, 16, 2, 0], # Medium workloads
-            [16, 64, 0, 0], [16, 64, 1, 0],             # Large workloads
-        ])
-        
-        # Cost ($/day), Latency (ms)
-        y_train = np.array([
-            [2.4, 30], [2.5, 90], [2.2, 35],
-            [12.0, 30], [10.5, 38], [13.0, 40],
-            [55.0, 30], [48.0, 42]
-        ])
-        
-        self.model.fit(X_train, y_train)
-        self.is_trained = True
+        # Features: see FEATURE_SCHEMA
+        # Targets: [cost ($/day), latency (ms)]
+        X_train, y_train = synthetic_training_set()
+
+        # Fit a fresh model off the event loop and swap it in, so predictions keep using the old one meanwhile
+        model = await self._run_training(fit_model, X_train, y_train, self.n_jobs)
+        self._swap_model(model, version=None)
         logger.info("ML model training complete")
 
+        if self.model_store is not None:
+            artifact = await asyncio.to_thread(self.model_store.save, model, FEATURE_SCHEMA_HASH, {
+                "n_samples": len(X_train),
+                "features": FEATURE_SCHEMA,
+                "targets": ["cost", "latency"],
+                "source": "synthetic",
+            })
+            self.model_version = artifact.version
+
+    async def ensure_trained(self):
+        """
+        Train unless a model is already available; concurrent callers share one fit.
+        """
+        if self.is_trained:
+            return
+        if self._training is None or self._training.done():
+            self._training = asyncio.create_task(self.train())
+        await asyncio.shield(self._training)
+
+    def load_latest(self) -> bool:
+        """
+        Load the newest stored artifact for the current feature schema, if it is newer
+        than the model in use. Returns True if a model was swapped in.
+        """
+        if self.model_store is None:
+            return False
+
+        artifact = self.model_store.latest(schema_hash=FEATURE_SCHEMA_HASH)
+        if artifact is None or (self.model_version is not None and artifact.version <= self.model_version):
+            return False
+
+        model = self.model_store.load(artifact)
+        self._swap_model(model, artifact.version)
+        logger.info("Loaded model artifact v%s (trained %s)", artifact.version, artifact.trained_at)
+        return True
+
+    async def watch_model_store(self, interval: float = 30.0):
+        """
+        Poll the model store and hot-swap newer artifacts as they appear.
+        """
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await asyncio.to_thread(self.load_latest)
+            except Exception as e:
+                logger.warning("Failed to load model artifact: %s", e)
+
+    async def retrain_incremental(
+        self,
+        outcome_log: OutcomeLog,
+        min_samples: int = 20,
+        trees_per_update: int = 10,
+        max_trees: int = 300
+    ) -> bool:
+        """
+        Warm-start additional trees on the outcomes observed since the last update.
+        Cost is proportional to the new outcomes, not to the full history; the oldest
+        trees are retired once the forest reaches max_trees. Returns True if the model
+        was updated.
+        """
+        # Outcomes recorded while training runs are left for the next update
+        mark = outcome_log.total_recorded
+        # Outcomes without known pricing can't be encoded
+        new = [o for o in outcome_log.since(self._outcome_mark) if o.price_on_demand is not None and o.price_spot is not None]
+        if len(new) < min_samples:
+            return False
+
+        await self.ensure_trained()
+        base_version = self.model_version
+        X_new, y_new = self._encode_outcomes(new)
+
+        model = await self._run_training(extend_model, self.model, X_new, y_new, trees_per_update, max_trees)
+        self._swap_model(model, version=None)
+        self._outcome_mark = mark
+        logger.info("Incrementally retrained ML model on %s new outcomes", len(new))
+
+        if self.model_store is not None:
+            artifact = await asyncio.to_thread(self.model_store.save, model, FEATURE_SCHEMA_HASH, {
+                "n_samples": len(new),
+                "features": FEATURE_SCHEMA,
+                "targets": ["cost", "latency"],
+                "source": "outcomes",
+                "base_version": base_version,
+            })
+            self.model_version = artifact.version
+        return True
+
+    async def retrain_periodically(self, outcome_log: OutcomeLog, interval: float = 600.0, **kwargs):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.retrain_incremental(outcome_log, **kwargs)
+            except Exception as e:
+                logger.warning("Incremental retraining failed: %s", e)
+
+    def _encode_outcomes(self, outcomes: List[Outcome]) -> Tuple[np.ndarray, np.ndarray]:
+        X = self.feature_encoder.encode_rows(
+            np.array([[o.cpu_cores, o.memory_gb] for o in outcomes], dtype=float),
+            [o.cloud for o in outcomes],
+            [o.region for o in outcomes],
+            [o.instance_type for o in outcomes],
+            [o.price_on_demand for o in outcomes],
+            [o.price_spot for o in outcomes]
+        )
+        y = np.array([[o.observed_cost, o.observed_latency] for o in outcomes], dtype=float)
+        return X, y
+
+    async def _run_training(self, fn: Callable[..., Any], *args) -> Any:
+        if self.worker_pool is not None:
+            return await self.worker_pool.run_training(fn, *args)
+        return await asyncio.to_thread(fn, *args)
+
+    async def _run_inference(self, fn: Callable[..., Any], *args) -> Any:
+        if self.worker_pool is not None:
+            return await self.worker_pool.run_inference(fn, *args)
+        return await asyncio.to_thread(fn, *args)
+
+    def _swap_model(self, model: MultiOutputRegressor, version: Optional[int]):
+        # Single reference assignment: in-flight predictions keep the model they started with
+        self.model = model
+        self.model_version = version
+        self.is_trained = True
+
     async def predict(self, cpu_cores: float, memory_gb: float, candidates: List[CloudPricing]) -> List[PlacementOption]:
         """
         Predict cost and latency for a list of candidate cloud environments.
+        Thin wrapper over predict_batch for a single workload.
         """
-        if not self.is_trained:
-            await self.train()
-            
-        results = []
-        
-        for candidate in candidates:
-            # Simple feature encoding
-            provider_idx = 0 if candidate.provider == CloudProvider.AWS else (1 if candidate.provider == CloudProvider.GCP else 2)
-            # Mock region encoding
-            region_idx = 0 
-            
-            features = np.array([[cpu_cores, memory_gb, provider_idx, region_idx]])
-            
-            prediction = self.model.predict(features)[0]
-            predicted_cost = round(max(0.0, prediction[0]), 2) # Ensure positive
-            predicted_latency = round(max(0.0, prediction[1]), 1)
-            
-            # Confidence score (mocked based on n_estimators variance or distance)
-            confidence = 0.85 + (0.10 * np.random.random()) # 0.85 - 0.95
-            
-            results.append(PlacementOption(
-                cloud=candidate.provider,
-                region=candidate.region,
-                predicted_cost=predicted_cost,
-                predicted_latency=predicted_latency,
-                confidence_score=round(confidence, 2)
-            ))
-            
-        return results
+        batches = await self.predict_batch([(cpu_cores, memory_gb)], candidates)
+        return batches[0]
+
+    async def predict_batch(
+        self,
+        workloads: Sequence[Tuple[float, float]],
+        candidates: Union[List[CloudPricing], PricingTable],
+        snapshot_version: Optional[int] = None
+    ) -> List[List[PlacementOption]]:
+        """
+        Predict cost and latency for every (workload, candidate) pair with a single model call.
+
+        `workloads` is a sequence (or N x 2 array) of (cpu_cores, memory_gb) rows.
+        Passing the pricing snapshot version the candidates come from lets the encoded
+        candidate features be reused across calls.
+        Returns one list of PlacementOption per workload, in candidate order. The
+        optimization loop uses predict_tables, which skips building the models.
+        """
+        tables = await self.predict_tables(workloads, candidates, snapshot_version)
+        return [table.to_options() for table in tables]
+
+    async def predict_tables(
+        self,
+        workloads: Sequence[Tuple[float, float]],
+        candidates: Union[List[CloudPricing], PricingTable],
+        snapshot_version: Optional[int] = None
+    ) -> List[OptionTable]:
+        """
+        predict_batch, returning one OptionTable per workload. The tables share the
+        pricing table's location and SKU columns.
+        """
+        await self.ensure_trained()
+        model = self.model
+
+        pricing = candidates if isinstance(candidates, PricingTable) else PricingTable.from_pricing(candidates)
+        resources = np.asarray(workloads, dtype=float).reshape(-1, 2)
+        n_workloads, n_candidates = len(resources), len(pricing)
+        if n_workloads == 0:
+            return []
+        if n_candidates == 0:
+            empty = np.zeros(0)
+            return [OptionTable.from_pricing(pricing, empty, empty, empty) for _ in range(n_workloads)]
+
+        candidate_matrix = self.feature_encoder.candidate_matrix(pricing, snapshot_version)
+        features = self.feature_encoder.encode(resources, candidate_matrix)
+        INFERENCE_ROWS.inc(len(features))
+        with Timer(INFERENCE_SECONDS):
+            predictions, spread = await self._run_inference(forest_predict, model, features, self.n_jobs)
+
+        costs = np.round(np.maximum(predictions[:, 0], 0.0), 2).reshape(n_workloads, n_candidates)
+        latencies = np.round(np.maximum(predictions[:, 1], 0.0), 1).reshape(n_workloads, n_candidates)
+
+        # Confidence score from the disagreement between trees
+        confidences = np.round(confidence_from_spread(predictions, spread), 2).reshape(n_workloads, n_candidates)
 
+        return [OptionTable.from_pricing(pricing, costs[w], latencies[w], confidences[w]) for w in range(n_workloads)]
@@ -0,0 +1,115 @@
+import json
+import logging
+import os
+import re
+import tempfile
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Union
+
+import joblib
+
+logger = logging.getLogger(__name__)
+
+ARTIFACT_PATTERN = re.compile(r"^model-v(\d+)\.json$")
+
+
+@dataclass(frozen=True)
+class ModelArtifact:
+    version: int
+    path: Path # Serialized model
+    schema_hash: str # Hash of the feature schema the model was trained on
+    trained_at: str
+    metadata: Dict[str, Any] = field(default_factory=dict)
+
+
+class ModelStore:
+    """
+    Directory of versioned model artifacts.
+
+    Each version is a joblib-serialized model plus a JSON metadata file with the
+    feature-schema hash and training metadata. Files are written to a temp name and
+    renamed into place, and the metadata file is written last, so readers never see
+    a partial artifact.
+    """
+
+    def __init__(self, directory: Union[str, Path]):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        logger.info("ModelStore initialized at %s", self.directory)
+
+    def save(self, model: Any, schema_hash: str, metadata: Optional[Dict[str, Any]] = None) -> ModelArtifact:
+        latest = self.latest()
+        version = latest.version + 1 if latest else 1
+        model_path = self.directory / f"model-v{version:06d}.joblib"
+
+        self._atomic_write(model_path, lambda f: joblib.dump(model, f))
+
+        info = {
+            "version": version,
+            "model_file": model_path.name,
+            "schema_hash": schema_hash,
+            "trained_at": datetime.utcnow().isoformat(),
+            "metadata": metadata or {},
+        }
+        self._atomic_write(
+            self.directory / f"model-v{version:06d}.json",
+            lambda f: f.write(json.dumps(info, indent=2).encode())
+        )
+
+        logger.info("Saved model artifact v%s", version)
+        return self._artifact(info)
+
+    def artifacts(self) -> List[ModelArtifact]:
+        found = []
+        for entry in self.directory.iterdir():
+            if not ARTIFACT_PATTERN.match(entry.name):
+                continue
+            try:
+                found.append(self._artifact(json.loads(entry.read_text())))
+            except (OSError, ValueError, KeyError) as e:
+                logger.warning("Skipping unreadable model metadata %s: %s", entry.name, e)
+        return sorted(found, key=lambda artifact: artifact.version)
+
+    def latest(self, schema_hash: Optional[str] = None) -> Optional[ModelArtifact]:
+        """
+        Newest artifact, optionally restricted to a feature schema.
+        """
+        candidates = [a for a in self.artifacts() if schema_hash is None or a.schema_hash == schema_hash]
+        return candidates[-1] if candidates else None
+
+    def load(self, artifact: ModelArtifact, mmap: bool = True) -> Any:
+        """
+        Load a model; with mmap the large NumPy arrays (tree nodes) are memory-mapped
+        read-only instead of copied into memory.
+        """
+        return joblib.load(artifact.path, mmap_mode="r" if mmap else None)
+
+    def _artifact(self, info: Dict[str, Any]) -> ModelArtifact:
+        return ModelArtifact(
+            version=int(info["version"]),
+            path=self.directory / info["model_file"],
+            schema_hash=info["schema_hash"],
+            trained_at=info["trained_at"],
+            metadata=info.get("metadata", {})
+        )
+
+    def _atomic_write(self, path: Path, write):
+        atomic_write(path, write)
+
+
+def atomic_write(path: Path, write):
+    """
+    Write a file through `write(f)` on a temp file in the same directory, then rename
+    it into place so readers see either the old or the new content.
+    """
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            write(f)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
@@ -34,6 +34,7 @@ class WorkloadCurrentState(BaseModel):
 class PlacementOption(BaseModel):
     cloud: CloudProvider
     region: str
+    instance_type: Optional[str] = None
     predicted_cost: float
     predicted_latency: float
     confidence_score: float
@@ -44,6 +45,9 @@ class PlacementRecommendation(BaseModel):
     current_state: WorkloadCurrentState
     recommended_option: PlacementOption
     estimated_savings: float
+    alternatives: List[PlacementOption] = [] # Next best options meeting the policy, best first
+    cpu_cores: Optional[float] = None # Resources of the workload being moved, when known
+    memory_gb: Optional[float] = None
     timestamp: datetime = Field(default_factory=datetime.utcnow)
 
 class WorkloadPlacementPolicy(BaseModel):
@@ -53,5 +57,21 @@ class WorkloadPlacementPolicy(BaseModel):
     compliance_weight: int = 20
     savings_threshold: float = 0.20
     max_latency_ms: int = 100
+    min_confidence: float = 0.0 # Options the model is less confident about are rejected
+    confidence_weight: int = 0 # Score penalty per unit of missing confidence
+    dwell_time_hours: float = 168.0 # Expected stay in a new placement; migration cost is amortized over it
+    cooldown_minutes: float = 60.0 # No new migration for a workload this soon after the last one
+    hysteresis: float = 0.05 # Extra savings required to move a workload Guardian already moved
     allowed_clouds: List[CloudProvider] = [CloudProvider.AWS, CloudProvider.GCP, CloudProvider.AZURE]
 
+
+class FleetWorkload(BaseModel):
+    current_state: WorkloadCurrentState
+    cpu_cores: float
+    memory_gb: float
+    data_gb: float = 0.0 # Persistent data that moves with the workload
+
+class FleetConstraints(BaseModel):
+    region_capacity: Dict[str, float] = {} # region -> CPU cores available to Guardian-managed workloads
+    cloud_budget: Dict[CloudProvider, float] = {} # cloud -> max daily spend
+    max_migrations: Optional[int] = None # per optimization tick
@@ -0,0 +1,63 @@
+import logging
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Deque, List, Optional
+
+from guardian.models import CloudProvider
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class Outcome:
+    """
+    What a placement actually cost and how it performed once a workload ran there.
+    Raw attributes are kept (not encoded features) so outcomes stay usable when the
+    feature pipeline changes.
+    """
+    cpu_cores: float
+    memory_gb: float
+    cloud: CloudProvider
+    region: str
+    observed_cost: float
+    observed_latency: float
+    instance_type: Optional[str] = None
+    price_on_demand: Optional[float] = None # Prices of the SKU when the outcome was observed
+    price_spot: Optional[float] = None
+    recorded_at: float = field(default_factory=time.time)
+
+
+class OutcomeLog:
+    """
+    Bounded sliding window of observed placement outcomes.
+
+    Every outcome gets a sequence number, so consumers can ask for just the
+    outcomes recorded since they last looked.
+    """
+
+    def __init__(self, max_size: int = 10000):
+        self.max_size = max_size
+        self.total_recorded = 0
+        self._outcomes: Deque[Outcome] = deque(maxlen=max_size)
+        logger.info("OutcomeLog initialized")
+
+    def __len__(self) -> int:
+        return len(self._outcomes)
+
+    def record(self, outcome: Outcome):
+        self._outcomes.append(outcome)
+        self.total_recorded += 1
+
+    def since(self, mark: int) -> List[Outcome]:
+        """
+        Outcomes recorded after sequence number `mark` that are still in the window.
+        """
+        new = self.total_recorded - mark
+        if new <= 0:
+            return []
+        new = min(new, len(self._outcomes))
+        return list(self._outcomes)[-new:]
+
+    def window(self) -> List[Outcome]:
+        return list(self._outcomes)
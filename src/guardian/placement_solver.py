@@ -0,0 +1,231 @@
+import dataclasses
+import logging
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+from guardian.decision_engine import DecisionEngine
+from guardian.models import (
+    CloudProvider,
+    FleetConstraints,
+    FleetWorkload,
+    PlacementRecommendation,
+    WorkloadPlacementPolicy
+)
+from guardian.tables import OptionTable, PROVIDERS
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class PlacementPlan:
+    assignments: Dict[int, PlacementRecommendation] = field(default_factory=dict) # workload index -> planned migration
+    total_gain: float = 0.0 # Sum of utility improvements of the planned migrations
+    region_usage: Dict[str, float] = field(default_factory=dict)
+    cloud_spend: Dict[CloudProvider, float] = field(default_factory=dict)
+    violations: List[str] = field(default_factory=list) # Constraints the plan could not satisfy
+
+    @property
+    def migrations(self) -> List[PlacementRecommendation]:
+        return list(self.assignments.values())
+
+
+class PlacementSolver:
+    """
+    Assigns a whole fleet of workloads to placement options at once.
+
+    Maximizes the total utility gain (DecisionEngine scores) subject to per-region
+    capacity, per-cloud spend caps and a cap on migrations per tick. Uses a greedy
+    pass over the best candidate moves by gain, followed by a repair pass that
+    moves workloads off regions/clouds that are already over their limits.
+    """
+
+    def __init__(self, decision_engine: Optional[DecisionEngine] = None, candidates_per_workload: int = 10):
+        self.decision_engine = decision_engine or DecisionEngine()
+        self.candidates_per_workload = candidates_per_workload
+        logger.info("PlacementSolver initialized")
+
+    def solve(
+        self,
+        workloads: Sequence[FleetWorkload],
+        policies: Sequence[WorkloadPlacementPolicy],
+        options: Sequence[OptionTable],
+        constraints: FleetConstraints
+    ) -> PlacementPlan:
+        """
+        `policies[i]` and `options[i]` belong to `workloads[i]`.
+        """
+        n = len(workloads)
+        region_usage: Dict[str, float] = {}
+        cloud_spend: Dict[CloudProvider, float] = {}
+        for w in workloads:
+            state = w.current_state
+            region_usage[state.current_region] = region_usage.get(state.current_region, 0.0) + w.cpu_cores
+            cloud_spend[state.current_cloud] = cloud_spend.get(state.current_cloud, 0.0) + state.current_cost
+
+        candidates = self._candidate_moves(workloads, policies, options)
+        moves: Dict[int, Tuple[int, float]] = {} # workload -> (option index, gain)
+        budget = constraints.max_migrations if constraints.max_migrations is not None else n
+
+        def fits(w: int, t: int) -> bool:
+            workload, table = workloads[w], options[w]
+            region = table.regions[t]
+            cloud = PROVIDERS[table.cloud_codes[t]]
+            state = workload.current_state
+
+            capacity = constraints.region_capacity.get(region)
+            if capacity is not None and region != state.current_region:
+                if region_usage.get(region, 0.0) + workload.cpu_cores > capacity:
+                    return False
+
+            cap = constraints.cloud_budget.get(cloud)
+            if cap is not None:
+                spend = cloud_spend.get(cloud, 0.0) + table.predicted_cost[t]
+                if cloud == state.current_cloud:
+                    spend -= state.current_cost
+                if spend > cap and not (cloud == state.current_cloud and spend <= cloud_spend.get(cloud, 0.0)):
+                    return False
+            return True
+
+        def apply(w: int, t: int, gain: float):
+            workload, table = workloads[w], options[w]
+            state = workload.current_state
+            region = table.regions[t]
+            cloud = PROVIDERS[table.cloud_codes[t]]
+            region_usage[state.current_region] -= workload.cpu_cores
+            region_usage[region] = region_usage.get(region, 0.0) + workload.cpu_cores
+            cloud_spend[state.current_cloud] -= state.current_cost
+            cloud_spend[cloud] = cloud_spend.get(cloud, 0.0) + float(table.predicted_cost[t])
+            moves[w] = (t, gain)
+
+        # 1. Repair: workloads sitting in regions/clouds over their limits move first,
+        # taking the best feasible option even if it saves little or nothing
+        over_limit = self._over_limit_workloads(workloads, region_usage, cloud_spend, constraints)
+        repairs = self._candidate_moves(workloads, policies, options, require_savings=False, only=set(over_limit)) if over_limit else {}
+        for w in over_limit:
+            if len(moves) >= budget:
+                break
+            if not self._is_over_limit(workloads[w], region_usage, cloud_spend, constraints):
+                continue
+            for gain, _, t in repairs.get(w, []):
+                if fits(w, t):
+                    apply(w, t, gain)
+                    break
+
+        # 2. Greedy: best gains first, skipping moves that break a constraint
+        ordered = sorted(
+            ((gain, w, t) for w, moves_w in candidates.items() for gain, _, t in moves_w if gain > 0),
+            key=lambda item: (-item[0], item[1], item[2])
+        )
+        for gain, w, t in ordered:
+            if len(moves) >= budget:
+                break
+            if w in moves:
+                continue
+            if fits(w, t):
+                apply(w, t, gain)
+
+        plan = PlacementPlan(region_usage=region_usage, cloud_spend=cloud_spend)
+        for w, (t, gain) in sorted(moves.items()):
+            state = workloads[w].current_state
+            option = options[w].option(t)
+            plan.assignments[w] = PlacementRecommendation(
+                workload_name=state.workload_name,
+                namespace=state.namespace,
+                current_state=state,
+                recommended_option=option,
+                estimated_savings=round(state.current_cost - option.predicted_cost, 2),
+                cpu_cores=workloads[w].cpu_cores,
+                memory_gb=workloads[w].memory_gb
+            )
+            plan.total_gain += gain
+
+        for region, capacity in constraints.region_capacity.items():
+            if region_usage.get(region, 0.0) > capacity:
+                plan.violations.append(f"region {region} over capacity ({region_usage[region]:.1f}/{capacity:.1f} cores)")
+        for cloud, cap in constraints.cloud_budget.items():
+            if cloud_spend.get(cloud, 0.0) > cap:
+                plan.violations.append(f"cloud {cloud.value} over budget ({cloud_spend[cloud]:.2f}/{cap:.2f})")
+
+        logger.info("Placement plan: %s migrations for %s workloads, total gain %.2f", len(plan.assignments), n, plan.total_gain)
+        return plan
+
+    def _candidate_moves(
+        self,
+        workloads: Sequence[FleetWorkload],
+        policies: Sequence[WorkloadPlacementPolicy],
+        options: Sequence[OptionTable],
+        require_savings: bool = True,
+        only: Optional[Set[int]] = None
+    ) -> Dict[int, List[Tuple[float, int, int]]]:
+        """
+        Best valid moves per workload as (gain, workload, option index), best first.
+        Gains use the same utility as DecisionEngine._calculate_score, and a move must
+        satisfy the policy constraints and savings threshold like a single-workload
+        decision, including cooldowns, hysteresis and effective costs in cost-aware mode.
+        Without `require_savings`, only the policy constraints and cooldowns apply.
+        """
+        engine = self.decision_engine
+        candidates: Dict[int, List[Tuple[float, int, int]]] = {}
+        for w, (workload, policy, table) in enumerate(zip(workloads, policies, options)):
+            if only is not None and w not in only:
+                continue
+            state = workload.current_state
+            threshold = policy.savings_threshold
+            if engine.history is not None:
+                if engine.history.in_cooldown(state.namespace, state.workload_name, policy.cooldown_minutes * 60):
+                    continue
+                if engine.history.has_moved(state.namespace, state.workload_name):
+                    threshold += policy.hysteresis
+            table = dataclasses.replace(table, predicted_cost=engine.effective_costs(state, table, policy, workload.data_gb))
+            scores = engine.score_options(table, policy)
+
+            # Staying put is not a move
+            scores = np.where(
+                (table.regions == state.current_region) & (np.asarray(table.cloud_codes) == PROVIDERS.index(state.current_cloud)),
+                -np.inf,
+                scores
+            )
+            if require_savings and state.current_cost > 0:
+                savings = (state.current_cost - table.predicted_cost) / state.current_cost
+                scores = np.where(savings >= threshold, scores, -np.inf)
+            elif require_savings:
+                scores = np.full_like(scores, -np.inf)
+
+            ranked = engine._top_k(scores, self.candidates_per_workload)
+            if len(ranked) == 0:
+                continue
+
+            current_score = engine._calculate_score(state.current_cost, state.current_latency, policy)
+            candidates[w] = [(float(scores[t] - current_score), w, int(t)) for t in ranked]
+        return candidates
+
+    def _is_over_limit(
+        self,
+        workload: FleetWorkload,
+        region_usage: Dict[str, float],
+        cloud_spend: Dict[CloudProvider, float],
+        constraints: FleetConstraints
+    ) -> bool:
+        state = workload.current_state
+        capacity = constraints.region_capacity.get(state.current_region)
+        cap = constraints.cloud_budget.get(state.current_cloud)
+        return (
+            (capacity is not None and region_usage.get(state.current_region, 0.0) > capacity)
+            or (cap is not None and cloud_spend.get(state.current_cloud, 0.0) > cap)
+        )
+
+    def _over_limit_workloads(
+        self,
+        workloads: Sequence[FleetWorkload],
+        region_usage: Dict[str, float],
+        cloud_spend: Dict[CloudProvider, float],
+        constraints: FleetConstraints
+    ) -> List[int]:
+        # Most expensive workloads first, they free the most budget per migration
+        affected = [
+            w for w, workload in enumerate(workloads)
+            if self._is_over_limit(workload, region_usage, cloud_spend, constraints)
+        ]
+        return sorted(affected, key=lambda w: -workloads[w].current_state.current_cost)
@@ -0,0 +1,412 @@
+import asyncio
+import json
+import logging
+import os
+import re
+import shutil
+import tempfile
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from guardian.models import CloudPricing, CloudProvider
+from guardian.tables import PROVIDER_CODES, PROVIDERS, PricingTable
+
+logger = logging.getLogger(__name__)
+
+# Samples kept in memory per SKU; older ones only live in on-disk segments
+DEFAULT_RING_CAPACITY = 1024
+SEGMENT_PATTERN = re.compile(r"^segment-(\d+)-(\d+)(?:-(\d+))?$") # ms bounds, then a sequence number
+COLUMNS = {
+    "timestamp": np.float64,
+    "provider": np.int8,
+    "region": np.int32,
+    "instance_type": np.int32,
+    "spot": np.float64,
+    "on_demand": np.float64,
+}
+
+
+class Dictionary:
+    """
+    Dictionary encoding of strings to dense integer codes, in first-seen order.
+    """
+
+    def __init__(self, values: Iterable[str] = ()):
+        self.values: List[str] = []
+        self.codes: Dict[str, int] = {}
+        for value in values:
+            self.encode(value)
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def encode(self, value: str) -> int:
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def code(self, value: str) -> Optional[int]:
+        return self.codes.get(value)
+
+    def decode(self, code: int) -> str:
+        return self.values[code]
+
+
+@dataclass(frozen=True)
+class PriceSeries:
+    """
+    Columnar price samples of one SKU, oldest first.
+    """
+    timestamps: np.ndarray # float64, time.time()
+    spot: np.ndarray       # float64
+    on_demand: np.ndarray  # float64
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+
+@dataclass(frozen=True)
+class PriceStats:
+    """
+    Spot price statistics of one SKU over a window.
+    """
+    samples: int
+    current: float
+    minimum: float
+    mean: float
+    maximum: float
+    percentiles: Dict[float, float]
+
+
+class PriceRing:
+    """
+    Fixed-capacity ring buffer of (timestamp, spot, on-demand) samples for one SKU.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.timestamps = np.zeros(capacity, dtype=np.float64)
+        self.spot = np.zeros(capacity, dtype=np.float64)
+        self.on_demand = np.zeros(capacity, dtype=np.float64)
+        self.start = 0
+        self.count = 0
+        self.total = 0   # Samples ever appended
+        self.flushed = 0 # Of those, samples already written to a segment
+
+    def __len__(self) -> int:
+        return self.count
+
+    def append(self, timestamp: float, spot: float, on_demand: float):
+        end = (self.start + self.count) % self.capacity
+        self.timestamps[end] = timestamp
+        self.spot[end] = spot
+        self.on_demand[end] = on_demand
+        if self.count < self.capacity:
+            self.count += 1
+        else:
+            self.start = (self.start + 1) % self.capacity # Overwrite the oldest sample
+        self.total += 1
+
+    @property
+    def unflushed(self) -> int:
+        return min(self.total - self.flushed, self.count)
+
+    def oldest(self) -> Optional[float]:
+        return float(self.timestamps[self.start]) if self.count else None
+
+    def series(self, start: float = float("-inf"), end: float = float("inf")) -> PriceSeries:
+        order = (self.start + np.arange(self.count)) % self.capacity
+        timestamps = self.timestamps[order]
+        # Samples are appended in time order, so the range is contiguous
+        lo, hi = np.searchsorted(timestamps, start, side="left"), np.searchsorted(timestamps, end, side="right")
+        rows = order[lo:hi]
+        return PriceSeries(timestamps=timestamps[lo:hi], spot=self.spot[rows], on_demand=self.on_demand[rows])
+
+    def newest(self, n: int) -> PriceSeries:
+        """
+        The last n samples, oldest first.
+        """
+        rows = (self.start + np.arange(self.count - n, self.count)) % self.capacity
+        return PriceSeries(timestamps=self.timestamps[rows], spot=self.spot[rows], on_demand=self.on_demand[rows])
+
+
+class Segment:
+    """
+    Immutable on-disk block of samples: one memory-mapped .npy file per column, plus
+    the dictionaries for its region and instance type codes.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        with open(path / "dictionary.json") as f:
+            dictionary = json.load(f)
+        self.regions = Dictionary(dictionary["regions"])
+        self.instance_types = Dictionary(dictionary["instance_types"])
+        self.columns: Dict[str, np.ndarray] = {
+            name: np.load(path / f"{name}.npy", mmap_mode="r") for name in COLUMNS
+        }
+        match = SEGMENT_PATTERN.match(path.name)
+        self.first, self.last = int(match.group(1)) / 1000.0, int(match.group(2)) / 1000.0
+        self.sequence = int(match.group(3) or 0)
+
+    def __len__(self) -> int:
+        return len(self.columns["timestamp"])
+
+    @classmethod
+    def write(cls, directory: Path, columns: Dict[str, np.ndarray], regions: List[str], instance_types: List[str], sequence: int) -> "Segment":
+        timestamps = columns["timestamp"]
+        # Millisecond bounds, rounded outwards so they cover every sample; the sequence
+        # number keeps segments with the same bounds apart
+        name = f"segment-{int(np.floor(timestamps.min() * 1000))}-{int(np.ceil(timestamps.max() * 1000))}-{sequence}"
+        tmp = Path(tempfile.mkdtemp(dir=directory, prefix=f".{name}."))
+        try:
+            for column, dtype in COLUMNS.items():
+                np.save(tmp / f"{column}.npy", np.asarray(columns[column], dtype=dtype))
+            with open(tmp / "dictionary.json", "w") as f:
+                json.dump({"regions": regions, "instance_types": instance_types}, f)
+            # Readers see either no segment or a complete one
+            os.replace(tmp, directory / name)
+        except BaseException:
+            shutil.rmtree(tmp, ignore_errors=True)
+            raise
+        return cls(directory / name)
+
+    def skus(self) -> List[Tuple[CloudProvider, str, str]]:
+        """
+        Distinct SKUs with samples in this segment.
+        """
+        keys = np.stack([self.columns["provider"], self.columns["region"], self.columns["instance_type"]], axis=1)
+        return [
+            (PROVIDERS[provider], self.regions.decode(region), self.instance_types.decode(instance_type))
+            for provider, region, instance_type in np.unique(keys, axis=0).tolist()
+        ]
+
+    def series(self, provider: CloudProvider, region: str, instance_type: str, start: float, end: float) -> Optional[PriceSeries]:
+        region_code, instance_code = self.regions.code(region), self.instance_types.code(instance_type)
+        if end < self.first or start > self.last or region_code is None or instance_code is None:
+            return None
+        columns = self.columns
+        timestamps = columns["timestamp"]
+        mask = (
+            (columns["provider"] == PROVIDER_CODES[provider])
+            & (columns["region"] == region_code)
+            & (columns["instance_type"] == instance_code)
+            & (timestamps >= start) & (timestamps <= end)
+        )
+        return PriceSeries(timestamps=timestamps[mask], spot=columns["spot"][mask], on_demand=columns["on_demand"][mask])
+
+
+class PriceHistory:
+    """
+    Append-only pricing history at bounded memory.
+
+    Recent samples live in a fixed-capacity ring buffer per SKU; with a directory,
+    `flush()` also appends the new samples to immutable, memory-mapped columnar
+    segments on disk, so range queries reach further back than the rings without
+    loading everything into memory. Provider, region and instance type are stored
+    as dictionary-encoded integer columns. Segments older than `retention` seconds
+    are dropped.
+    """
+
+    def __init__(
+        self,
+        directory: Optional[Union[str, Path]] = None,
+        capacity: int = DEFAULT_RING_CAPACITY,
+        retention: Optional[float] = None,
+        clock: Callable[[], float] = time.time
+    ):
+        self.directory = Path(directory) if directory is not None else None
+        self.capacity = capacity
+        self.retention = retention
+        self.clock = clock
+        self.regions = Dictionary()
+        self.instance_types = Dictionary()
+        self._rings: Dict[Tuple[int, int, int], PriceRing] = {}
+        self._segments: List[Segment] = []
+        self._sequence = 0 # Of the next segment
+        if self.directory is not None:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            self._segments = self._load_segments()
+            self._sequence = max((segment.sequence for segment in self._segments), default=-1) + 1
+        logger.info("PriceHistory initialized with %s segments", len(self._segments))
+
+    def __len__(self) -> int:
+        return len(self._rings)
+
+    def append(self, item: CloudPricing, timestamp: Optional[float] = None):
+        timestamp = self.clock() if timestamp is None else timestamp
+        self._append(PROVIDER_CODES[item.provider], item.region, item.instance_type, timestamp, item.price_spot, item.price_on_demand)
+
+    def append_many(self, items: Sequence[CloudPricing], timestamp: Optional[float] = None):
+        timestamp = self.clock() if timestamp is None else timestamp
+        for item in items:
+            self.append(item, timestamp)
+
+    def append_table(self, table: PricingTable, timestamp: Optional[float] = None):
+        """
+        Append every row of a columnar pricing table, sampled at one timestamp.
+        """
+        timestamp = self.clock() if timestamp is None else timestamp
+        rows = zip(table.provider_codes.tolist(), table.regions, table.instance_types, table.price_spot.tolist(), table.price_on_demand.tolist())
+        for provider, region, instance_type, spot, on_demand in rows:
+            self._append(provider, region, instance_type, timestamp, spot, on_demand)
+
+    def _append(self, provider: int, region: str, instance_type: str, timestamp: float, spot: float, on_demand: float):
+        key = (provider, self.regions.encode(region), self.instance_types.encode(instance_type))
+        ring = self._rings.get(key)
+        if ring is None:
+            ring = self._rings[key] = PriceRing(self.capacity)
+        elif self.directory is not None and ring.unflushed == ring.capacity:
+            # Spill before the oldest sample is overwritten so nothing is lost
+            self.flush()
+        ring.append(timestamp, spot, on_demand)
+
+    def skus(self) -> List[Tuple[CloudProvider, str, str]]:
+        """
+        Every SKU with samples on disk or in memory; those in the segments come first.
+        """
+        skus = {sku: None for segment in self._segments for sku in segment.skus()}
+        for provider, region, instance_type in self._rings:
+            skus.setdefault((PROVIDERS[provider], self.regions.decode(region), self.instance_types.decode(instance_type)))
+        return list(skus)
+
+    def latest(self, provider: CloudProvider, region: str, instance_type: str) -> Optional[Tuple[float, float]]:
+        """
+        (timestamp, spot price) of the most recent sample of a SKU.
+        """
+        ring = self._ring(provider, region, instance_type)
+        if ring is None or not ring.count:
+            return None
+        last = (ring.start + ring.count - 1) % ring.capacity
+        return float(ring.timestamps[last]), float(ring.spot[last])
+
+    def range(self, provider: CloudProvider, region: str, instance_type: str, start: float = float("-inf"), end: float = float("inf")) -> PriceSeries:
+        """
+        Samples of a SKU with start <= timestamp <= end, oldest first. Samples that
+        no longer fit in memory are read from the on-disk segments.
+        """
+        ring = self._ring(provider, region, instance_type)
+        in_memory = ring.oldest() if ring is not None and ring.count else float("inf")
+
+        parts: List[PriceSeries] = []
+        if start < in_memory:
+            for segment in self._segments:
+                series = segment.series(provider, region, instance_type, start, min(end, np.nextafter(in_memory, -np.inf)))
+                if series is not None and len(series):
+                    parts.append(series)
+        if ring is not None:
+            parts.append(ring.series(start, end))
+
+        if not parts:
+            empty = np.zeros(0, dtype=np.float64)
+            return PriceSeries(timestamps=empty, spot=empty, on_demand=empty)
+        return PriceSeries(
+            timestamps=np.concatenate([p.timestamps for p in parts]),
+            spot=np.concatenate([p.spot for p in parts]),
+            on_demand=np.concatenate([p.on_demand for p in parts])
+        )
+
+    def window(self, provider: CloudProvider, region: str, instance_type: str, seconds: float) -> PriceSeries:
+        return self.range(provider, region, instance_type, start=self.clock() - seconds)
+
+    def stats(
+        self,
+        provider: CloudProvider,
+        region: str,
+        instance_type: str,
+        seconds: float,
+        percentiles: Sequence[float] = (50, 95, 99)
+    ) -> Optional[PriceStats]:
+        """
+        Min/mean/max and percentiles of the spot price over the last `seconds`,
+        or None if the SKU has no samples in the window.
+        """
+        prices = self.window(provider, region, instance_type, seconds).spot
+        if not len(prices):
+            return None
+        values = np.percentile(prices, percentiles) if percentiles else []
+        return PriceStats(
+            samples=len(prices),
+            current=float(prices[-1]),
+            minimum=float(prices.min()),
+            mean=float(prices.mean()),
+            maximum=float(prices.max()),
+            percentiles={float(q): float(v) for q, v in zip(percentiles, values)}
+        )
+
+    def flush(self) -> Optional[Segment]:
+        """
+        Write every sample appended since the last flush to a new segment.
+        """
+        if self.directory is None:
+            return None
+
+        parts = []
+        for key, ring in self._rings.items():
+            if ring.unflushed:
+                parts.append((key, ring, ring.newest(ring.unflushed)))
+
+        segment = None
+        if parts:
+            columns = {
+                "timestamp": np.concatenate([series.timestamps for _, _, series in parts]),
+                "spot": np.concatenate([series.spot for _, _, series in parts]),
+                "on_demand": np.concatenate([series.on_demand for _, _, series in parts]),
+            }
+            for i, name in enumerate(("provider", "region", "instance_type")):
+                columns[name] = np.concatenate([np.full(len(series), key[i]) for key, _, series in parts])
+            order = np.argsort(columns["timestamp"], kind="stable")
+            columns = {name: values[order] for name, values in columns.items()}
+            segment = Segment.write(self.directory, columns, list(self.regions.values), list(self.instance_types.values), self._sequence)
+            self._sequence += 1
+            self._segments.append(segment)
+            for _, ring, _ in parts:
+                ring.flushed = ring.total
+            logger.info("Flushed %s price samples to %s", len(order), segment.path.name)
+
+        self.prune()
+        return segment
+
+    def prune(self):
+        """
+        Drop segments whose newest sample is older than the retention period.
+        """
+        if self.retention is None:
+            return
+        cutoff = self.clock() - self.retention
+        expired = [segment for segment in self._segments if segment.last < cutoff]
+        for segment in expired:
+            self._segments.remove(segment)
+            shutil.rmtree(segment.path, ignore_errors=True)
+        if expired:
+            logger.info("Pruned %s price history segments", len(expired))
+
+    async def flush_periodically(self, interval: float = 300.0):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                self.flush()
+            except OSError as e:
+                logger.warning("Price history flush failed: %s", e)
+
+    def _ring(self, provider: CloudProvider, region: str, instance_type: str) -> Optional[PriceRing]:
+        region_code, instance_code = self.regions.code(region), self.instance_types.code(instance_type)
+        if region_code is None or instance_code is None:
+            return None
+        return self._rings.get((PROVIDER_CODES[provider], region_code, instance_code))
+
+    def _load_segments(self) -> List[Segment]:
+        segments = []
+        for path in self.directory.iterdir():
+            if path.is_dir() and SEGMENT_PATTERN.match(path.name):
+                try:
+                    segments.append(Segment(path))
+                except (OSError, ValueError, KeyError) as e:
+                    logger.warning("Skipping unreadable price history segment %s: %s", path.name, e)
+        return sorted(segments, key=lambda segment: (segment.first, segment.last, segment.sequence))
@@ -0,0 +1,313 @@
+import asyncio
+import csv
+import logging
+from datetime import datetime
+from pathlib import Path
+from typing import AsyncIterator, Iterable, Iterator, List, Optional, Protocol, Union, runtime_checkable
+
+from guardian.models import CloudPricing, CloudProvider
+from guardian.tables import PriceRow, PricingTable
+
+logger = logging.getLogger(__name__)
+
+AZURE_RETAIL_PRICES_URL = "https://prices.azure.com/api/retail/prices?currencyCode='USD'&$filter=priceType eq 'Consumption' and (skuName eq 'D2s v3' or skuName eq 'F2s v2')"
+
+# Column layout of recorded pricing fixtures
+REPLAY_FIELDS = ["timestamp", "provider", "region", "instance_type", "price_on_demand", "price_spot", "currency"]
+
+
+def mock_pricing() -> List[CloudPricing]:
+    """
+    Static pricing used when no real cloud data can be fetched (e.g., no credentials).
+    """
+    return [
+        CloudPricing(provider=CloudProvider.AWS, region="us-east-1", instance_type="m5.large", price_on_demand=0.096, price_spot=0.035),
+        CloudPricing(provider=CloudProvider.AWS, region="us-west-2", instance_type="m5.large", price_on_demand=0.10, price_spot=0.040),
+        CloudPricing(provider=CloudProvider.GCP, region="us-central1", instance_type="e2-standard-2", price_on_demand=0.067, price_spot=0.020),
+        CloudPricing(provider=CloudProvider.AZURE, region="eastus", instance_type="D2s_v3", price_on_demand=0.096, price_spot=0.025),
+    ]
+
+
+@runtime_checkable
+class PricingSource(Protocol):
+    """
+    A pricing feed consumed by MetricsCollector.
+
+    `name` identifies the feed in the snapshot, `ttl` is how long its prices stay
+    fresh and `timeout` bounds a single fetch. `fetch` raises on failure; the
+    collector then keeps serving the previous data (or `fallback()` if there is none).
+    Feeds return columnar PricingTables; lists of CloudPricing are converted once.
+    """
+    name: str
+    ttl: float
+    timeout: float
+
+    async def fetch(self) -> PricingTable:
+        ...
+
+    def fallback(self) -> PricingTable:
+        ...
+
+    async def close(self):
+        ...
+
+
+class AwsSpotPricingSource:
+    name = "aws"
+
+    def __init__(self, instance_types: Optional[List[str]] = None, region: str = "us-east-1", ttl: float = 300.0, timeout: float = 10.0):
+        self.instance_types = instance_types or ['m5.large', 'c5.large', 'p3.2xlarge']
+        self.region = region
+        self.ttl = ttl # Spot prices move frequently
+        self.timeout = timeout
+
+    async def fetch(self) -> PricingTable:
+        # Attempt to fetch real AWS spot prices
+        import boto3
+
+        # Run in thread pool since boto3 is synchronous
+        def fetch_aws_spot():
+            session = boto3.Session()
+            ec2 = session.client('ec2', region_name=self.region)
+            # Request spot price history for last hour
+            response = ec2.describe_spot_price_history(
+                InstanceTypes=self.instance_types,
+                ProductDescriptions=['Linux/UNIX'],
+                StartTime=datetime.utcnow()
+            )
+            return response['SpotPriceHistory']
+
+        logger.info("Attempting to connect to AWS API for real-time spot prices...")
+        history = await asyncio.to_thread(fetch_aws_spot)
+
+        rows = []
+        for item in history:
+            # Naive mapping: Use spot price as is, assume on-demand is 3x (mocked) for comparison
+            price = float(item['SpotPrice'])
+            rows.append(PriceRow(
+                provider=CloudProvider.AWS,
+                region=item['AvailabilityZone'][:-1], # us-east-1a -> us-east-1
+                instance_type=item['InstanceType'],
+                price_on_demand=price * 3.5, # Mock ratio
+                price_spot=price,
+                currency="USD",
+                timestamp=item['Timestamp']
+            ))
+
+        logger.info("Successfully fetched %s real spot prices from AWS", len(rows))
+        return PricingTable.from_rows(rows)
+
+    def fallback(self) -> PricingTable:
+        # Demo environments without credentials still get a usable price list
+        return PricingTable.from_pricing(mock_pricing())
+
+    async def close(self):
+        pass
+
+
+class AzureRetailPricingSource:
+    name = "azure"
+
+    def __init__(self, url: str = AZURE_RETAIL_PRICES_URL, ttl: float = 3600.0, timeout: float = 30.0, max_connections: int = 20):
+        self.url = url
+        self.ttl = ttl # Retail prices change rarely
+        self.timeout = timeout # Follows several pages of the Retail Prices API
+        self.max_connections = max_connections
+        self._session = None # Shared aiohttp.ClientSession, created lazily
+
+    async def fetch(self) -> PricingTable:
+        logger.info("Attempting to fetch Azure Spot prices...")
+        rows = [row async for row in self.stream()]
+        logger.info("Fetched %s Azure price items", len(rows))
+        return PricingTable.from_rows(rows)
+
+    async def stream(self) -> AsyncIterator[PriceRow]:
+        """
+        Stream Azure Retail Prices API items page by page, following NextPageLink.
+        """
+        # Azure Retail Prices API (Public, no auth needed for basic price checking, easier for portfolio demo than full SDK auth dance)
+        session = await self._get_session()
+        url = self.url
+        now = datetime.utcnow()
+
+        while url:
+            async with session.get(url) as resp:
+                if resp.status != 200:
+                    raise RuntimeError(f"Azure Retail Prices API returned HTTP {resp.status}")
+                page = await resp.json()
+
+            for item in page.get('Items', []):
+                # Azure Retail API returns generic prices, spot is trickier,
+                # but for this SRE tool we'll treat 'Consumption' as base and mock a discount for spot
+                # since simpler APIs don't always expose dynamic spot rates easily without a sub.
+                base_price = float(item.get('retailPrice', 0.096))
+                yield PriceRow(
+                    provider=CloudProvider.AZURE,
+                    region=item.get('armRegionName') or item.get('location', 'eastus'), # 'eastus', not 'US East'
+                    instance_type=item.get('skuName', 'D2s_v3'),
+                    price_on_demand=base_price,
+                    price_spot=base_price * 0.3, # Mock spot discount (Azure Spot is often ~70-90% off)
+                    currency=item.get('currencyCode', 'USD'),
+                    timestamp=now
+                )
+
+            url = page.get('NextPageLink')
+
+    def fallback(self) -> PricingTable:
+        return PricingTable.from_rows([])
+
+    async def _get_session(self):
+        """
+        Return the long-lived, connection-pooled HTTP session shared by all fetches.
+        """
+        if self._session is None or self._session.closed:
+            import aiohttp
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.max_connections, ttl_dns_cache=300)
+            )
+        return self._session
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+
+class GcpPricingSource:
+    name = "gcp"
+
+    def __init__(self, project: str = "my-project-id", ttl: float = 3600.0, timeout: float = 10.0):
+        self.project = project
+        self.ttl = ttl
+        self.timeout = timeout
+
+    async def fetch(self) -> PricingTable:
+        logger.info("Attempting to fetch GCP machine types...")
+        # Using google-cloud-compute to at least verify credentials and list types
+        # Spot prices in GCP are static per region/month usually, so listing machine types is the connection check.
+        try:
+            from google.cloud import compute_v1
+        except ImportError:
+            return PricingTable.from_rows([])
+
+        def fetch_gcp_zones():
+            client = compute_v1.ZonesClient()
+            request = compute_v1.ListZonesRequest(project=self.project, max_results=5) # Will fail if no creds
+            return client.list(request=request)
+
+        # Real GCP pricing extraction usually involves parsing the SKU catalog which is huge.
+        # For this tool, we simulate the 'connect' check.
+        return PricingTable.from_rows([])
+
+    def fallback(self) -> PricingTable:
+        return PricingTable.from_rows([])
+
+    async def close(self):
+        pass
+
+
+class ReplayPricingSource:
+    """
+    Replays a recorded pricing history from a CSV file (see REPLAY_FIELDS).
+
+    Rows must be ordered by timestamp. Every fetch() returns the next recorded
+    time step, read lazily from disk, so arbitrarily large histories can drive the
+    collector -> ML -> decision pipeline offline. After the last step the source
+    keeps serving it, or starts over if `loop` is set.
+    """
+
+    def __init__(self, path: Union[str, Path], name: str = "replay", ttl: float = 0.0, timeout: float = 60.0, loop: bool = False):
+        self.path = Path(path)
+        self.name = name
+        self.ttl = ttl # Every refresh advances the replay by default
+        self.timeout = timeout
+        self.loop = loop
+        self.steps_served = 0
+
+        self._steps: Optional[Iterator[List[PriceRow]]] = None
+        self._last_step = PricingTable.from_rows([])
+
+    async def fetch(self) -> PricingTable:
+        # Reading and parsing a step is file I/O; keep it off the event loop
+        step = await asyncio.to_thread(self._next_step)
+        if step is not None:
+            self._last_step = step
+            self.steps_served += 1
+        return self._last_step
+
+    def _next_step(self) -> Optional[PricingTable]:
+        if self._steps is None:
+            self._steps = self.iter_steps()
+
+        step = next(self._steps, None)
+        if step is None and self.loop:
+            self._steps = self.iter_steps()
+            step = next(self._steps, None)
+        return PricingTable.from_rows(step) if step is not None else None
+
+    def iter_steps(self) -> Iterator[List[PriceRow]]:
+        """
+        Yield the recorded prices grouped by timestamp, one time step at a time.
+        """
+        step: List[PriceRow] = []
+        for row in self.iter_rows():
+            if step and row.timestamp != step[0].timestamp:
+                yield step
+                step = []
+            step.append(row)
+        if step:
+            yield step
+
+    def iter_rows(self) -> Iterator[PriceRow]:
+        with self.path.open(newline="") as f:
+            for row in csv.DictReader(f):
+                yield PriceRow(
+                    provider=CloudProvider(row["provider"]),
+                    region=row["region"],
+                    instance_type=row["instance_type"],
+                    price_on_demand=float(row["price_on_demand"]),
+                    price_spot=float(row["price_spot"]),
+                    currency=row.get("currency") or "USD",
+                    timestamp=datetime.fromisoformat(row["timestamp"])
+                )
+
+    async def stream(self) -> AsyncIterator[PriceRow]:
+        """
+        Stream every recorded row, yielding to the event loop between chunks.
+        """
+        for i, item in enumerate(self.iter_rows()):
+            yield item
+            if i % 10000 == 0:
+                await asyncio.sleep(0)
+
+    def fallback(self) -> PricingTable:
+        return PricingTable.from_rows([])
+
+    async def close(self):
+        self._steps = None
+
+
+def record_pricing(path: Union[str, Path], items: Iterable[Union[CloudPricing, PriceRow]], append: bool = False) -> int:
+    """
+    Record pricing items to a CSV fixture readable by ReplayPricingSource.
+    Returns the number of rows written.
+    """
+    path = Path(path)
+    write_header = not append or not path.exists() or path.stat().st_size == 0
+    count = 0
+    with path.open("a" if append else "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=REPLAY_FIELDS)
+        if write_header:
+            writer.writeheader()
+        for item in items:
+            writer.writerow({
+                "timestamp": item.timestamp.isoformat(),
+                "provider": item.provider.value,
+                "region": item.region,
+                "instance_type": item.instance_type,
+                "price_on_demand": item.price_on_demand,
+                "price_spot": item.price_spot,
+                "currency": item.currency,
+            })
+            count += 1
+    return count
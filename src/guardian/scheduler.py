@@ -0,0 +1,326 @@
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+from guardian.decision_engine import DecisionEngine
+from guardian.instrumentation import DECISION_LATENCY_SECONDS, RECOMMENDATIONS, span
+from guardian.metrics_collector import MetricsCollector, PricingDiff
+from guardian.ml_engine import MLEngine
+from guardian.models import FleetConstraints, FleetWorkload, PlacementRecommendation, WorkloadPlacementPolicy
+from guardian.placement_solver import PlacementSolver
+from guardian.tables import OptionTable
+
+logger = logging.getLogger(__name__)
+
+# (namespace, policy) -> workloads matched by the policy selector
+WorkloadResolver = Callable[[str, WorkloadPlacementPolicy], Awaitable[List[FleetWorkload]]]
+# (policy key, fresh recommendations) -> acts on them, e.g. queues the migrations
+RecommendationHandler = Callable[[str, List[PlacementRecommendation]], None]
+# policy key -> names of the workloads to re-evaluate, or None for all of them
+DirtyPairs = Dict[str, Optional[Set[str]]]
+
+
+class FleetOptimizer:
+    """
+    Coalescing scheduler for the optimization loop.
+
+    Every registered policy is evaluated in a shared tick: one pricing snapshot and
+    one batched prediction are computed for the whole fleet and fanned out to every
+    matching workload of every policy. Per-policy timers read their slice of the
+    latest tick instead of running the pipeline themselves.
+
+    With `on_recommendations` set, it is the only consumer of recommendations:
+    every pass hands the ones it makes to it exactly once, and they are then
+    dropped from `results` so timers reading them do not act on them again.
+
+    Once started, it is also event-driven: pricing snapshot diffs from the
+    collector mark the (policy, workload) pairs whose candidates moved by at least
+    `price_change_threshold`. Only those pairs are re-evaluated, shortly after the
+    change. A full sweep every `interval` seconds remains as a safety net.
+    """
+
+    def __init__(
+        self,
+        metrics_collector: MetricsCollector,
+        ml_engine: MLEngine,
+        decision_engine: DecisionEngine,
+        workload_resolver: WorkloadResolver,
+        interval: float = 60.0,
+        placement_solver: Optional[PlacementSolver] = None,
+        constraints: Optional[FleetConstraints] = None,
+        price_change_threshold: float = 0.05,
+        debounce: float = 1.0,
+        on_recommendations: Optional[RecommendationHandler] = None
+    ):
+        self.metrics_collector = metrics_collector
+        self.ml_engine = ml_engine
+        self.decision_engine = decision_engine
+        self.workload_resolver = workload_resolver
+        self.interval = interval
+        self.placement_solver = placement_solver
+        self.constraints = constraints or FleetConstraints()
+        self.price_change_threshold = price_change_threshold
+        self.debounce = debounce # Diffs arriving within this window are handled together
+        self.on_recommendations = on_recommendations
+
+        self.policies: Dict[str, Tuple[str, WorkloadPlacementPolicy]] = {}
+        self.results: Dict[str, List[PlacementRecommendation]] = {}
+        self.workloads: Dict[str, List[FleetWorkload]] = {} # Workloads per policy as of their last evaluation
+        self.last_tick: Optional[float] = None
+        self.snapshot_version: Optional[int] = None
+        self.evaluations = 0 # (policy, workload) pairs evaluated so far
+        self._tick_task: Optional[asyncio.Task] = None
+        self._loop_task: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+        self._dirty: DirtyPairs = {}
+        self._wakeup = asyncio.Event()
+        self._changed_at: Optional[float] = None # When the oldest unhandled significant price change arrived
+        logger.info("FleetOptimizer initialized")
+
+    def register(self, key: str, namespace: str, policy: WorkloadPlacementPolicy):
+        self.policies[key] = (namespace, policy)
+
+    def unregister(self, key: str):
+        self.policies.pop(key, None)
+        self.results.pop(key, None)
+        self.workloads.pop(key, None)
+        self._dirty.pop(key, None)
+
+    def adopt(self, key: str, namespace: str, policy: WorkloadPlacementPolicy):
+        """
+        Register a policy handed over by another replica and evaluate it on the
+        event loop right away, instead of waiting for its next timer run.
+        """
+        self.register(key, namespace, policy)
+        self._dirty[key] = None
+        self._wakeup.set()
+
+    def start(self):
+        """
+        Subscribe to pricing diffs and start reacting to them.
+        """
+        if self._loop_task is None:
+            self.metrics_collector.add_listener(self.on_pricing_diff)
+            self._loop_task = asyncio.create_task(self._event_loop())
+
+    async def stop(self):
+        if self._loop_task is not None:
+            self.metrics_collector.remove_listener(self.on_pricing_diff)
+            self._loop_task.cancel()
+            await asyncio.gather(self._loop_task, return_exceptions=True)
+            self._loop_task = None
+
+    def on_pricing_diff(self, diff: PricingDiff):
+        """
+        Mark the (policy, workload) pairs affected by significant price changes: those
+        whose allowed clouds saw a change, and those running on a SKU location that did.
+        """
+        significant = [c for c in diff.changes if c.relative_change >= self.price_change_threshold]
+        if not significant:
+            return
+
+        clouds = {c.provider for c in significant}
+        locations = {(c.provider, c.region) for c in significant}
+        for key, (_, policy) in self.policies.items():
+            workloads = self.workloads.get(key)
+            if workloads is None:
+                self._dirty[key] = None # Never evaluated; evaluate everything
+                continue
+
+            candidates_changed = any(cloud in clouds for cloud in policy.allowed_clouds)
+            names = {
+                w.current_state.workload_name for w in workloads
+                if candidates_changed or (w.current_state.current_cloud, w.current_state.current_region) in locations
+            }
+            if names and self._dirty.get(key, set()) is not None:
+                self._dirty[key] = self._dirty.get(key, set()) | names
+
+        if self._dirty:
+            if self._changed_at is None:
+                self._changed_at = time.monotonic()
+            logger.info("Pricing v%s: %s significant changes, re-evaluating %s policies", diff.new_version, len(significant), len(self._dirty))
+            self._wakeup.set()
+
+    async def reevaluate(self, pairs: DirtyPairs) -> Dict[str, List[PlacementRecommendation]]:
+        """
+        Re-evaluate just the given (policy, workload) pairs and return their new
+        recommendations. Solver mode places the fleet as a whole, so it always runs
+        a full pass.
+        """
+        if self.placement_solver is not None:
+            results = await self.tick()
+            return {key: results.get(key, []) for key in pairs}
+        async with self._lock:
+            return await self._evaluate(pairs)
+
+    async def recommendations_for(self, key: str, namespace: str, policy: WorkloadPlacementPolicy) -> List[PlacementRecommendation]:
+        """
+        Return the recommendations for one policy from the latest shared tick.
+        A new tick is only run when the last one is older than the interval or
+        predates this policy's registration. Recommendations already handed to
+        `on_recommendations` are not returned.
+        """
+        self.register(key, namespace, policy)
+
+        if not self._is_fresh() or key not in self.results:
+            await self.tick()
+        if key not in self.results:
+            # Registered while a pass was already in flight
+            await self.tick()
+
+        return self.results.get(key, [])
+
+    async def tick(self) -> Dict[str, List[PlacementRecommendation]]:
+        """
+        Run (or join the already running) fleet-wide optimization pass.
+        """
+        if self._tick_task is None or self._tick_task.done():
+            self._tick_task = asyncio.create_task(self._run_tick())
+        return await asyncio.shield(self._tick_task)
+
+    def _is_fresh(self) -> bool:
+        return self.last_tick is not None and time.monotonic() - self.last_tick < self.interval
+
+    async def _event_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                # Safety net: nothing changed for a whole interval, sweep everything
+                try:
+                    await self.tick()
+                except Exception as e:
+                    logger.error("Full optimization sweep failed: %s", e)
+                continue
+
+            await asyncio.sleep(self.debounce)
+            self._wakeup.clear()
+            pairs, self._dirty = self._dirty, {}
+            changed_at, self._changed_at = self._changed_at, None
+            try:
+                await self.reevaluate(pairs)
+            except Exception as e:
+                logger.error("Event-driven re-evaluation failed: %s", e)
+            else:
+                if changed_at is not None:
+                    DECISION_LATENCY_SECONDS.observe(time.monotonic() - changed_at)
+
+    def _dispatch(self, results: Dict[str, List[PlacementRecommendation]]):
+        """
+        Hand fresh recommendations to `on_recommendations` and mark them consumed.
+        """
+        if self.on_recommendations is None:
+            return
+        for key, recommendations in results.items():
+            if not recommendations:
+                continue
+            consumed = {id(r) for r in recommendations}
+            self.results[key] = [r for r in self.results.get(key, []) if id(r) not in consumed]
+            try:
+                self.on_recommendations(key, recommendations)
+            except Exception as e:
+                logger.error("Failed to hand over recommendations for policy %s: %s", key, e)
+
+    async def _run_tick(self) -> Dict[str, List[PlacementRecommendation]]:
+        async with self._lock:
+            results = await self._evaluate(None)
+            self.last_tick = time.monotonic()
+            return results
+
+    async def _evaluate(self, pairs: Optional[DirtyPairs]) -> Dict[str, List[PlacementRecommendation]]:
+        """
+        Evaluate every registered policy (pairs=None) or only the given pairs. Results
+        of pairs that are not re-evaluated are kept.
+        """
+        if pairs is None:
+            policies = dict(self.policies)
+            logger.info("Running fleet optimization pass for %s policies", len(policies))
+        else:
+            policies = {key: self.policies[key] for key in pairs if key in self.policies}
+            logger.info("Re-evaluating %s policies after price changes", len(policies))
+
+        # 1. Collect Data (once for the whole fleet, served from the pricing cache)
+        with span("collect"):
+            snapshot = await self.metrics_collector.latest_snapshot()
+            pricing_data = snapshot.table
+
+            # Resolve workloads for every policy
+            matched: Dict[str, List[FleetWorkload]] = {}
+            for key, (namespace, policy) in policies.items():
+                try:
+                    matched[key] = await self.workload_resolver(namespace, policy)
+                except Exception as e:
+                    logger.error("Failed to resolve workloads for policy %s: %s", key, e)
+                    matched[key] = []
+
+        self.workloads.update(matched)
+        if pairs is not None:
+            # Only the affected workloads; a policy marked None is evaluated in full
+            matched = {
+                key: [w for w in found if pairs.get(key) is None or w.current_state.workload_name in pairs[key]]
+                for key, found in matched.items()
+            }
+
+        workloads = [workload for key in matched for workload in matched[key]]
+        self.evaluations += len(workloads)
+
+        # 2. Predict (ML), one batch over the distinct resource shapes in the fleet
+        tables: List[OptionTable] = []
+        shape_index = np.zeros(0, dtype=int)
+        if workloads:
+            with span("predict"):
+                resources = np.array([[w.cpu_cores, w.memory_gb] for w in workloads], dtype=float)
+                shapes, shape_index = np.unique(resources, axis=0, return_inverse=True)
+                shape_index = shape_index.reshape(-1)
+                tables = await self.ml_engine.predict_tables(shapes, pricing_data, snapshot_version=snapshot.version)
+                # Measured regional latency takes precedence over the model's estimate
+                tables = [self.metrics_collector.calibrate_latency(table) for table in tables]
+
+        # Columnar options are shared by every workload of the same shape
+        owners = [key for key in matched for _ in matched[key]]
+        workload_tables = [tables[i] for i in shape_index]
+
+        # 3. Decide (Policy), fanned out per policy and workload
+        results: Dict[str, List[PlacementRecommendation]] = {key: [] for key in matched}
+        with span("decide"):
+            if self.placement_solver is not None:
+                # Global mode: one assignment for the whole fleet under capacity/budget limits
+                plan = self.placement_solver.solve(
+                    workloads,
+                    [policies[key][1] for key in owners],
+                    workload_tables,
+                    self.constraints
+                )
+                for w, recommendation in plan.assignments.items():
+                    results[owners[w]].append(recommendation)
+            else:
+                for key, workload, table in zip(owners, workloads, workload_tables):
+                    _, policy = policies[key]
+                    recommendation = await self.decision_engine.generate_recommendation(workload.current_state, table, policy, data_gb=workload.data_gb)
+                    if recommendation:
+                        recommendation.cpu_cores = workload.cpu_cores
+                        recommendation.memory_gb = workload.memory_gb
+                        results[key].append(recommendation)
+        RECOMMENDATIONS.inc(sum(len(recs) for recs in results.values()))
+
+        fresh = {key: list(recs) for key, recs in results.items()}
+        if pairs is not None:
+            # Keep the recommendations of workloads that were not re-evaluated
+            for key in results:
+                evaluated = {w.current_state.workload_name for w in matched[key]}
+                kept = [r for r in self.results.get(key, []) if r.workload_name not in evaluated]
+                results[key] = kept + results[key]
+            results = dict(self.results, **results)
+
+        # Policies removed while the pass was running are not resurrected
+        self.results = {key: recs for key, recs in results.items() if key in self.policies}
+        self.snapshot_version = snapshot.version
+        logger.info("Fleet optimization pass complete: %s workloads, %s candidates (pricing v%s)", len(workloads), len(pricing_data), snapshot.version)
+        fresh = {key: recs for key, recs in fresh.items() if key in self.policies}
+        self._dispatch(fresh)
+        if pairs is not None:
+            return fresh
+        return self.results
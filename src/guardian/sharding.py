@@ -0,0 +1,613 @@
+import argparse
+import asyncio
+import bisect
+import dataclasses
+import hashlib
+import json
+import logging
+import math
+import signal
+import ssl
+import sys
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Protocol, Sequence, Tuple
+
+from guardian.metrics_collector import MetricsCollector, as_table
+from guardian.pricing_sources import PricingSource, ReplayPricingSource
+from guardian.tables import PricingTable
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_VNODES = 64 # Points per member on the hash ring; more spread shards more evenly
+DEFAULT_LEASE_DURATION = 15.0
+DEFAULT_SHARD_PORT = 8081
+LEADER_LEASE = "leader"
+MEMBER_PREFIX = "member-"
+GROUP_LABEL = "guardian.io/group"
+ADDRESS_ANNOTATION = "guardian.io/address"
+SERVICE_ACCOUNT_DIR = Path("/var/run/secrets/kubernetes.io/serviceaccount")
+
+# Called with the new members whenever membership (and so shard ownership) changes
+MembershipListener = Callable[[Tuple[str, ...]], None]
+
+
+def ring_hash(key: str) -> int:
+    # Stable across processes, unlike hash()
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "big")
+
+
+class HashRing:
+    """
+    Consistent hash ring over the operator replicas. Each member owns the keys
+    hashing between its virtual nodes and the preceding ones, so a membership
+    change only moves the keys of the member that joined or left.
+    """
+
+    def __init__(self, members: Iterable[str] = (), vnodes: int = DEFAULT_VNODES):
+        self.vnodes = vnodes
+        self.members: Tuple[str, ...] = tuple(sorted(set(members)))
+        points = sorted((ring_hash(f"{member}#{v}"), member) for member in self.members for v in range(vnodes))
+        self._hashes = [h for h, _ in points]
+        self._owners = [member for _, member in points]
+
+    def __len__(self) -> int:
+        return len(self.members)
+
+    def owner(self, key: str) -> Optional[str]:
+        if not self._hashes:
+            return None
+        return self._owners[bisect.bisect_right(self._hashes, ring_hash(key)) % len(self._hashes)]
+
+
+@dataclass(frozen=True)
+class Lease:
+    """
+    A named lease as stored by a LeaseBackend; `version` changes on every write.
+    """
+    name: str
+    holder: Optional[str]
+    address: Optional[str] = None # Where the holder serves followers, host:port
+    duration: float = DEFAULT_LEASE_DURATION
+    version: Optional[str] = None
+
+
+class LeaseBackend(Protocol):
+    """
+    Storage for leases with optimistic concurrency: create and replace return
+    None instead of overwriting when someone else wrote first.
+    """
+
+    async def get(self, name: str) -> Optional[Lease]:
+        ...
+
+    async def create(self, lease: Lease) -> Optional[Lease]:
+        ...
+
+    async def replace(self, lease: Lease) -> Optional[Lease]:
+        ...
+
+    async def delete(self, lease: Lease) -> bool:
+        ...
+
+    async def list(self) -> List[Lease]:
+        ...
+
+    async def close(self):
+        ...
+
+
+class MemoryLeaseBackend:
+    """
+    In-process LeaseBackend, for tests and single-process runs.
+    """
+
+    def __init__(self):
+        self.leases: Dict[str, Lease] = {}
+        self._versions = 0
+
+    async def get(self, name: str) -> Optional[Lease]:
+        return self.leases.get(name)
+
+    async def create(self, lease: Lease) -> Optional[Lease]:
+        if lease.name in self.leases:
+            return None
+        return self._store(lease)
+
+    async def replace(self, lease: Lease) -> Optional[Lease]:
+        current = self.leases.get(lease.name)
+        if current is None or current.version != lease.version:
+            return None
+        return self._store(lease)
+
+    async def delete(self, lease: Lease) -> bool:
+        current = self.leases.get(lease.name)
+        if current is None or current.version != lease.version:
+            return False
+        del self.leases[lease.name]
+        return True
+
+    async def list(self) -> List[Lease]:
+        return list(self.leases.values())
+
+    async def close(self):
+        pass
+
+    def _store(self, lease: Lease) -> Lease:
+        self._versions += 1
+        stored = self.leases[lease.name] = dataclasses.replace(lease, version=str(self._versions))
+        return stored
+
+
+class KubernetesLeaseBackend:
+    """
+    Leases as coordination.k8s.io/v1 Lease objects, named `<group>-<lease>` and
+    labeled with the group. Writes carry the resourceVersion they were based on;
+    the API server rejects them with 409 Conflict if the object changed since.
+    """
+
+    def __init__(self, api_server: str, namespace: str = "default", group: str = "guardian", token: Optional[str] = None, ssl_context: Optional[ssl.SSLContext] = None, timeout: float = 5.0):
+        self.api_server = api_server.rstrip("/")
+        self.namespace = namespace
+        self.group = group
+        self.token = token
+        self.ssl_context = ssl_context
+        self.timeout = timeout
+        self._session = None # Shared aiohttp.ClientSession, created lazily
+
+    @classmethod
+    def in_cluster(cls, namespace: str, group: str = "guardian") -> "KubernetesLeaseBackend":
+        """
+        Talk to the API server of the cluster the operator runs in, as its service account.
+        """
+        token = (SERVICE_ACCOUNT_DIR / "token").read_text().strip()
+        return cls(
+            "https://kubernetes.default.svc",
+            namespace,
+            group,
+            token=token,
+            ssl_context=ssl.create_default_context(cafile=str(SERVICE_ACCOUNT_DIR / "ca.crt"))
+        )
+
+    async def get(self, name: str) -> Optional[Lease]:
+        status, body = await self._request("GET", self._url(name))
+        if status == 404:
+            return None
+        self._check(status, body)
+        return self._from_manifest(body)
+
+    async def create(self, lease: Lease) -> Optional[Lease]:
+        status, body = await self._request("POST", self._url(), self._to_manifest(lease))
+        if status == 409:
+            return None
+        self._check(status, body)
+        return self._from_manifest(body)
+
+    async def replace(self, lease: Lease) -> Optional[Lease]:
+        status, body = await self._request("PUT", self._url(lease.name), self._to_manifest(lease))
+        if status in (404, 409):
+            return None
+        self._check(status, body)
+        return self._from_manifest(body)
+
+    async def delete(self, lease: Lease) -> bool:
+        options = {"kind": "DeleteOptions", "apiVersion": "v1", "preconditions": {"resourceVersion": lease.version}}
+        status, body = await self._request("DELETE", self._url(lease.name), options)
+        if status in (404, 409):
+            return False
+        self._check(status, body)
+        return True
+
+    async def list(self) -> List[Lease]:
+        status, body = await self._request("GET", self._url(), params={"labelSelector": f"{GROUP_LABEL}={self.group}"})
+        self._check(status, body)
+        return [self._from_manifest(item) for item in body.get("items", [])]
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    def _url(self, name: Optional[str] = None) -> str:
+        url = f"{self.api_server}/apis/coordination.k8s.io/v1/namespaces/{self.namespace}/leases"
+        return f"{url}/{self.group}-{name}" if name is not None else url
+
+    def _to_manifest(self, lease: Lease) -> Dict[str, Any]:
+        metadata: Dict[str, Any] = {
+            "name": f"{self.group}-{lease.name}",
+            "namespace": self.namespace,
+            "labels": {GROUP_LABEL: self.group},
+            "annotations": {ADDRESS_ANNOTATION: lease.address} if lease.address else {},
+        }
+        if lease.version is not None:
+            metadata["resourceVersion"] = lease.version
+        return {
+            "apiVersion": "coordination.k8s.io/v1",
+            "kind": "Lease",
+            "metadata": metadata,
+            "spec": {
+                "holderIdentity": lease.holder,
+                "leaseDurationSeconds": max(1, math.ceil(lease.duration)),
+                "renewTime": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ"),
+            },
+        }
+
+    def _from_manifest(self, manifest: Dict[str, Any]) -> Lease:
+        metadata, spec = manifest["metadata"], manifest.get("spec", {})
+        return Lease(
+            name=metadata["name"][len(self.group) + 1:],
+            holder=spec.get("holderIdentity"),
+            address=(metadata.get("annotations") or {}).get(ADDRESS_ANNOTATION),
+            duration=float(spec.get("leaseDurationSeconds", DEFAULT_LEASE_DURATION)),
+            version=metadata.get("resourceVersion")
+        )
+
+    def _check(self, status: int, body: Dict[str, Any]):
+        if status >= 300:
+            raise RuntimeError(f"Lease API returned HTTP {status}: {body.get('message', body)}")
+
+    async def _request(self, method: str, url: str, payload: Optional[Dict[str, Any]] = None, params: Optional[Dict[str, str]] = None) -> Tuple[int, Dict[str, Any]]:
+        session = await self._get_session()
+        async with session.request(method, url, json=payload, params=params, ssl=self.ssl_context) as resp:
+            return resp.status, await resp.json(content_type=None) or {}
+
+    async def _get_session(self):
+        if self._session is None or self._session.closed:
+            import aiohttp
+            headers = {"Authorization": f"Bearer {self.token}"} if self.token else {}
+            self._session = aiohttp.ClientSession(headers=headers, timeout=aiohttp.ClientTimeout(total=self.timeout))
+        return self._session
+
+
+class ShardCoordinator:
+    """
+    Membership, leadership and shard ownership of one operator replica.
+
+    Every replica renews a member lease and contends for the leader lease every
+    `renew_interval`. Another replica's lease counts as expired once it has not
+    changed for its duration as observed on the local clock (as client-go does),
+    so clock skew between pods does not matter. Live members form a HashRing that
+    decides which replica owns each policy or namespace key; listeners hear about
+    every membership change so the shards can be rebalanced. A replica that
+    cannot renew its own lease stops owning anything and stops leading.
+    """
+
+    def __init__(
+        self,
+        backend: LeaseBackend,
+        identity: str,
+        address: Optional[str] = None,
+        lease_duration: float = DEFAULT_LEASE_DURATION,
+        renew_interval: Optional[float] = None,
+        vnodes: int = DEFAULT_VNODES,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.backend = backend
+        self.identity = identity
+        self.address = address
+        self.lease_duration = lease_duration
+        self.renew_interval = renew_interval or lease_duration / 3
+        self.vnodes = vnodes
+        self.clock = clock
+        self.ring = HashRing(vnodes=vnodes) # Owns nothing until it has joined
+        self.leader: Optional[Lease] = None
+        self._leader_until = float("-inf")
+        self._member_until = float("-inf")
+        self._observed: Dict[str, Tuple[Optional[str], float]] = {} # lease -> (version, local time it was first seen)
+        self._listeners: List[MembershipListener] = []
+        self._task: Optional[asyncio.Task] = None
+        logger.info("ShardCoordinator initialized for %s", identity)
+
+    @property
+    def members(self) -> Tuple[str, ...]:
+        return self.ring.members
+
+    @property
+    def is_leader(self) -> bool:
+        return self.clock() < self._leader_until
+
+    @property
+    def leader_identity(self) -> Optional[str]:
+        return self.leader.holder if self.leader is not None else None
+
+    @property
+    def leader_address(self) -> Optional[str]:
+        return self.leader.address if self.leader is not None else None
+
+    def owns(self, key: str) -> bool:
+        return self.clock() < self._member_until and self.ring.owner(key) == self.identity
+
+    def add_listener(self, listener: MembershipListener):
+        self._listeners.append(listener)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    async def run(self):
+        while True:
+            try:
+                await self.sync()
+            except Exception as e:
+                logger.warning("Shard membership sync failed (%s: %s)", type(e).__name__, e)
+                if self.clock() >= self._member_until:
+                    self._set_members(())
+            await asyncio.sleep(self.renew_interval)
+
+    async def stop(self):
+        """
+        Leave the group, releasing the leases so the others take over right away
+        instead of waiting for them to expire.
+        """
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        for name in (LEADER_LEASE, MEMBER_PREFIX + self.identity):
+            try:
+                lease = await self.backend.get(name)
+                if lease is not None and lease.holder == self.identity:
+                    await self.backend.delete(lease)
+            except Exception as e:
+                logger.warning("Failed to release lease %s: %s", name, e)
+        self._leader_until = self._member_until = float("-inf")
+        self.leader = None
+        self._set_members(())
+        await self.backend.close()
+
+    async def sync(self):
+        """
+        One round: renew membership, contend for leadership, then refresh the members.
+        """
+        started = self.clock()
+        if await self._renew(MEMBER_PREFIX + self.identity, started) is not None:
+            self._member_until = started + self.lease_duration
+        else:
+            logger.error("Member lease for %s is held by another replica; is the identity unique?", self.identity)
+
+        joined = started < self._member_until
+        was_leader = self.is_leader
+        if joined:
+            await self._contend(started)
+        if self.is_leader != was_leader:
+            logger.info("%s %s the pricing leader", self.identity, "became" if self.is_leader else "is no longer")
+
+        now = self.clock()
+        members = [self.identity] if joined else []
+        for lease in await self.backend.list():
+            if not lease.name.startswith(MEMBER_PREFIX) or lease.holder == self.identity:
+                continue
+            if self._alive(lease, now):
+                members.append(lease.holder)
+            elif self.is_leader:
+                # Departed without releasing its lease (crash, partition); clean up after it
+                await self.backend.delete(lease)
+        self._set_members(members)
+
+    async def _renew(self, name: str, started: float) -> Optional[Lease]:
+        lease = await self.backend.get(name)
+        desired = Lease(name=name, holder=self.identity, address=self.address, duration=self.lease_duration)
+        if lease is None:
+            stored = await self.backend.create(desired)
+        elif lease.holder == self.identity:
+            stored = await self.backend.replace(dataclasses.replace(desired, version=lease.version))
+        else:
+            return None
+        if stored is not None:
+            self._observed[name] = (stored.version, started)
+        return stored
+
+    async def _contend(self, started: float):
+        lease = await self.backend.get(LEADER_LEASE)
+        stored = None
+        if lease is None:
+            stored = await self.backend.create(Lease(LEADER_LEASE, self.identity, self.address, self.lease_duration))
+        elif lease.holder == self.identity or lease.holder is None or not self._alive(lease, started):
+            stored = await self.backend.replace(dataclasses.replace(lease, holder=self.identity, address=self.address, duration=self.lease_duration))
+
+        if stored is not None:
+            self._observed[LEADER_LEASE] = (stored.version, started)
+            self._leader_until = started + self.lease_duration
+            self.leader = stored
+        else:
+            self._leader_until = float("-inf")
+            self.leader = lease if lease is not None and self._alive(lease, self.clock()) else None
+
+    def _alive(self, lease: Lease, now: float) -> bool:
+        version, seen = self._observed.get(lease.name, (None, now))
+        if version != lease.version:
+            self._observed[lease.name] = (lease.version, now)
+            return True
+        return now - seen < lease.duration
+
+    def _set_members(self, members: Sequence[str]):
+        if tuple(sorted(set(members))) == self.ring.members:
+            return
+        self.ring = HashRing(members, vnodes=self.vnodes)
+        logger.info("Shard members of %s: %s", self.identity, ", ".join(self.ring.members) or "none")
+        for listener in list(self._listeners):
+            try:
+                listener(self.ring.members)
+            except Exception as e:
+                logger.error("Membership listener failed: %s", e)
+
+
+class ReplicatedPricingSource:
+    """
+    Pricing feed shared by the replicas: the leader fetches it from the cloud,
+    followers copy the leader's latest data for the feed from its SnapshotServer.
+    Wraps any PricingSource; name, TTL and fallback are the wrapped source's.
+    """
+
+    def __init__(self, source: PricingSource, coordinator: ShardCoordinator, ttl: Optional[float] = None):
+        self.source = source
+        self.coordinator = coordinator
+        self.name = source.name
+        self.ttl = source.ttl if ttl is None else ttl
+        self.timeout = source.timeout
+        self.upstream_fetches = 0
+        self.replicated_fetches = 0
+        self._session = None # Shared aiohttp.ClientSession, created lazily
+
+    async def fetch(self) -> PricingTable:
+        if self.coordinator.is_leader:
+            self.upstream_fetches += 1
+            return as_table(await self.source.fetch())
+
+        address = self.coordinator.leader_address
+        if address is None:
+            raise RuntimeError("No pricing leader elected")
+        session = await self._get_session()
+        async with session.get(f"http://{address}/feeds/{self.name}") as resp:
+            if resp.status != 200:
+                raise RuntimeError(f"Pricing leader {address} returned HTTP {resp.status} for {self.name}")
+            body = await resp.json()
+        self.replicated_fetches += 1
+        # Converted column by column: the leader is another process
+        return PricingTable.from_columns(body["columns"])
+
+    def fallback(self) -> PricingTable:
+        return as_table(self.source.fallback())
+
+    async def _get_session(self):
+        if self._session is None or self._session.closed:
+            import aiohttp
+            self._session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=self.timeout))
+        return self._session
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+        await self.source.close()
+
+
+class SnapshotServer:
+    """
+    HTTP endpoint through which the leader hands its latest pricing feeds to
+    followers: GET /feeds/<feed>. Replicas that are not leading answer 409, so
+    followers with an outdated view of the leader retry instead of copying stale data.
+    """
+
+    def __init__(self, collector: MetricsCollector, coordinator: ShardCoordinator, host: str = "0.0.0.0", port: int = DEFAULT_SHARD_PORT):
+        self.collector = collector
+        self.coordinator = coordinator
+        self.host = host
+        self.port = port
+        self._runner = None
+
+    async def start(self) -> int:
+        """
+        Start serving; returns the bound port (useful with port 0).
+        """
+        from aiohttp import web
+        app = web.Application()
+        app.router.add_get("/feeds/{feed}", self._feed)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        self.port = self._runner.addresses[0][1]
+        logger.info("Serving pricing snapshots on %s:%s", self.host, self.port)
+        return self.port
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def _feed(self, request):
+        from aiohttp import web
+        if not self.coordinator.is_leader:
+            return web.json_response({"message": "not the pricing leader", "leader": self.coordinator.leader_address}, status=409)
+        feed = request.match_info["feed"]
+        data = self.collector.feed_data(feed)
+        if data is None:
+            return web.json_response({"message": f"no data for feed {feed}"}, status=404)
+        age, table = data
+        return web.json_response({
+            "feed": feed,
+            "age": age if math.isfinite(age) else None,
+            "columns": table.to_columns(),
+        })
+
+
+async def run_member(args: argparse.Namespace):
+    """
+    A shard member outside the operator, for trying sharding out with local
+    processes: joins the group, replicates pricing from the leader and prints its
+    view (leader, members, owned keys) as a JSON line whenever it changes.
+    """
+    coordinator = ShardCoordinator(
+        KubernetesLeaseBackend(args.api_server, args.namespace, args.group),
+        args.identity,
+        lease_duration=args.lease_duration
+    )
+    source = ReplicatedPricingSource(ReplayPricingSource(args.pricing, loop=True), coordinator, ttl=args.refresh)
+    collector = MetricsCollector(sources=[source])
+    server = SnapshotServer(collector, coordinator, host=args.host, port=args.port)
+    coordinator.address = f"{args.host}:{await server.start()}"
+    coordinator.start()
+
+    stopping = asyncio.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        asyncio.get_running_loop().add_signal_handler(sig, stopping.set)
+
+    async def refresh():
+        while True:
+            try:
+                await collector.refresh()
+            except Exception as e:
+                logger.warning("Pricing refresh failed: %s", e)
+            await asyncio.sleep(args.refresh)
+
+    refresher = asyncio.create_task(refresh())
+    last = None
+    while not stopping.is_set():
+        state = {
+            "identity": args.identity,
+            "leader": coordinator.is_leader,
+            "leader_identity": coordinator.leader_identity,
+            "members": list(coordinator.members),
+            "owned": [key for key in args.keys if coordinator.owns(key)],
+            "items": len(collector.snapshot.table) if collector.snapshot else 0,
+            "fetched_upstream": source.upstream_fetches > 0,
+            "replicated": source.replicated_fetches > 0,
+        }
+        if state != last:
+            print(json.dumps(state), flush=True)
+            last = state
+        try:
+            await asyncio.wait_for(stopping.wait(), timeout=0.05)
+        except asyncio.TimeoutError:
+            pass
+
+    refresher.cancel()
+    await coordinator.stop()
+    await server.stop()
+    await collector.close()
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Run a standalone Guardian shard member against a Kubernetes API server.")
+    parser.add_argument("--api-server", required=True, help="API server URL, e.g. http://127.0.0.1:8001 (kubectl proxy)")
+    parser.add_argument("--identity", required=True, help="Unique name of this member")
+    parser.add_argument("--pricing", required=True, help="Recorded pricing CSV the leader serves (see ReplayPricingSource)")
+    parser.add_argument("--keys", nargs="*", default=[], help="Shard keys to report ownership of")
+    parser.add_argument("--namespace", default="default", help="Namespace of the Lease objects")
+    parser.add_argument("--group", default="guardian", help="Lease name prefix and group label")
+    parser.add_argument("--host", default="127.0.0.1", help="Address to serve pricing snapshots on")
+    parser.add_argument("--port", type=int, default=0, help="Port to serve pricing snapshots on (0: any free port)")
+    parser.add_argument("--lease-duration", type=float, default=DEFAULT_LEASE_DURATION)
+    parser.add_argument("--refresh", type=float, default=1.0, help="Seconds between pricing refreshes")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING, format="%(message)s", stream=sys.stderr)
+    asyncio.run(run_member(args))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
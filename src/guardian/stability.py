@@ -0,0 +1,83 @@
+import logging
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+import numpy as np
+
+from guardian.models import CloudProvider, WorkloadCurrentState
+from guardian.tables import OptionTable, PROVIDER_CODES
+
+logger = logging.getLogger(__name__)
+
+# $/GB to move data out of each cloud to another cloud
+DEFAULT_EGRESS_PER_GB: Dict[CloudProvider, float] = {
+    CloudProvider.AWS: 0.09,
+    CloudProvider.GCP: 0.12,
+    CloudProvider.AZURE: 0.087,
+}
+# $/GB between regions of the same cloud
+DEFAULT_INTER_REGION_PER_GB = 0.02
+
+
+class MigrationCostModel:
+    """
+    One-off cost of moving a workload to each placement option: provisioning
+    overhead, data egress and downtime.
+    """
+
+    def __init__(
+        self,
+        provisioning_cost: float = 0.50,
+        downtime_minutes: float = 2.0,
+        downtime_cost_per_minute: float = 0.10,
+        egress_per_gb: Optional[Dict[CloudProvider, float]] = None,
+        inter_region_per_gb: float = DEFAULT_INTER_REGION_PER_GB
+    ):
+        self.provisioning_cost = provisioning_cost
+        self.downtime_minutes = downtime_minutes
+        self.downtime_cost_per_minute = downtime_cost_per_minute
+        self.egress_per_gb = dict(DEFAULT_EGRESS_PER_GB, **(egress_per_gb or {}))
+        self.inter_region_per_gb = inter_region_per_gb
+        logger.info("MigrationCostModel initialized")
+
+    def cost(self, current_state: WorkloadCurrentState, table: OptionTable, data_gb: float = 0.0) -> np.ndarray:
+        """
+        Migration cost in $ per option. Staying in the current region costs nothing.
+        """
+        same_cloud = table.cloud_codes == PROVIDER_CODES[current_state.current_cloud]
+        same_region = same_cloud & (table.regions == current_state.current_region)
+        egress_rate = np.where(same_cloud, self.inter_region_per_gb, self.egress_per_gb.get(current_state.current_cloud, 0.0))
+        fixed = self.provisioning_cost + self.downtime_minutes * self.downtime_cost_per_minute
+        return np.where(same_region, 0.0, fixed + egress_rate * data_gb)
+
+    def amortized(self, current_state: WorkloadCurrentState, table: OptionTable, data_gb: float, dwell_time_hours: float) -> np.ndarray:
+        """
+        Migration cost spread over the expected dwell time, in $/day like predicted_cost.
+        """
+        return self.cost(current_state, table, data_gb) / max(dwell_time_hours / 24.0, 1e-6)
+
+
+class PlacementHistory:
+    """
+    When and where each workload was last moved, for cooldowns and hysteresis.
+    """
+
+    def __init__(self, clock: Callable[[], float] = time.monotonic):
+        self.clock = clock
+        self._moves: Dict[Tuple[str, str], Tuple[float, CloudProvider, str]] = {}
+
+    def record_move(self, namespace: str, workload_name: str, cloud: CloudProvider, region: str):
+        self._moves[(namespace, workload_name)] = (self.clock(), cloud, region)
+
+    def last_move(self, namespace: str, workload_name: str) -> Optional[Tuple[float, CloudProvider, str]]:
+        return self._moves.get((namespace, workload_name))
+
+    def has_moved(self, namespace: str, workload_name: str) -> bool:
+        return (namespace, workload_name) in self._moves
+
+    def in_cooldown(self, namespace: str, workload_name: str, cooldown_seconds: float) -> bool:
+        move = self._moves.get((namespace, workload_name))
+        return move is not None and self.clock() - move[0] < cooldown_seconds
+
+    def forget(self, namespace: str, workload_name: str):
+        self._moves.pop((namespace, workload_name), None)
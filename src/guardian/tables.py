@@ -0,0 +1,329 @@
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from functools import cached_property
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from guardian.models import CloudPricing, CloudProvider, PlacementOption
+
+# Stable integer codes for providers in columnar data and model features
+PROVIDERS = (CloudProvider.AWS, CloudProvider.GCP, CloudProvider.AZURE)
+PROVIDER_CODES: Dict[CloudProvider, int] = {provider: code for code, provider in enumerate(PROVIDERS)}
+
+
+def categorical(values: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    (codes, categories): int32 codes into the sorted distinct values.
+    """
+    categories, codes = np.unique(np.array(values, dtype=object), return_inverse=True)
+    return codes.astype(np.int32).reshape(-1), categories
+
+
+def naive_utc(timestamp: datetime) -> datetime:
+    # datetime64 has no time zone; feeds mix aware and naive (utcnow) timestamps
+    return timestamp.astimezone(timezone.utc).replace(tzinfo=None) if timestamp.tzinfo else timestamp
+
+
+class PriceRow(NamedTuple):
+    """
+    One SKU as emitted by pricing sources: the fields of CloudPricing in a plain
+    tuple, without per-row validation.
+    """
+    provider: CloudProvider
+    region: str
+    instance_type: str
+    price_on_demand: float
+    price_spot: float
+    currency: str
+    timestamp: datetime
+
+
+@dataclass(frozen=True)
+class PricingTable:
+    """
+    Columnar pricing snapshot, one row per SKU, handed from the collector to the
+    model and decisions instead of one CloudPricing per SKU. Regions, instance
+    types and currencies are categorical: small integer codes into sorted
+    category arrays shared by every row.
+    """
+    provider_codes: np.ndarray  # int8, see PROVIDER_CODES
+    region_codes: np.ndarray    # int32 into region_names
+    instance_codes: np.ndarray  # int32 into instance_names
+    price_on_demand: np.ndarray # float64
+    price_spot: np.ndarray      # float64
+    timestamps: np.ndarray      # datetime64[us], UTC as reported by the feed
+    region_names: np.ndarray    # object
+    instance_names: np.ndarray  # object
+    currency_codes: Optional[np.ndarray] = None # int32 into currency_names; None: all USD
+    currency_names: Optional[np.ndarray] = None
+
+    def __len__(self) -> int:
+        return len(self.provider_codes)
+
+    def __getitem__(self, index: int) -> "PricingRow":
+        return PricingRow(self, index)
+
+    def __iter__(self):
+        return (PricingRow(self, i) for i in range(len(self)))
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[PriceRow]) -> "PricingTable":
+        """
+        Build a table straight from raw source rows, without a model per SKU.
+        """
+        rows = list(rows)
+        providers, regions, instance_types, on_demand, spot, currencies, timestamps = zip(*rows) if rows else ((),) * 7
+        region_codes, region_names = categorical(regions)
+        instance_codes, instance_names = categorical(instance_types)
+        currency_codes = currency_names = None
+        if any(currency != "USD" for currency in currencies):
+            currency_codes, currency_names = categorical(currencies)
+        return cls(
+            provider_codes=np.fromiter((PROVIDER_CODES[provider] for provider in providers), dtype=np.int8, count=len(rows)),
+            region_codes=region_codes,
+            instance_codes=instance_codes,
+            price_on_demand=np.array(on_demand, dtype=float).reshape(-1),
+            price_spot=np.array(spot, dtype=float).reshape(-1),
+            timestamps=np.array([naive_utc(timestamp) for timestamp in timestamps], dtype="datetime64[us]").reshape(-1),
+            region_names=region_names,
+            instance_names=instance_names,
+            currency_codes=currency_codes,
+            currency_names=currency_names
+        )
+
+    @classmethod
+    def from_pricing(cls, items: Sequence[CloudPricing]) -> "PricingTable":
+        return cls.from_rows(
+            PriceRow(item.provider, item.region, item.instance_type, item.price_on_demand, item.price_spot, item.currency, item.timestamp)
+            for item in items
+        )
+
+    @classmethod
+    def from_columns(cls, columns: Dict[str, List[Any]]) -> "PricingTable":
+        """
+        Inverse of `to_columns()`. Values are converted to their column types, so
+        malformed input raises ValueError or KeyError.
+        """
+        return cls.from_rows(zip(
+            [CloudProvider(value) for value in columns["provider"]],
+            [str(value) for value in columns["region"]],
+            [str(value) for value in columns["instance_type"]],
+            [float(value) for value in columns["price_on_demand"]],
+            [float(value) for value in columns["price_spot"]],
+            [str(value) for value in columns["currency"]],
+            [datetime.fromisoformat(value) for value in columns["timestamp"]]
+        ))
+
+    @classmethod
+    def concat(cls, tables: Sequence["PricingTable"]) -> "PricingTable":
+        """
+        Rows of several tables, e.g. one per pricing feed, in order. Categories are
+        merged and the codes remapped; prices are copied once.
+        """
+        tables = [table for table in tables if len(table)]
+        if not tables:
+            return cls.from_rows([])
+        if len(tables) == 1:
+            return tables[0]
+
+        def merge(names: List[np.ndarray], codes: List[np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+            merged = np.unique(np.concatenate(names))
+            return np.concatenate([np.searchsorted(merged, n)[c] for n, c in zip(names, codes)]).astype(np.int32), merged
+
+        region_codes, region_names = merge([t.region_names for t in tables], [t.region_codes for t in tables])
+        instance_codes, instance_names = merge([t.instance_names for t in tables], [t.instance_codes for t in tables])
+        currency_codes = currency_names = None
+        if any(t.currency_codes is not None for t in tables):
+            usd = np.array(["USD"], dtype=object)
+            currency_codes, currency_names = merge(
+                [t.currency_names if t.currency_codes is not None else usd for t in tables],
+                [t.currency_codes if t.currency_codes is not None else np.zeros(len(t), dtype=np.int32) for t in tables]
+            )
+        return cls(
+            provider_codes=np.concatenate([t.provider_codes for t in tables]),
+            region_codes=region_codes,
+            instance_codes=instance_codes,
+            price_on_demand=np.concatenate([t.price_on_demand for t in tables]),
+            price_spot=np.concatenate([t.price_spot for t in tables]),
+            timestamps=np.concatenate([t.timestamps for t in tables]),
+            region_names=region_names,
+            instance_names=instance_names,
+            currency_codes=currency_codes,
+            currency_names=currency_names
+        )
+
+    @cached_property
+    def regions(self) -> np.ndarray:
+        """
+        Region of every row (object array), decoded once per table.
+        """
+        return self.region_names[self.region_codes] if len(self) else np.array([], dtype=object)
+
+    @cached_property
+    def instance_types(self) -> np.ndarray:
+        return self.instance_names[self.instance_codes] if len(self) else np.array([], dtype=object)
+
+    def take(self, indices: np.ndarray) -> "PricingTable":
+        """
+        Subset of rows; the category arrays are shared, not copied.
+        """
+        return PricingTable(
+            provider_codes=self.provider_codes[indices],
+            region_codes=self.region_codes[indices],
+            instance_codes=self.instance_codes[indices],
+            price_on_demand=self.price_on_demand[indices],
+            price_spot=self.price_spot[indices],
+            timestamps=self.timestamps[indices],
+            region_names=self.region_names,
+            instance_names=self.instance_names,
+            currency_codes=self.currency_codes[indices] if self.currency_codes is not None else None,
+            currency_names=self.currency_names
+        )
+
+    @cached_property
+    def currencies(self) -> np.ndarray:
+        if self.currency_codes is None:
+            return np.full(len(self), "USD", dtype=object)
+        return self.currency_names[self.currency_codes]
+
+    @cached_property
+    def keys(self) -> List[Tuple[CloudProvider, str, str]]:
+        """
+        (provider, region, instance type) of every row.
+        """
+        return list(zip((PROVIDERS[code] for code in self.provider_codes), self.regions, self.instance_types))
+
+    def to_pricing(self) -> List[CloudPricing]:
+        return [row.to_model() for row in self]
+
+    def to_columns(self) -> Dict[str, List[Any]]:
+        """
+        JSON-serializable columns, one per PriceRow field, e.g. to hand a feed to another replica.
+        """
+        return {
+            "provider": [PROVIDERS[code].value for code in self.provider_codes],
+            "region": self.regions.tolist(),
+            "instance_type": self.instance_types.tolist(),
+            "price_on_demand": self.price_on_demand.tolist(),
+            "price_spot": self.price_spot.tolist(),
+            "currency": self.currencies.tolist(),
+            "timestamp": [timestamp.isoformat() for timestamp in self.timestamps.tolist()]
+        }
+
+
+class PricingRow:
+    """
+    Read-only view of one PricingTable row with the attributes of CloudPricing.
+    Nothing is copied; `to_model()` builds the pydantic model at API boundaries.
+    """
+    __slots__ = ("table", "index")
+
+    def __init__(self, table: PricingTable, index: int):
+        self.table = table
+        self.index = index
+
+    @property
+    def provider(self) -> CloudProvider:
+        return PROVIDERS[self.table.provider_codes[self.index]]
+
+    @property
+    def region(self) -> str:
+        return self.table.region_names[self.table.region_codes[self.index]]
+
+    @property
+    def instance_type(self) -> str:
+        return self.table.instance_names[self.table.instance_codes[self.index]]
+
+    @property
+    def price_on_demand(self) -> float:
+        return float(self.table.price_on_demand[self.index])
+
+    @property
+    def price_spot(self) -> float:
+        return float(self.table.price_spot[self.index])
+
+    @property
+    def currency(self) -> str:
+        if self.table.currency_codes is None:
+            return "USD"
+        return self.table.currency_names[self.table.currency_codes[self.index]]
+
+    @property
+    def timestamp(self) -> datetime:
+        return self.table.timestamps[self.index].item()
+
+    def to_model(self) -> CloudPricing:
+        # Values come from validated models or typed columns; skip re-validation
+        return CloudPricing.model_construct(
+            provider=self.provider,
+            region=self.region,
+            instance_type=self.instance_type,
+            price_on_demand=self.price_on_demand,
+            price_spot=self.price_spot,
+            currency=self.currency,
+            timestamp=self.timestamp
+        )
+
+
+@dataclass(frozen=True)
+class OptionTable:
+    """
+    Columnar view of placement options, one row per option.
+    Used on the hot path so whole option sets can be filtered and scored with NumPy.
+    """
+    cloud_codes: np.ndarray       # int8, see PROVIDER_CODES
+    regions: np.ndarray           # object array of region names
+    predicted_cost: np.ndarray    # float64
+    predicted_latency: np.ndarray # float64
+    confidence_score: np.ndarray  # float64
+    instance_types: Optional[np.ndarray] = None # object array of instance types, if known
+    pricing: Optional[PricingTable] = field(default=None, compare=False, repr=False) # Row-aligned pricing the options were predicted from
+
+    def __len__(self) -> int:
+        return len(self.cloud_codes)
+
+    @classmethod
+    def from_options(cls, options: Sequence[PlacementOption]) -> "OptionTable":
+        n = len(options)
+        return cls(
+            cloud_codes=np.fromiter((PROVIDER_CODES[o.cloud] for o in options), dtype=np.int8, count=n),
+            regions=np.array([o.region for o in options], dtype=object),
+            predicted_cost=np.fromiter((o.predicted_cost for o in options), dtype=float, count=n),
+            predicted_latency=np.fromiter((o.predicted_latency for o in options), dtype=float, count=n),
+            confidence_score=np.fromiter((o.confidence_score for o in options), dtype=float, count=n),
+            instance_types=np.array([o.instance_type for o in options], dtype=object)
+        )
+
+    @classmethod
+    def from_pricing(cls, pricing: PricingTable, predicted_cost: np.ndarray, predicted_latency: np.ndarray, confidence_score: np.ndarray) -> "OptionTable":
+        """
+        Options for every SKU of a pricing table. Location and SKU columns are shared
+        with the pricing table, so tables for many workload shapes cost only their
+        prediction columns.
+        """
+        return cls(
+            cloud_codes=pricing.provider_codes,
+            regions=pricing.regions,
+            predicted_cost=predicted_cost,
+            predicted_latency=predicted_latency,
+            confidence_score=confidence_score,
+            instance_types=pricing.instance_types,
+            pricing=pricing
+        )
+
+    def option(self, index: int) -> PlacementOption:
+        # Built from typed columns at the recommendation boundary; skip re-validation
+        return PlacementOption.model_construct(
+            cloud=PROVIDERS[self.cloud_codes[index]],
+            region=self.regions[index],
+            instance_type=self.instance_types[index] if self.instance_types is not None else None,
+            predicted_cost=float(self.predicted_cost[index]),
+            predicted_latency=float(self.predicted_latency[index]),
+            confidence_score=float(self.confidence_score[index])
+        )
+
+    def to_options(self, indices: Sequence[int] = None) -> List[PlacementOption]:
+        if indices is None:
+            indices = range(len(self))
+        return [self.option(i) for i in indices]
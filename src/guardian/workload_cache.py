@@ -0,0 +1,249 @@
+import logging
+import re
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from guardian.models import CloudProvider
+
+logger = logging.getLogger(__name__)
+
+# Watch event types; kopf reports objects listed at startup with type None
+DELETED = "DELETED"
+
+REGION_LABELS = ("topology.kubernetes.io/region", "failure-domain.beta.kubernetes.io/region")
+INSTANCE_TYPE_LABELS = ("node.kubernetes.io/instance-type", "beta.kubernetes.io/instance-type")
+PROVIDER_ID_PREFIXES = {"aws": CloudProvider.AWS, "gce": CloudProvider.GCP, "azure": CloudProvider.AZURE}
+
+QUANTITY = re.compile(r"^([+-]?[0-9.]+(?:[eE][+-]?[0-9]+)?)([a-zA-Z]*)$")
+SUFFIXES = {
+    "": 1.0, "m": 1e-3, "k": 1e3, "M": 1e6, "G": 1e9, "T": 1e12, "P": 1e15,
+    "Ki": 2 ** 10, "Mi": 2 ** 20, "Gi": 2 ** 30, "Ti": 2 ** 40, "Pi": 2 ** 50,
+}
+
+WorkloadKey = Tuple[str, str] # (namespace, deployment name)
+
+
+def parse_quantity(value: Any) -> float:
+    """
+    Kubernetes resource quantity ("500m", "2", "512Mi", "1G") as a plain number.
+    """
+    if isinstance(value, (int, float)):
+        return float(value)
+    match = QUANTITY.match(str(value).strip())
+    if not match or match.group(2) not in SUFFIXES:
+        raise ValueError(f"Invalid quantity: {value!r}")
+    return float(match.group(1)) * SUFFIXES[match.group(2)]
+
+
+def pod_requests(pod_spec: Dict[str, Any]) -> Tuple[float, float]:
+    """
+    Effective (CPU cores, memory GiB) requested by one pod: the sum over its
+    containers, or the largest init container if that is more.
+    """
+    def total(containers: Iterable[Dict[str, Any]], combine) -> Tuple[float, float]:
+        cpu = memory = 0.0
+        for container in containers:
+            requests = (container.get("resources") or {}).get("requests") or {}
+            cpu = combine(cpu, parse_quantity(requests.get("cpu", 0)))
+            memory = combine(memory, parse_quantity(requests.get("memory", 0)))
+        return cpu, memory
+
+    cpu, memory = total(pod_spec.get("containers") or [], lambda a, b: a + b)
+    init_cpu, init_memory = total(pod_spec.get("initContainers") or [], max)
+    return max(cpu, init_cpu), max(memory, init_memory) / 2 ** 30
+
+
+@dataclass
+class WorkloadInfo:
+    """
+    A Deployment as seen by the cache: labels, total resource requests and where
+    its pods run.
+    """
+    name: str
+    namespace: str
+    labels: Dict[str, str]
+    replicas: int
+    cpu_cores: float # Requests of all replicas
+    memory_gb: float
+    pods: Set[str] = field(default_factory=set)
+
+
+@dataclass(frozen=True)
+class NodeInfo:
+    cloud: Optional[CloudProvider]
+    region: Optional[str]
+    instance_type: Optional[str]
+    cpu_cores: float # Allocatable
+
+
+@dataclass(frozen=True)
+class Placement:
+    """
+    Where a workload's pods currently run, and the share of each node type they use.
+    """
+    cloud: CloudProvider
+    region: str
+    node_shares: Dict[Tuple[CloudProvider, str, str], float] # (cloud, region, instance type) -> node fraction
+
+
+class WorkloadCache:
+    """
+    In-memory, label-indexed view of Deployments, their Pods and the Nodes they run on.
+
+    Kept current by watch events (see `on_deployment`, `on_pod` and `on_node`)
+    instead of listing the API every tick. Selectors resolve by intersecting the
+    per-(namespace, label, value) index, so lookups cost the size of the match,
+    not of the cluster. Pods are only tracked as (owner, node) so tens of thousands
+    of them fit comfortably.
+    """
+
+    def __init__(self):
+        self.workloads: Dict[WorkloadKey, WorkloadInfo] = {}
+        self.nodes: Dict[str, NodeInfo] = {}
+        self._label_index: Dict[Tuple[str, str, str], Set[str]] = {}
+        self._by_namespace: Dict[str, Set[str]] = {}
+        self._pods: Dict[Tuple[str, str], Tuple[str, Optional[str]]] = {} # (namespace, pod) -> (deployment, node)
+        self._orphans: Dict[WorkloadKey, Set[str]] = {} # Pods seen before (or after) their Deployment
+        logger.info("WorkloadCache initialized")
+
+    def __len__(self) -> int:
+        return len(self.workloads)
+
+    def on_deployment(self, event_type: Optional[str], obj: Dict[str, Any]):
+        metadata = obj.get("metadata", {})
+        key = (metadata.get("namespace", "default"), metadata["name"])
+        previous = self.workloads.pop(key, None)
+        if previous is not None:
+            self._unindex(previous)
+        if event_type == DELETED:
+            if previous is not None and previous.pods:
+                self._orphans[key] = previous.pods
+            return
+
+        spec = obj.get("spec", {})
+        replicas = spec.get("replicas", 1)
+        try:
+            cpu, memory = pod_requests(spec.get("template", {}).get("spec", {}))
+        except ValueError as e:
+            logger.warning("Deployment %s/%s has unparseable resource requests: %s", key[0], key[1], e)
+            cpu = memory = 0.0
+
+        workload = WorkloadInfo(
+            name=key[1],
+            namespace=key[0],
+            labels=dict(metadata.get("labels") or {}),
+            replicas=replicas,
+            cpu_cores=cpu * replicas,
+            memory_gb=memory * replicas,
+            pods=previous.pods if previous is not None else self._orphans.pop(key, set())
+        )
+        self.workloads[key] = workload
+        self._index(workload)
+
+    def on_pod(self, event_type: Optional[str], obj: Dict[str, Any]):
+        metadata = obj.get("metadata", {})
+        key = (metadata.get("namespace", "default"), metadata["name"])
+        previous = self._pods.pop(key, None)
+        if previous is not None:
+            self._pods_of((key[0], previous[0])).discard(key[1])
+            if not self._orphans.get((key[0], previous[0]), True):
+                del self._orphans[(key[0], previous[0])]
+        if event_type == DELETED or obj.get("status", {}).get("phase") in ("Succeeded", "Failed"):
+            return
+
+        owner = self._owning_deployment(metadata)
+        if owner is None:
+            return
+        self._pods[key] = (owner, obj.get("spec", {}).get("nodeName"))
+        self._pods_of((key[0], owner), create=True).add(key[1])
+
+    def on_node(self, event_type: Optional[str], obj: Dict[str, Any]):
+        name = obj["metadata"]["name"]
+        if event_type == DELETED:
+            self.nodes.pop(name, None)
+            return
+
+        labels = obj["metadata"].get("labels") or {}
+        provider_id = obj.get("spec", {}).get("providerID", "")
+        allocatable = obj.get("status", {}).get("allocatable", {})
+        self.nodes[name] = NodeInfo(
+            cloud=PROVIDER_ID_PREFIXES.get(provider_id.split(":", 1)[0]),
+            region=next((labels[label] for label in REGION_LABELS if label in labels), None),
+            instance_type=next((labels[label] for label in INSTANCE_TYPE_LABELS if label in labels), None),
+            cpu_cores=parse_quantity(allocatable.get("cpu", 0))
+        )
+
+    def resolve(self, namespace: str, match_labels: Dict[str, str]) -> List[WorkloadInfo]:
+        """
+        Deployments in the namespace whose labels include every given label.
+        """
+        if not match_labels:
+            names = self._by_namespace.get(namespace, set())
+        else:
+            sets = sorted((self._label_index.get((namespace, k, v), set()) for k, v in match_labels.items()), key=len)
+            names = sets[0].intersection(*sets[1:])
+        return [self.workloads[(namespace, name)] for name in sorted(names)]
+
+    def get(self, namespace: str, name: str) -> Optional[WorkloadInfo]:
+        return self.workloads.get((namespace, name))
+
+    def placement(self, namespace: str, name: str) -> Optional[Placement]:
+        """
+        Cloud and region most of the workload's scheduled pods run in, or None if
+        none of them is on a known node.
+        """
+        workload = self.workloads.get((namespace, name))
+        if workload is None:
+            return None
+
+        locations: Counter = Counter()
+        shares: Dict[Tuple[CloudProvider, str, str], float] = {}
+        pod_cpu = workload.cpu_cores / workload.replicas if workload.replicas else 0.0
+        for pod in workload.pods:
+            node = self.nodes.get(self._pods[(namespace, pod)][1] or "")
+            if node is None or node.cloud is None or node.region is None:
+                continue
+            locations[(node.cloud, node.region)] += 1
+            if node.instance_type:
+                sku = (node.cloud, node.region, node.instance_type)
+                # A pod without requests is counted as a whole node
+                share = min(pod_cpu / node.cpu_cores, 1.0) if pod_cpu and node.cpu_cores else 1.0
+                shares[sku] = shares.get(sku, 0.0) + share
+
+        if not locations:
+            return None
+        (cloud, region), _ = locations.most_common(1)[0]
+        return Placement(cloud=cloud, region=region, node_shares=shares)
+
+    def _owning_deployment(self, metadata: Dict[str, Any]) -> Optional[str]:
+        """
+        Deployment that owns a pod through its ReplicaSet, named <deployment>-<pod-template-hash>.
+        """
+        template_hash = (metadata.get("labels") or {}).get("pod-template-hash")
+        for owner in metadata.get("ownerReferences") or []:
+            if owner.get("kind") == "ReplicaSet" and template_hash and owner["name"].endswith(f"-{template_hash}"):
+                return owner["name"][:-len(template_hash) - 1]
+        return None
+
+    def _pods_of(self, key: WorkloadKey, create: bool = False) -> Set[str]:
+        workload = self.workloads.get(key)
+        if workload is not None:
+            return workload.pods
+        if create:
+            return self._orphans.setdefault(key, set())
+        return self._orphans.get(key, set())
+
+    def _index(self, workload: WorkloadInfo):
+        self._by_namespace.setdefault(workload.namespace, set()).add(workload.name)
+        for label, value in workload.labels.items():
+            self._label_index.setdefault((workload.namespace, label, value), set()).add(workload.name)
+
+    def _unindex(self, workload: WorkloadInfo):
+        self._by_namespace.get(workload.namespace, set()).discard(workload.name)
+        for label, value in workload.labels.items():
+            names = self._label_index.get((workload.namespace, label, value))
+            if names is not None:
+                names.discard(workload.name)
+                if not names:
+                    del self._label_index[(workload.namespace, label, value)]
@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+from guardian.backtest import PriceTimeline, backtest, parameter_grid, synthetic_timeline
+from guardian.benchmark import generate_fleet
+from guardian.models import CloudPricing, CloudProvider
+from guardian.price_history import PriceHistory
+
+
+def test_timeline_resamples_recorded_history():
+    history = PriceHistory()
+    start = 1_700_000_000.0
+    for minute, price in [(-30, 0.03), (20, 0.05), (130, 0.04)]:
+        history.append(CloudPricing(provider=CloudProvider.AWS, region="us-east-1", instance_type="m5.large", price_on_demand=0.1, price_spot=price), timestamp=start + minute * 60)
+    history.append(CloudPricing(provider=CloudProvider.GCP, region="us-central1", instance_type="e2-standard-2", price_on_demand=0.07, price_spot=0.02), timestamp=start + 90 * 60)
+
+    latency = {"us-east-1": (np.array([start + 3600, start]), np.array([80.0, 20.0]))}
+    timeline = PriceTimeline.from_history(history, start, start + 4 * 3600, step=3600, latency=latency)
+
+    assert len(timeline) == 4
+    assert timeline.skus == [(CloudProvider.AWS, "us-east-1", "m5.large"), (CloudProvider.GCP, "us-central1", "e2-standard-2")]
+    # Carried forward from the last sample at or before each tick, even one before the window
+    np.testing.assert_array_equal(timeline.spot[:, 0], [0.03, 0.05, 0.05, 0.04])
+    # Not on offer until its first sample
+    assert np.isnan(timeline.spot[:2, 1]).all() and (timeline.spot[2:, 1] == 0.02).all()
+    assert timeline.pricing(0)[0].tolist() == [0]
+    np.testing.assert_array_equal(timeline.latency[:, 0], [20.0, 80.0, 80.0, 80.0])
+
+
+
+@pytest.mark.asyncio
+async def test_backtest_replays_a_history_reopened_from_disk(tmp_path):
+    fleet = generate_fleet(12, 2, 40, seed=5)
+    synthetic = synthetic_timeline(fleet.pricing, days=1, seed=5)
+    history = PriceHistory(tmp_path)
+    for t, timestamp in enumerate(synthetic.timestamps):
+        for k, (provider, region, instance_type) in enumerate(synthetic.skus):
+            if not np.isnan(synthetic.spot[t, k]):
+                history.append(CloudPricing(
+                    provider=provider, region=region, instance_type=instance_type,
+                    price_on_demand=synthetic.on_demand[t, k], price_spot=synthetic.spot[t, k]
+                ), timestamp=float(timestamp))
+    history.flush()
+
+    # A new process only has the segments
+    reopened = PriceHistory(tmp_path)
+    start, end = synthetic.timestamps[0], synthetic.timestamps[-1] + 1
+    timeline = PriceTimeline.from_history(reopened, start, end, step=synthetic.timestamps[1] - start)
+    assert len(timeline.skus) == 40
+
+    [result] = await backtest(fleet, timeline, [{"savings_threshold": 0.0}], processes=0)
+    assert result.migrations > 0 and result.savings > 0
+
+    with pytest.raises(ValueError):
+        PriceTimeline.from_history(PriceHistory(tmp_path / "empty"), start, end)
+
+@pytest.mark.asyncio
+async def test_policy_sweep_replays_variants_in_worker_processes():
+    fleet = generate_fleet(12, 2, 40, seed=5)
+    timeline = synthetic_timeline(fleet.pricing, days=1, seed=5)
+    variants = parameter_grid(savings_threshold=[0.0, 0.3, 10.0], cost_weight=[20, 80]) + [{"max_latency_ms": 1}]
+
+    results = await backtest(fleet, timeline, variants, processes=2)
+    assert [r.variant for r in results] == variants
+    # Worker processes reading the shared arrays replay exactly what one process would
+    assert results == await backtest(fleet, timeline, variants, processes=0)
+
+    never_moves = [r for r in results if r.variant.get("savings_threshold") == 10.0]
+    assert all(r.migrations == 0 and r.migration_cost == 0 and r.savings == pytest.approx(0.0) for r in never_moves)
+    eager, picky = results[0], results[2]
+    assert eager.migrations >= picky.migrations > 0
+    assert eager.savings == pytest.approx(eager.baseline_cost - eager.cost - eager.migration_cost, abs=0.02)
+
+    # Nothing meets a 1ms latency bound: no moves, and every workload tick is a violation
+    strict = results[-1]
+    assert strict.migrations == 0
+    assert strict.sla_violations == len(fleet.workloads) * len(timeline)
@@ -0,0 +1,49 @@
+import asyncio
+import time
+import pytest
+from guardian.benchmark import SimulatedClock, benchmark_scale, compare, generate_fleet, parse_scale
+
+
+def test_generated_fleet_is_deterministic():
+    fleet = generate_fleet(50, 4, 300, seed=3)
+    again = generate_fleet(50, 4, 300, seed=3)
+    assert fleet == again
+    assert len(fleet.pricing) == 300 and len(fleet.policies) == 4 and len(fleet.workloads) == 50
+    # Distinct SKUs, even past the catalog of known instance types
+    assert len({(p.provider, p.region, p.instance_type) for p in fleet.pricing}) == 300
+    assert generate_fleet(50, 4, 300, seed=4) != fleet
+
+
+@pytest.mark.asyncio
+async def test_simulated_clock_overlaps_concurrent_sleeps():
+    clock = SimulatedClock()
+    lock = asyncio.Semaphore(2)
+
+    async def job(seconds):
+        async with lock:
+            await clock.sleep(seconds)
+            await clock.sleep(seconds)
+        return clock.now
+
+    start = time.perf_counter()
+    finished = await clock.run(job(100), job(100), job(50))
+    assert time.perf_counter() - start < 1.0
+    # Two run side by side, the third waits for a slot
+    assert finished == [200.0, 200.0, 300.0]
+
+
+@pytest.mark.asyncio
+async def test_benchmark_reports_stages_and_regressions():
+    result = await benchmark_scale(20, 2, 30, repeats=1)
+    assert set(result["stages"]) >= {"collect", "predict", "decide"}
+    assert result["stages"]["decide"]["count"] == 20
+    assert result["peak_memory_mb"] > 0
+    assert result["migrations_succeeded"] == result["recommendations"]
+
+    run = {"results": [result]}
+    assert compare(run, run, tolerance=0.2) == []
+    slower = {"results": [dict(result, throughput_workloads_per_s=result["throughput_workloads_per_s"] / 2)]}
+    assert compare(slower, run, tolerance=0.2) == [
+        f"20x2x30 throughput {result['throughput_workloads_per_s']} -> {result['throughput_workloads_per_s'] / 2} workloads/s"
+    ]
+    assert parse_scale("1000x16x200") == (1000, 16, 200)
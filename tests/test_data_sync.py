@@ -0,0 +1,168 @@
+import os
+import time
+import pytest
+from guardian.data_sync import DeltaSync
+from guardian.migration_orchestrator import CUTOVER, MigrationOrchestrator, PHASES, SYNC
+from guardian.models import CloudProvider, PlacementOption, PlacementRecommendation, WorkloadCurrentState
+
+CHUNK = 1024
+
+
+def write(path, data):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(data)
+
+
+def age(root, seconds=60):
+    """
+    Backdate every file so stat()-based change detection can be trusted for them.
+    """
+    past = time.time() - seconds
+    for dirpath, _, filenames in os.walk(root):
+        for filename in filenames:
+            os.utime(os.path.join(dirpath, filename), (past, past))
+
+
+def tree(root):
+    return {
+        os.path.relpath(os.path.join(dirpath, f), root): open(os.path.join(dirpath, f), "rb").read()
+        for dirpath, _, filenames in os.walk(root)
+        for f in filenames
+    }
+
+
+def test_delta_passes_copy_only_changed_chunks(tmp_path):
+    source, target = tmp_path / "src", tmp_path / "dst"
+    write(source / "db" / "data.bin", os.urandom(CHUNK * 10))
+    write(source / "config.yaml", b"replicas: 3\n")
+    write(source / "stale.log", b"x" * 100)
+
+    sync = DeltaSync(source, target, chunk_size=CHUNK)
+    bulk = sync.sync_pass()
+    assert bulk.bytes_copied == CHUNK * 10 + 12 + 100
+    assert tree(target) == tree(source)
+    assert sync.sync_pass().bytes_copied == 0
+
+    # Overwrite one chunk in the middle, shrink one file, delete one and add one
+    with open(source / "db" / "data.bin", "r+b") as f:
+        f.seek(CHUNK * 4 + 10)
+        f.write(b"new rows")
+    write(source / "config.yaml", b"r: 1\n")
+    (source / "stale.log").unlink()
+    write(source / "db" / "wal" / "000001", b"wal")
+
+    delta = sync.sync_pass()
+    assert delta.chunks_copied == 3
+    assert delta.bytes_copied == CHUNK + 5 + 3
+    assert delta.files_deleted == 1
+    assert tree(target) == tree(source)
+
+
+def test_sync_into_partially_copied_target_fills_gaps(tmp_path):
+    source, target = tmp_path / "src", tmp_path / "dst"
+    data = os.urandom(CHUNK * 8)
+    write(source / "data.bin", data)
+    write(target / "data.bin", data[:CHUNK * 5]) # Earlier sync was interrupted
+
+    result = DeltaSync(source, target, chunk_size=CHUNK).sync_pass()
+    assert result.bytes_copied == CHUNK * 3
+    assert tree(target) == tree(source)
+
+
+@pytest.mark.asyncio
+async def test_final_sync_work_follows_writes_not_dataset_size(tmp_path):
+    source, target = tmp_path / "src", tmp_path / "dst"
+    for i in range(20):
+        write(source / f"segment-{i:02d}", os.urandom(CHUNK * 16))
+    age(source)
+
+    sync = DeltaSync(source, target, chunk_size=CHUNK, converge_bytes=CHUNK)
+    passes = await sync.converge()
+    assert passes[0].bytes_copied == 20 * 16 * CHUNK
+    assert passes[-1].bytes_copied <= CHUNK
+
+    # Writes that arrive before the freeze
+    with open(source / "segment-07", "r+b") as f:
+        f.write(os.urandom(CHUNK * 2))
+
+    final = await sync.final_sync()
+    assert final.bytes_copied == CHUNK * 2
+    # Untouched files are skipped by stat, so only the written file is read again
+    assert final.bytes_scanned == CHUNK * 16
+    assert tree(target) == tree(source)
+
+
+@pytest.mark.asyncio
+async def test_orchestrator_syncs_volumes_and_freezes_before_cutover(tmp_path):
+    source, target = tmp_path / "src", tmp_path / "dst"
+    write(source / "data.bin", os.urandom(CHUNK * 4))
+    frozen = []
+
+    async def freeze(recommendation):
+        frozen.append(recommendation.workload_name)
+
+    orchestrator = MigrationOrchestrator(
+        phase_durations={phase: 0.0 for phase in PHASES},
+        volume_locator=lambda recommendation: (source, target),
+        write_freezer=freeze
+    )
+    recommendation = PlacementRecommendation(
+        workload_name="db",
+        namespace="default",
+        current_state=WorkloadCurrentState(
+            workload_name="db", namespace="default", current_cloud=CloudProvider.AWS,
+            current_region="us-east-1", current_cost=10.0, current_latency=40.0
+        ),
+        recommended_option=PlacementOption(cloud=CloudProvider.GCP, region="us-central1", predicted_cost=4.0, predicted_latency=30.0, confidence_score=0.9),
+        estimated_savings=6.0
+    )
+
+    assert await orchestrator.execute_migration(recommendation)
+    assert frozen == ["db"]
+    assert tree(target) == tree(source)
+
+
+@pytest.mark.asyncio
+async def test_cutover_resumed_without_sync_state_rehashes_before_freezing(tmp_path):
+    source, target = tmp_path / "src", tmp_path / "dst"
+    for i in range(8):
+        write(source / f"segment-{i}", os.urandom(CHUNK * 4))
+    age(source)
+    recommendation = PlacementRecommendation(
+        workload_name="db",
+        namespace="default",
+        current_state=WorkloadCurrentState(
+            workload_name="db", namespace="default", current_cloud=CloudProvider.AWS,
+            current_region="us-east-1", current_cost=10.0, current_latency=40.0
+        ),
+        recommended_option=PlacementOption(cloud=CloudProvider.GCP, region="us-central1", predicted_cost=4.0, predicted_latency=30.0, confidence_score=0.9),
+        estimated_savings=6.0
+    )
+
+    def orchestrator(freeze=None):
+        return MigrationOrchestrator(
+            phase_durations={phase: 0.0 for phase in PHASES},
+            volume_locator=lambda recommendation: (source, target),
+            write_freezer=freeze
+        )
+
+    # The SYNC phase ran before a restart, so its chunk hashes are lost
+    await orchestrator().run_phase(SYNC, recommendation)
+    age(target)
+
+    passes_at_freeze = []
+
+    async def freeze(recommendation):
+        data_sync, = resumed._syncs.values()
+        passes_at_freeze.append(len(data_sync.report.passes))
+
+    resumed = orchestrator(freeze)
+    await resumed.run_phase(CUTOVER, recommendation)
+
+    data_sync, = resumed._syncs.values()
+    final = data_sync.report.passes[-1]
+    assert passes_at_freeze and passes_at_freeze[0] >= 1
+    # Nothing was written since, so the frozen pass neither reads nor copies any data
+    assert final.bytes_scanned == 0
+    assert final.bytes_copied == 0
+    assert tree(target) == tree(source)
@@ -65,3 +65,163 @@ async def test_no_recommendation_if_savings_low():
     rec = await engine.generate_recommendation(current, [option_meh], policy)
     
     assert rec is None
+
+@pytest.mark.asyncio
+async def test_ranked_alternatives_respect_constraints():
+    engine = DecisionEngine(top_k=3)
+
+    current = WorkloadCurrentState(
+        workload_name="test",
+        namespace="default",
+        current_cloud=CloudProvider.AWS,
+        current_region="us-east-1",
+        current_cost=10.0,
+        current_latency=50.0
+    )
+
+    options = [
+        PlacementOption(cloud=CloudProvider.GCP, region="us-central1", predicted_cost=6.0, predicted_latency=40.0, confidence_score=0.9),
+        PlacementOption(cloud=CloudProvider.AZURE, region="eastus", predicted_cost=1.0, predicted_latency=40.0, confidence_score=0.9), # Not allowed
+        PlacementOption(cloud=CloudProvider.GCP, region="us-east4", predicted_cost=2.0, predicted_latency=500.0, confidence_score=0.9), # Too slow
+        PlacementOption(cloud=CloudProvider.AWS, region="us-west-2", predicted_cost=5.0, predicted_latency=40.0, confidence_score=0.9),
+        PlacementOption(cloud=CloudProvider.GCP, region="europe-west1", predicted_cost=9.5, predicted_latency=40.0, confidence_score=0.9), # Below threshold
+    ]
+
+    policy = WorkloadPlacementPolicy(
+        workload_selector={},
+        savings_threshold=0.20,
+        allowed_clouds=[CloudProvider.AWS, CloudProvider.GCP]
+    )
+
+    rec = await engine.generate_recommendation(current, options, policy)
+
+    assert rec.recommended_option.region == "us-west-2"
+    assert [o.region for o in rec.alternatives] == ["us-central1"]
+
+@pytest.mark.asyncio
+async def test_low_confidence_options_are_rejected_or_discounted():
+    engine = DecisionEngine()
+
+    current = WorkloadCurrentState(
+        workload_name="test",
+        namespace="default",
+        current_cloud=CloudProvider.AWS,
+        current_region="us-east-1",
+        current_cost=10.0,
+        current_latency=50.0
+    )
+    unsure = PlacementOption(cloud=CloudProvider.GCP, region="us-central1", predicted_cost=4.0, predicted_latency=40.0, confidence_score=0.4)
+    sure = PlacementOption(cloud=CloudProvider.AZURE, region="eastus", predicted_cost=5.0, predicted_latency=40.0, confidence_score=0.95)
+
+    rec = await engine.generate_recommendation(current, [unsure, sure], WorkloadPlacementPolicy(workload_selector={}))
+    assert rec.recommended_option.cloud == CloudProvider.GCP
+
+    rejecting = WorkloadPlacementPolicy(workload_selector={}, min_confidence=0.5)
+    rec = await engine.generate_recommendation(current, [unsure, sure], rejecting)
+    assert rec.recommended_option.cloud == CloudProvider.AZURE
+    assert rec.alternatives == []
+
+    discounting = WorkloadPlacementPolicy(workload_selector={}, confidence_weight=50)
+    rec = await engine.generate_recommendation(current, [unsure, sure], discounting)
+    assert rec.recommended_option.cloud == CloudProvider.AZURE
+
+def cost_aware_fixture(clock):
+    from guardian.stability import MigrationCostModel, PlacementHistory
+
+    engine = DecisionEngine(
+        cost_model=MigrationCostModel(provisioning_cost=1.0, downtime_minutes=0.0),
+        history=PlacementHistory(clock=lambda: clock[0])
+    )
+    current = WorkloadCurrentState(
+        workload_name="db", namespace="default", current_cloud=CloudProvider.AWS,
+        current_region="us-east-1", current_cost=10.0, current_latency=50.0
+    )
+    return engine, current
+
+@pytest.mark.asyncio
+async def test_savings_are_net_of_amortized_migration_cost():
+    engine, current = cost_aware_fixture([0.0])
+    option = PlacementOption(cloud=CloudProvider.GCP, region="us-central1", predicted_cost=7.5, predicted_latency=40.0, confidence_score=0.9)
+    policy = WorkloadPlacementPolicy(workload_selector={}, savings_threshold=0.20, dwell_time_hours=24 * 7)
+
+    # 25% instantaneous savings, but 500 GB of egress at $0.09/GB over a week eats most of it
+    assert await engine.generate_recommendation(current, [option], policy, data_gb=500.0) is None
+
+    rec = await engine.generate_recommendation(current, [option], policy, data_gb=1.0)
+    assert rec is not None
+    assert rec.estimated_savings == pytest.approx(2.5 - (1.0 + 0.09) / 7, abs=0.01)
+
+@pytest.mark.asyncio
+async def test_cooldown_and_hysteresis_stop_ping_pong():
+    clock = [0.0]
+    engine, current = cost_aware_fixture(clock)
+    policy = WorkloadPlacementPolicy(workload_selector={}, savings_threshold=0.20, cooldown_minutes=30, hysteresis=0.10)
+    gcp = PlacementOption(cloud=CloudProvider.GCP, region="us-central1", predicted_cost=7.0, predicted_latency=40.0, confidence_score=0.9)
+    azure = PlacementOption(cloud=CloudProvider.AZURE, region="eastus", predicted_cost=5.0, predicted_latency=40.0, confidence_score=0.9)
+
+    assert (await engine.generate_recommendation(current, [gcp], policy)).recommended_option.cloud == CloudProvider.GCP
+    # Recommending alone starts no cooldown; the migration queue records the move once it succeeds
+    assert (await engine.generate_recommendation(current, [gcp], policy)) is not None
+    engine.history.record_move("default", "db", CloudProvider.GCP, "us-central1")
+
+    moved = current.model_copy(update={"current_cloud": CloudProvider.GCP, "current_region": "us-central1", "current_cost": 7.0})
+    # A much better option right after the move waits for the cooldown
+    clock[0] = 10 * 60
+    assert await engine.generate_recommendation(moved, [azure], policy) is None
+
+    # After it, ~27% savings clear the 20% threshold but not threshold + hysteresis...
+    clock[0] = 31 * 60
+    slightly_better = azure.model_copy(update={"predicted_cost": 5.1})
+    assert await engine.generate_recommendation(moved, [slightly_better], policy) is None
+    # ...while a clearly better option still moves the workload
+    assert (await engine.generate_recommendation(moved, [azure.model_copy(update={"predicted_cost": 4.0})], policy)) is not None
+
+@pytest.mark.asyncio
+async def test_price_dips_are_judged_against_the_trend():
+    from guardian.metrics_collector import PriceTrend
+
+    trends = {
+        "us-central1": PriceTrend(current=0.02, mean=0.04, minimum=0.02, maximum=0.06, samples=12), # Momentary dip
+        "eastus": PriceTrend(current=0.03, mean=0.03, minimum=0.03, maximum=0.03, samples=12),
+    }
+    engine = DecisionEngine(price_trend=lambda provider, region, instance_type: trends.get(region))
+    current = WorkloadCurrentState(
+        workload_name="api", namespace="default", current_cloud=CloudProvider.AWS,
+        current_region="us-east-1", current_cost=10.0, current_latency=50.0
+    )
+    options = [
+        PlacementOption(cloud=CloudProvider.GCP, region="us-central1", instance_type="e2-standard-4", predicted_cost=5.0, predicted_latency=40.0, confidence_score=0.9),
+        PlacementOption(cloud=CloudProvider.AZURE, region="eastus", instance_type="D4s_v3", predicted_cost=6.0, predicted_latency=40.0, confidence_score=0.9),
+    ]
+
+    rec = await engine.generate_recommendation(current, options, WorkloadPlacementPolicy(workload_selector={}))
+    assert rec.recommended_option.region == "eastus"
+    assert [o.region for o in rec.alternatives] == []
+
+@pytest.mark.asyncio
+async def test_trend_ratios_apply_to_the_pricing_table_as_one_vector():
+    import numpy as np
+    from guardian.pricing_sources import mock_pricing
+    from guardian.tables import OptionTable, PricingTable
+
+    pricing = PricingTable.from_pricing(mock_pricing())
+    lookups = []
+
+    def trend_ratios(table):
+        lookups.append(table)
+        return np.where(table.regions == "us-central1", 2.0, 1.0) # GCP's spot price is a momentary dip
+
+    engine = DecisionEngine(trend_ratios=trend_ratios)
+    costs = np.array([8.0, 9.0, 4.0, 5.0])
+    table = OptionTable.from_pricing(pricing, costs, np.full(4, 40.0), np.full(4, 0.9))
+    policy = WorkloadPlacementPolicy(workload_selector={}, savings_threshold=0.1)
+    for name in ("api", "web", "worker"):
+        current = WorkloadCurrentState(
+            workload_name=name, namespace="default", current_cloud=CloudProvider.AWS,
+            current_region="us-east-1", current_cost=10.0, current_latency=50.0
+        )
+        rec = await engine.generate_recommendation(current, table, policy)
+        assert rec.recommended_option.region == "eastus"
+        assert rec.estimated_savings == 5.0
+
+    assert all(t is pricing for t in lookups)
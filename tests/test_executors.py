@@ -0,0 +1,72 @@
+import asyncio
+import time
+import pytest
+from guardian.executors import WorkerPool
+from guardian.ml_engine import MLEngine
+from guardian.models import CloudPricing, CloudProvider
+
+
+def busy(seconds):
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        pass
+    return seconds
+
+
+@pytest.mark.asyncio
+async def test_event_loop_stays_responsive_during_training():
+    pool = WorkerPool(training_workers=1)
+    try:
+        ticks = 0
+
+        async def heartbeat():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.01)
+
+        beat = asyncio.create_task(heartbeat())
+        await pool.run_training(busy, 0.3)
+        beat.cancel()
+
+        # A blocked loop would only have ticked once or twice
+        assert ticks > 10
+    finally:
+        pool.shutdown(wait=True)
+
+
+@pytest.mark.asyncio
+async def test_inference_backpressure_bounds_pending_jobs():
+    pool = WorkerPool(inference_workers=2, max_pending_inference=2, training_processes=False)
+    try:
+        active = 0
+        peak = 0
+
+        def job():
+            nonlocal active, peak
+            active += 1
+            peak = max(peak, active)
+            time.sleep(0.02)
+            active -= 1
+
+        await asyncio.gather(*(pool.run_inference(job) for _ in range(10)))
+        assert peak <= 2
+    finally:
+        pool.shutdown(wait=True)
+
+
+@pytest.mark.asyncio
+async def test_ml_engine_trains_in_process_pool():
+    pool = WorkerPool(inference_workers=2, training_workers=1)
+    try:
+        engine = MLEngine(worker_pool=pool)
+        await engine.train()
+        assert engine.is_trained
+
+        candidates = [
+            CloudPricing(provider=CloudProvider.AWS, region="us-east-1", instance_type="m5.large", price_on_demand=0.096, price_spot=0.035)
+        ]
+        predictions = await engine.predict(2.0, 4.0, candidates)
+        assert predictions[0].predicted_cost > 0
+    finally:
+        pool.shutdown(wait=True)
@@ -0,0 +1,58 @@
+import numpy as np
+from guardian.features import FEATURE_SCHEMA, FeatureEncoder, distance_km, instance_features, region_features, synthetic_training_set
+from guardian.models import CloudPricing, CloudProvider
+from guardian.pricing_sources import mock_pricing
+from guardian.tables import PricingTable
+
+
+def test_candidate_features_use_lookup_tables_and_pricing():
+    encoder = FeatureEncoder()
+    candidate = CloudPricing(provider=CloudProvider.GCP, region="us-central1", instance_type="e2-standard-2", price_on_demand=0.08, price_spot=0.02)
+
+    row = encoder.candidate_matrix([candidate])[0]
+    features = dict(zip(FEATURE_SCHEMA[2:], row))
+
+    assert features["provider_idx"] == 1
+    assert features["region_lat"] == region_features("us-central1")[1]
+    assert (features["instance_vcpu"], features["instance_memory_gb"]) == (2, 8)
+    assert features["spot_discount"] == 0.75
+
+    assert np.isnan(instance_features("unknown.type")).all()
+    assert region_features("mars-north1")[0] == -1
+
+
+def test_candidate_matrix_is_memoized_by_snapshot_version():
+    encoder = FeatureEncoder()
+    candidates = mock_pricing()
+
+    first = encoder.candidate_matrix(candidates, version=1)
+    assert encoder.rows_encoded == 4
+    assert encoder.candidate_matrix(candidates, version=1) is first
+
+    # A new snapshot with one changed price only re-encodes that candidate
+    changed = list(candidates)
+    changed[0] = changed[0].model_copy(update={"price_spot": 0.05})
+    second = encoder.candidate_matrix(changed, version=2)
+    assert encoder.rows_encoded == 5
+    assert np.array_equal(second[1:], first[1:])
+
+    features = encoder.encode(np.array([[2.0, 4.0], [4.0, 16.0]]), second)
+    assert features.shape == (8, len(FEATURE_SCHEMA))
+    assert features[4, 0] == 4.0 and np.array_equal(features[4, 2:], second[0])
+
+
+def test_pricing_table_matrix_matches_per_candidate_encoding():
+    candidates = mock_pricing() + [
+        CloudPricing(provider=CloudProvider.GCP, region="mars-north1", instance_type="unknown.type", price_on_demand=0.0, price_spot=0.0)
+    ]
+    expected = FeatureEncoder().candidate_matrix(candidates)
+    matrix = FeatureEncoder().candidate_matrix(PricingTable.from_pricing(candidates))
+    np.testing.assert_array_equal(matrix, expected)
+
+
+def test_synthetic_training_set_is_deterministic():
+    X, y = synthetic_training_set()
+    X2, y2 = synthetic_training_set()
+    assert X.shape[1] == len(FEATURE_SCHEMA)
+    assert np.array_equal(X, X2) and np.array_equal(y, y2)
+    assert distance_km(38.9, -77.4) == 0.0
@@ -0,0 +1,101 @@
+import asyncio
+import socket
+import urllib.request
+import pytest
+from guardian.instrumentation import REGISTRY, span, start_metrics_server
+from guardian.metrics_collector import MetricsCollector
+from guardian.migration_orchestrator import PHASES, MigrationOrchestrator
+from guardian.migration_queue import SUCCEEDED, MigrationQueue
+from guardian.models import CloudProvider, PlacementOption, PlacementRecommendation, WorkloadCurrentState
+from guardian.pricing_sources import mock_pricing
+
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+class StaticSource:
+    name = "aws"
+    ttl = 3600.0
+    timeout = 10.0
+
+    async def fetch(self):
+        return mock_pricing()
+
+    def fallback(self):
+        return []
+
+    async def close(self):
+        pass
+
+
+def test_span_observes_stage_duration():
+    before = sample("guardian_stage_duration_seconds_count", stage="collect")
+    with span("collect"):
+        pass
+    with pytest.raises(RuntimeError):
+        with span("collect"):
+            raise RuntimeError("failed stages are timed too")
+    assert sample("guardian_stage_duration_seconds_count", stage="collect") == before + 2
+
+
+@pytest.mark.asyncio
+async def test_pricing_cache_results_are_counted():
+    before = {result: sample("guardian_pricing_cache_requests_total", result=result) for result in ("hit", "stale", "miss")}
+    collector = MetricsCollector(sources=[StaticSource()])
+
+    snapshot = await collector.latest_snapshot()
+    await collector.latest_snapshot()
+    collector.provider_ttls["aws"] = 0.0
+    await collector.latest_snapshot()
+    await collector._refreshing
+
+    after = {result: sample("guardian_pricing_cache_requests_total", result=result) for result in ("hit", "stale", "miss")}
+    assert {result: after[result] - before[result] for result in after} == {"hit": 1, "stale": 1, "miss": 1}
+    assert sample("guardian_pricing_snapshot_version") == collector.snapshot.version == snapshot.version + 1
+
+
+@pytest.mark.asyncio
+async def test_migrations_record_outcomes_and_phase_durations():
+    succeeded = sample("guardian_migrations_total", result="succeeded")
+    phases = {phase: sample("guardian_migration_phase_duration_seconds_count", phase=phase) for phase in PHASES}
+
+    queue = MigrationQueue(MigrationOrchestrator(phase_durations={phase: 0.0 for phase in PHASES}))
+    try:
+        recommendation = PlacementRecommendation(
+            workload_name="api",
+            namespace="default",
+            current_state=WorkloadCurrentState(
+                workload_name="api", namespace="default", current_cloud=CloudProvider.AWS,
+                current_region="us-east-1", current_cost=10.0, current_latency=40.0
+            ),
+            recommended_option=PlacementOption(cloud=CloudProvider.GCP, region="us-central1", predicted_cost=4.0, predicted_latency=30.0, confidence_score=0.9),
+            estimated_savings=6.0
+        )
+        migration_id = queue.submit(recommendation)
+        assert sample("guardian_migrations_in_flight") >= 1
+        assert (await queue.wait(migration_id)).state == SUCCEEDED
+    finally:
+        await queue.close()
+
+    assert sample("guardian_migrations_total", result="succeeded") == succeeded + 1
+    assert sample("guardian_migrations_in_flight") == 0
+    assert all(sample("guardian_migration_phase_duration_seconds_count", phase=phase) == phases[phase] + 1 for phase in PHASES)
+
+
+@pytest.mark.asyncio
+async def test_metrics_endpoint_serves_registry():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    assert start_metrics_server(port, addr="127.0.0.1") == port
+
+    def scrape():
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics", timeout=5) as response:
+            return response.read().decode()
+
+    body = await asyncio.to_thread(scrape)
+    assert "guardian_stage_duration_seconds_bucket" in body
+    assert "guardian_migrations_in_flight" in body
+    # The port is taken now; a second server degrades to a warning
+    assert start_metrics_server(port, addr="127.0.0.1") is None
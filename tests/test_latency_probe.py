@@ -0,0 +1,112 @@
+import asyncio
+import random
+import time
+import pytest
+from guardian.latency_probe import LatencyProber, LatencySketch, RollingSketch
+
+
+class FakeClock:
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+async def listener(handler=None):
+    async def close(reader, writer):
+        writer.close()
+    server = await asyncio.start_server(handler or close, "127.0.0.1", 0)
+    return server, server.sockets[0].getsockname()[1]
+
+
+def test_sketch_quantiles_are_within_relative_accuracy():
+    rng = random.Random(7)
+    values = sorted(rng.lognormvariate(3.5, 0.6) for _ in range(20000))
+    sketch = LatencySketch(relative_accuracy=0.01)
+    for value in values:
+        sketch.add(value)
+
+    for q in (0.5, 0.95, 0.99):
+        exact = values[int(q * (len(values) - 1))]
+        assert sketch.quantile(q) == pytest.approx(exact, rel=0.01)
+    # Bounded size however many samples are added
+    assert len(sketch.buckets) < 500
+
+
+def test_rolling_sketch_forgets_old_slots():
+    clock = FakeClock()
+    sketch = RollingSketch(window=60.0, slots=6, clock=clock)
+    for _ in range(100):
+        sketch.add(200.0)
+    clock.now = 50.0
+    sketch.add(20.0)
+    assert sketch.quantiles((0.5,))[0.5] == pytest.approx(200.0, rel=0.01)
+
+    clock.now = 65.0 # The first slot is out of the window
+    assert sketch.quantiles((0.5,))[0.5] == pytest.approx(20.0, rel=0.01)
+    clock.now = 200.0
+    assert sketch.quantiles() == {}
+
+
+@pytest.mark.asyncio
+async def test_probes_many_endpoints_concurrently_and_bounded():
+    active, peak = 0, 0
+    server, port = await listener()
+    prober = LatencyProber({f"region-{i}": f"tcp://127.0.0.1:{port}" for i in range(1000)}, max_concurrency=64, spread=0.05)
+
+    original = prober.probe
+
+    async def tracked(region):
+        nonlocal active, peak
+        active += 1
+        peak = max(peak, active)
+        try:
+            return await original(region)
+        finally:
+            active -= 1
+
+    prober.probe = tracked
+    try:
+        start = time.perf_counter()
+        results = await prober.probe_all()
+        elapsed = time.perf_counter() - start
+    finally:
+        server.close()
+        await server.wait_closed()
+
+    assert len(results) == 1000 and all(r.latency_ms is not None for r in results)
+    assert peak <= 64
+    assert elapsed < 10.0 # A fraction of an optimization interval
+    assert set(prober.quantiles("region-0")) == {0.5, 0.95, 0.99}
+
+
+@pytest.mark.asyncio
+async def test_http_probes_and_failures():
+    async def http(reader, writer):
+        await reader.readuntil(b"\r\n\r\n")
+        writer.write(b"HTTP/1.1 204 No Content\r\nContent-Length: 0\r\n\r\n")
+        await writer.drain()
+        writer.close()
+
+    server, port = await listener(http)
+    closed_server, closed_port = await listener()
+    closed_server.close()
+    await closed_server.wait_closed()
+
+    prober = LatencyProber({
+        "up": f"http://127.0.0.1:{port}/",
+        "down": f"tcp://127.0.0.1:{closed_port}",
+    }, source="us-east-1", timeout=1.0, spread=0.0)
+    try:
+        results = {r.region: r for r in await prober.probe_all(["up", "down", "unknown"])}
+    finally:
+        server.close()
+        await server.wait_closed()
+        await prober.close()
+
+    assert set(results) == {"up", "down"}
+    assert results["up"].latency_ms is not None
+    assert results["down"].latency_ms is None and results["down"].error
+    assert ("us-east-1", "up") in prober.sketches
+    assert prober.quantiles("down") == {}
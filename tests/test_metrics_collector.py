@@ -1,5 +1,24 @@
+import asyncio
+import time
 import pytest
 from guardian.metrics_collector import MetricsCollector
+from guardian.pricing_sources import mock_pricing
+from guardian.models import CloudProvider
+from guardian.tables import OptionTable
+
+
+class FakeSource:
+    def __init__(self, name, fetch, ttl=3600.0, timeout=10.0):
+        self.name = name
+        self.ttl = ttl
+        self.timeout = timeout
+        self.fetch = fetch
+
+    def fallback(self):
+        return []
+
+    async def close(self):
+        pass
 
 @pytest.mark.asyncio
 async def test_metrics_collector_initialization():
@@ -13,13 +32,182 @@ async def test_collect_pricing():
     prices = await collector.collect_pricing()
     assert len(prices) > 0
     assert collector.pricing_cache is not None
+    await collector.close()
 
 @pytest.mark.asyncio
 async def test_measure_latency():
+    from guardian.latency_probe import LatencyProber
+
+    # Local listeners stand in for the regional endpoints
+    server = await asyncio.start_server(lambda reader, writer: writer.close(), "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    endpoints = {"us-east-1": f"tcp://127.0.0.1:{port}", "us-west-2": f"tcp://127.0.0.1:{port}"}
+    collector = MetricsCollector(latency_prober=LatencyProber(endpoints, spread=0.0))
+    try:
+        latencies = await collector.measure_latency("test-app", ["us-east-1", "us-west-2", "eastus"])
+    finally:
+        server.close()
+        await server.wait_closed()
+        await collector.close()
+
+    # No endpoint is configured for eastus, so it is not guessed
+    assert set(latencies) == {"us-east-1", "us-west-2"}
+    assert all(0 <= latency < 1000 for latency in latencies.values())
+
+
+
+def test_probed_latency_calibrates_predicted_latency():
+    import numpy as np
+    from guardian.models import PlacementOption
+
     collector = MetricsCollector()
-    regions = ["us-east-1", "us-west-2"]
-    latencies = await collector.measure_latency("test-app", regions)
-    assert len(latencies) == 2
-    assert "us-east-1" in latencies
-    assert "us-west-2" in latencies
+    for latency in (18.0, 20.0, 22.0):
+        collector.latency_prober._sketch("us-east-1").add(latency)
+    table = OptionTable.from_options([
+        PlacementOption(cloud=CloudProvider.AWS, region="us-east-1", predicted_cost=1.0, predicted_latency=40.0, confidence_score=0.9),
+        PlacementOption(cloud=CloudProvider.AWS, region="us-east-1", predicted_cost=2.0, predicted_latency=50.0, confidence_score=0.9),
+        PlacementOption(cloud=CloudProvider.GCP, region="us-central1", predicted_cost=1.0, predicted_latency=60.0, confidence_score=0.9),
+    ])
+
+    calibrated = collector.calibrate_latency(table)
+    # Probed rows take the measured p50; the unprobed region is scaled like the probed ones
+    assert np.allclose(calibrated.predicted_latency[:2], 20.0, rtol=0.02)
+    ratio = np.median(calibrated.predicted_latency[:2] / table.predicted_latency[:2])
+    assert calibrated.predicted_latency[2] == pytest.approx(60.0 * ratio)
+    assert table.predicted_latency[0] == 40.0 # The model's table is left untouched
+    assert MetricsCollector().calibrate_latency(table) is table # Nothing probed yet
+
+
+
+def test_unprobed_regions_default_to_calibrated_nominal_latency():
+    from guardian.features import nominal_latency
+
+    collector = MetricsCollector()
+    assert collector.default_latency("us-central1") == pytest.approx(nominal_latency("us-central1"))
+    for _ in range(3):
+        collector.latency_prober._sketch("us-east-1").add(40.0) # Twice its nominal 20ms
+    assert collector.default_latency("us-central1") == pytest.approx(2 * nominal_latency("us-central1"), rel=0.02)
+    assert collector.default_latency("mars-north-1") > 0 # Unknown coordinates still get a typical latency
+
+@pytest.mark.asyncio
+async def test_pricing_snapshot_is_cached_and_versioned():
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return mock_pricing()
+
+    async def empty():
+        return []
+
+    collector = MetricsCollector(sources=[FakeSource("aws", fetch), FakeSource("azure", empty), FakeSource("gcp", empty)])
+
+    # Concurrent cold-start callers share one in-flight fetch
+    first, second = await asyncio.gather(collector.latest_snapshot(), collector.latest_snapshot())
+    assert len(calls) == 1
+    assert first.version == 1 and second.version == 1
+    assert collector.get_price(CloudProvider.AWS, "us-east-1", "m5.large").price_spot == 0.035
+    assert "items" not in vars(first) # Snapshots hold the table; models are only built on request
+
+    # Fresh snapshot is served without refetching
+    assert (await collector.latest_snapshot()) is first
+    assert len(calls) == 1
+
+    # Stale feed is served immediately and revalidated in the background
+    collector.provider_ttls["aws"] = 0.0
+    stale = await collector.latest_snapshot()
+    assert stale is first
+    await collector._refreshing
+    assert len(calls) == 2
+    assert collector.snapshot.version == 2
+
+@pytest.mark.asyncio
+async def test_providers_fetched_concurrently_with_timeouts():
+    async def slow():
+        await asyncio.sleep(0.2)
+        return mock_pricing()
+
+    async def hangs():
+        await asyncio.sleep(10)
+        return []
+
+    collector = MetricsCollector(
+        sources=[FakeSource("aws", slow), FakeSource("azure", slow), FakeSource("gcp", hangs)],
+        provider_timeouts={"gcp": 0.05}
+    )
+
+    started = time.monotonic()
+    snapshot = await collector.refresh()
+    elapsed = time.monotonic() - started
+
+    assert elapsed < 0.35
+    assert len(snapshot.items) == 2 * len(mock_pricing())
+    assert snapshot.age("gcp") == float("inf") # Timed out, never fetched
+
+@pytest.mark.asyncio
+async def test_failed_feed_uses_fallback_until_retry():
+    async def fails():
+        raise RuntimeError("no credentials")
+
+    source = FakeSource("aws", fails)
+    source.fallback = mock_pricing
+    collector = MetricsCollector(sources=[source])
+
+    snapshot = await collector.refresh()
+    assert len(snapshot.items) == len(mock_pricing())
+    assert collector.stale_feeds() == [] # Backing off before the next attempt
+
+
+@pytest.mark.asyncio
+async def test_price_trend_tracks_recent_spot_prices():
+    prices = iter([0.04, 0.02, 0.06])
+
+    async def fetch():
+        price = next(prices)
+        return [item.model_copy(update={"price_spot": price}) for item in mock_pricing()[:1]]
+
+    collector = MetricsCollector(sources=[FakeSource("aws", fetch, ttl=0.0)])
+    for _ in range(3):
+        await collector.refresh(force=True)
+
+    trend = collector.price_trend(CloudProvider.AWS, "us-east-1", "m5.large")
+    assert trend.samples == 3
+    assert trend.current == 0.06
+    assert trend.mean == pytest.approx(0.04)
+    assert trend.ratio == pytest.approx(0.04 / 0.06)
+
+    # One ratio vector per snapshot table, aligned with its rows
+    ratios = collector.trend_ratios(collector.snapshot.table)
+    assert ratios.tolist() == [pytest.approx(0.04 / 0.06)]
+    assert collector.trend_ratios(collector.snapshot.table) is ratios
+
+    # Republishing unchanged feed data does not add samples
+    collector._publish()
+    assert collector.price_trend(CloudProvider.AWS, "us-east-1", "m5.large").samples == 3
+    assert collector.price_trend(CloudProvider.GCP, "us-central1", "e2-standard-2") is None
+
+
+@pytest.mark.asyncio
+async def test_published_snapshots_notify_listeners_with_diffs():
+    prices = iter([0.035, 0.035, 0.050])
+
+    async def fetch():
+        price = next(prices)
+        return [mock_pricing()[0].model_copy(update={"price_spot": price}), mock_pricing()[1]]
+
+    collector = MetricsCollector(sources=[FakeSource("aws", fetch, ttl=0.0)])
+    diffs = []
+    collector.add_listener(diffs.append)
+
+    await collector.refresh(force=True)
+    assert len(diffs[0].changes) == 2 # Everything is new
+
+    await collector.refresh(force=True) # Same prices, nothing to report
+    assert len(diffs) == 1
 
+    await collector.refresh(force=True)
+    change, = diffs[1].changes
+    assert (change.region, change.old_price, change.new_price) == ("us-east-1", 0.035, 0.050)
+    assert change.relative_change == pytest.approx(0.05 / 0.035 - 1)
+    assert (diffs[1].old_version, diffs[1].new_version) == (2, 3)
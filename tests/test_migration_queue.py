@@ -0,0 +1,213 @@
+import asyncio
+import time
+import pytest
+from guardian.migration_orchestrator import CUTOVER, MigrationOrchestrator, PHASES, PREFLIGHT, PROVISION, SYNC, VERIFY
+from guardian.migration_queue import FAILED, SUCCEEDED, MigrationQueue, RateLimiter
+from guardian.migration_state import MigrationStateStore
+from guardian.models import CloudProvider, PlacementOption, PlacementRecommendation, WorkloadCurrentState
+from guardian.stability import PlacementHistory
+
+PHASE_SECONDS = 0.02
+
+
+class RecordingOrchestrator(MigrationOrchestrator):
+    """
+    Records (event, phase, workload, region) with timestamps. Can fail a phase for a
+    region always (`fail`) or a number of times (`flaky`), or hang in a phase (`hang`).
+    """
+
+    def __init__(self, fail=None, flaky=None, hang=None):
+        super().__init__(phase_durations={phase: PHASE_SECONDS for phase in PHASES})
+        self.fail = fail or {}
+        self.flaky = dict(flaky or {})
+        self.hang = hang
+        self.events = []
+
+    async def run_phase(self, phase, recommendation):
+        region = recommendation.recommended_option.region
+        key = (phase, recommendation.workload_name, region)
+        self.events.append(("start",) + key + (time.monotonic(),))
+        if self.fail.get(region) == phase:
+            raise RuntimeError(f"{phase} failed")
+        if self.flaky.get((region, phase), 0) > 0:
+            self.flaky[(region, phase)] -= 1
+            raise RuntimeError(f"{phase} flaked")
+        if phase == self.hang:
+            await asyncio.Event().wait()
+        await super().run_phase(phase, recommendation)
+        self.events.append(("end",) + key + (time.monotonic(),))
+
+    async def rollback_phase(self, phase, recommendation):
+        self.events.append(("rollback", phase, recommendation.workload_name, recommendation.recommended_option.region, time.monotonic()))
+        await super().rollback_phase(phase, recommendation)
+
+    def count(self, event, phase, region=None):
+        return sum(1 for e in self.events if e[:2] == (event, phase) and region in (None, e[3]))
+
+    def time_of(self, event, phase, workload):
+        return next(e[4] for e in self.events if e[:3] == (event, phase, workload))
+
+
+def recommendation(name, region="us-central1", alternatives=()):
+    return PlacementRecommendation(
+        workload_name=name,
+        namespace="default",
+        current_state=WorkloadCurrentState(
+            workload_name=name, namespace="default", current_cloud=CloudProvider.AWS,
+            current_region="us-east-1", current_cost=10.0, current_latency=40.0
+        ),
+        recommended_option=PlacementOption(cloud=CloudProvider.GCP, region=region, predicted_cost=4.0, predicted_latency=30.0, confidence_score=0.9),
+        estimated_savings=6.0,
+        alternatives=[
+            PlacementOption(cloud=CloudProvider.GCP, region=alt, predicted_cost=5.0, predicted_latency=30.0, confidence_score=0.9)
+            for alt in alternatives
+        ]
+    )
+
+
+@pytest.mark.asyncio
+async def test_submit_returns_immediately_with_migration_id():
+    queue = MigrationQueue(RecordingOrchestrator())
+    try:
+        started = time.monotonic()
+        migration_id = queue.submit(recommendation("api"))
+        assert time.monotonic() - started < PHASE_SECONDS
+
+        # The same workload is not migrated twice concurrently
+        assert queue.submit(recommendation("api")) == migration_id
+
+        record = await queue.wait(migration_id)
+        assert record.state == SUCCEEDED
+        assert record.result.recommended_option.region == "us-central1"
+        assert queue.in_flight == 0
+    finally:
+        await queue.close()
+
+
+@pytest.mark.asyncio
+async def test_preflight_of_next_migration_overlaps_sync_of_current():
+    orchestrator = RecordingOrchestrator()
+    queue = MigrationQueue(orchestrator, max_concurrent=2, region_concurrency=1)
+    try:
+        ids = [queue.submit(recommendation(name)) for name in ("a", "b")]
+        await asyncio.gather(*(queue.wait(i) for i in ids))
+
+        # Only one migration at a time holds the target region...
+        assert orchestrator.time_of("start", PROVISION, "b") >= orchestrator.time_of("end", SYNC, "a")
+        # ...but the second one's pre-flight ran while the first was still busy there
+        assert orchestrator.time_of("end", PREFLIGHT, "b") < orchestrator.time_of("end", SYNC, "a")
+    finally:
+        await queue.close()
+
+
+@pytest.mark.asyncio
+async def test_throughput_scales_with_concurrency_across_regions():
+    regions = ["us-central1", "us-east4", "us-west1", "europe-west1"]
+
+    async def run(max_concurrent):
+        queue = MigrationQueue(RecordingOrchestrator(), max_concurrent=max_concurrent, provider_rate_limits={CloudProvider.GCP: 1000.0})
+        try:
+            started = time.monotonic()
+            ids = [queue.submit(recommendation(f"w{i}", region)) for i, region in enumerate(regions)]
+            records = await asyncio.gather(*(queue.wait(i) for i in ids))
+            assert all(r.state == SUCCEEDED for r in records)
+            return time.monotonic() - started
+        finally:
+            await queue.close()
+
+    serial = await run(1)
+    parallel = await run(4)
+    assert parallel < serial / 2
+
+
+@pytest.mark.asyncio
+async def test_failed_attempt_falls_back_to_alternative():
+    orchestrator = RecordingOrchestrator(fail={"us-central1": PROVISION, "us-east4": SYNC})
+    history = PlacementHistory()
+    queue = MigrationQueue(orchestrator, retry_delay=0, history=history)
+    try:
+        record = await queue.wait(queue.submit(recommendation("api", alternatives=["us-east4", "us-west1"])))
+        assert record.state == SUCCEEDED
+        assert record.attempts == 3
+        assert record.result.recommended_option.region == "us-west1"
+        # The history has where the workload actually went, not what was recommended
+        assert history.last_move("default", "api")[1:] == (CloudProvider.GCP, "us-west1")
+
+        record = await queue.wait(queue.submit(recommendation("db", alternatives=["us-east4"])))
+        assert record.state == FAILED
+        assert "sync failed" in record.error
+        assert not history.has_moved("default", "db") # Failed migrations start no cooldown
+    finally:
+        await queue.close()
+
+
+@pytest.mark.asyncio
+async def test_failed_phase_is_retried_without_redoing_earlier_phases():
+    orchestrator = RecordingOrchestrator(flaky={("us-central1", SYNC): 2})
+    queue = MigrationQueue(orchestrator, retry_delay=0)
+    try:
+        record = await queue.wait(queue.submit(recommendation("api")))
+        assert record.state == SUCCEEDED
+        assert record.attempts == 1
+        assert orchestrator.count("start", SYNC) == 3
+        assert orchestrator.count("start", PROVISION) == 1
+    finally:
+        await queue.close()
+
+
+@pytest.mark.asyncio
+async def test_verification_failure_rolls_back_before_fallback():
+    orchestrator = RecordingOrchestrator(fail={"us-central1": VERIFY})
+    queue = MigrationQueue(orchestrator, phase_retries=0)
+    try:
+        record = await queue.wait(queue.submit(recommendation("api", alternatives=["us-east4"])))
+        assert record.state == SUCCEEDED
+        assert record.result.recommended_option.region == "us-east4"
+
+        rollbacks = [e[1] for e in orchestrator.events if e[0] == "rollback"]
+        assert rollbacks == [CUTOVER, PROVISION]
+        first_fallback_phase = next(e for e in orchestrator.events if e[3] == "us-east4")
+        last_rollback = [e for e in orchestrator.events if e[0] == "rollback"][-1]
+        assert last_rollback[4] <= first_fallback_phase[4]
+    finally:
+        await queue.close()
+
+
+@pytest.mark.asyncio
+async def test_migration_resumes_from_last_checkpoint_after_restart(tmp_path):
+    store = MigrationStateStore(tmp_path)
+
+    # The operator dies while the first migration is syncing
+    crashing = RecordingOrchestrator(hang=SYNC)
+    queue = MigrationQueue(crashing, state_store=store)
+    migration_id = queue.submit(recommendation("api"))
+    while crashing.count("start", SYNC) == 0:
+        await asyncio.sleep(0.01)
+    await queue.close()
+
+    assert store.load(migration_id).completed_phases == [PREFLIGHT, PROVISION]
+
+    orchestrator = RecordingOrchestrator()
+    queue = MigrationQueue(orchestrator, state_store=MigrationStateStore(tmp_path))
+    try:
+        assert queue.resume() == [migration_id]
+        record = await queue.wait(migration_id)
+        assert record.state == SUCCEEDED
+        assert record.resumed
+
+        # Provisioning is not redone; sync restarts since it never completed
+        assert orchestrator.count("start", PROVISION) == 0
+        assert orchestrator.count("start", SYNC) == 1
+        assert store.pending() == []
+    finally:
+        await queue.close()
+
+
+@pytest.mark.asyncio
+async def test_rate_limiter_spaces_out_calls():
+    limiter = RateLimiter(rate=50.0, burst=1)
+    started = time.monotonic()
+    for _ in range(6):
+        await limiter.acquire()
+    # First call uses the burst, the other five wait ~20ms each
+    assert time.monotonic() - started >= 0.09
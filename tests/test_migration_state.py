@@ -0,0 +1,41 @@
+from guardian.migration_state import MigrationCheckpoint, MigrationStateStore
+from guardian.models import CloudProvider, PlacementOption, PlacementRecommendation, WorkloadCurrentState
+
+
+def recommendation():
+    return PlacementRecommendation(
+        workload_name="api",
+        namespace="default",
+        current_state=WorkloadCurrentState(
+            workload_name="api", namespace="default", current_cloud=CloudProvider.AWS,
+            current_region="us-east-1", current_cost=10.0, current_latency=40.0
+        ),
+        recommended_option=PlacementOption(cloud=CloudProvider.GCP, region="us-central1", predicted_cost=4.0, predicted_latency=30.0, confidence_score=0.9),
+        estimated_savings=6.0,
+        cpu_cores=4.0
+    )
+
+
+def test_checkpoint_round_trips_through_store(tmp_path):
+    store = MigrationStateStore(tmp_path)
+    checkpoint = MigrationCheckpoint.start("abc123", recommendation())
+    checkpoint.completed_phases = ["preflight", "provision"]
+    store.save(checkpoint)
+
+    loaded = MigrationStateStore(tmp_path).load("abc123")
+    assert loaded.completed_phases == ["preflight", "provision"]
+    assert loaded.placement() == checkpoint.placement()
+    assert loaded.placement().recommended_option.cloud == CloudProvider.GCP
+
+    store.delete("abc123")
+    assert store.load("abc123") is None
+    assert store.pending() == []
+
+
+def test_pending_skips_unreadable_checkpoints(tmp_path):
+    store = MigrationStateStore(tmp_path)
+    store.save(MigrationCheckpoint.start("aaa", recommendation()))
+    (tmp_path / "migration-bbb.json").write_text("{not json")
+    (tmp_path / "notes.txt").write_text("ignored")
+
+    assert [c.migration_id for c in store.pending()] == ["aaa"]
@@ -1,6 +1,8 @@
+import numpy as np
 import pytest
-from guardian.ml_engine import MLEngine
+from guardian.ml_engine import MLEngine, confidence_from_spread, forest_predict
 from guardian.models import CloudPricing, CloudProvider
+from guardian.tables import PricingTable
 
 @pytest.mark.asyncio
 async def test_ml_engine_initialization():
@@ -23,3 +25,50 @@ async def test_training_and_prediction():
     assert predictions[0].predicted_cost > 0
     assert predictions[0].predicted_latency > 0
 
+
+@pytest.mark.asyncio
+async def test_batch_prediction_matches_single():
+    engine = MLEngine()
+    await engine.train()
+
+    candidates = [
+        CloudPricing(provider=CloudProvider.AWS, region="us-east-1", instance_type="m5.large", price_on_demand=0.096, price_spot=0.035),
+        CloudPricing(provider=CloudProvider.GCP, region="us-central1", instance_type="e2-standard-2", price_on_demand=0.067, price_spot=0.020),
+        CloudPricing(provider=CloudProvider.AZURE, region="eastus", instance_type="D2s_v3", price_on_demand=0.096, price_spot=0.025),
+    ]
+
+    batches = await engine.predict_batch([(2.0, 4.0), (16.0, 64.0)], candidates)
+    assert len(batches) == 2
+    assert all(len(batch) == 3 for batch in batches)
+
+    single = await engine.predict(16.0, 64.0, candidates)
+    assert [o.predicted_cost for o in single] == [o.predicted_cost for o in batches[1]]
+    assert [o.cloud for o in batches[0]] == [c.provider for c in candidates]
+
+    assert await engine.predict_batch([], candidates) == []
+
+    tables = await engine.predict_tables([(2.0, 4.0), (16.0, 64.0)], PricingTable.from_pricing(candidates))
+    assert [table.to_options() for table in tables] == batches
+    assert tables[0].regions is tables[1].regions
+
+@pytest.mark.asyncio
+async def test_confidence_is_deterministic_and_reflects_tree_spread():
+    engine = MLEngine()
+    await engine.train()
+
+    candidates = [
+        CloudPricing(provider=CloudProvider.AWS, region="us-east-1", instance_type="m5.large", price_on_demand=0.096, price_spot=0.035)
+    ]
+    first = await engine.predict(4.0, 16.0, candidates)
+    again = await engine.predict(4.0, 16.0, candidates)
+    assert first[0].confidence_score == again[0].confidence_score
+    assert 0.0 < first[0].confidence_score <= 1.0
+
+    features = engine.feature_encoder.encode(np.array([[4.0, 16.0]]), engine.feature_encoder.candidate_matrix(candidates))
+    mean, std = forest_predict(engine.model, features)
+    assert np.allclose(mean, engine.model.predict(features))
+
+    agree = confidence_from_spread(np.array([[10.0, 30.0]]), np.array([[0.0, 0.0]]))
+    disagree = confidence_from_spread(np.array([[10.0, 30.0]]), np.array([[5.0, 15.0]]))
+    assert agree[0] == 1.0
+    assert disagree[0] == pytest.approx(1 / 1.5)
@@ -0,0 +1,49 @@
+import pytest
+from guardian.ml_engine import MLEngine, FEATURE_SCHEMA_HASH
+from guardian.model_store import ModelStore
+from guardian.features import synthetic_training_set
+from guardian.models import CloudPricing, CloudProvider
+
+CANDIDATES = [
+    CloudPricing(provider=CloudProvider.AWS, region="us-east-1", instance_type="m5.large", price_on_demand=0.096, price_spot=0.035),
+    CloudPricing(provider=CloudProvider.GCP, region="us-central1", instance_type="e2-standard-2", price_on_demand=0.067, price_spot=0.020),
+]
+
+@pytest.mark.asyncio
+async def test_trained_model_is_persisted_and_warm_started(tmp_path):
+    store = ModelStore(tmp_path)
+    trainer = MLEngine(model_store=store)
+    await trainer.train()
+
+    artifact = store.latest()
+    assert artifact.version == 1
+    assert artifact.schema_hash == FEATURE_SCHEMA_HASH
+    assert artifact.metadata["n_samples"] == len(synthetic_training_set()[0])
+
+    engine = MLEngine(model_store=store)
+    assert engine.load_latest()
+    assert engine.is_trained and engine.model_version == 1
+
+    expected = await trainer.predict(4.0, 16.0, CANDIDATES)
+    loaded = await engine.predict(4.0, 16.0, CANDIDATES)
+    assert [o.predicted_cost for o in loaded] == [o.predicted_cost for o in expected]
+
+@pytest.mark.asyncio
+async def test_hot_swap_only_newer_matching_schema(tmp_path):
+    store = ModelStore(tmp_path)
+    engine = MLEngine(model_store=store)
+    assert not engine.load_latest()
+
+    await MLEngine(model_store=store).train()
+    assert engine.load_latest()
+    assert not engine.load_latest() # Already on the newest version
+
+    # An artifact for another feature schema is ignored
+    other = store.save(engine.model, "other-schema")
+    assert other.version == 2
+    assert not engine.load_latest()
+    assert engine.model_version == 1
+
+    await MLEngine(model_store=store).train()
+    assert engine.load_latest()
+    assert engine.model_version == 3
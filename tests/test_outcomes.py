@@ -0,0 +1,106 @@
+import pytest
+from guardian.migration_orchestrator import MigrationOrchestrator
+from guardian.ml_engine import MLEngine
+from guardian.model_store import ModelStore
+from guardian.outcomes import Outcome, OutcomeLog
+from guardian.models import CloudPricing, CloudProvider, PlacementOption, PlacementRecommendation, WorkloadCurrentState
+
+
+def outcome(i, cost):
+    return Outcome(
+        cpu_cores=4.0, memory_gb=16.0, cloud=CloudProvider.GCP, region="us-central1",
+        observed_cost=cost, observed_latency=30.0 + i % 5,
+        instance_type="e2-standard-4", price_on_demand=0.13, price_spot=0.04
+    )
+
+
+def test_outcome_log_is_a_bounded_window():
+    log = OutcomeLog(max_size=5)
+    for i in range(8):
+        log.record(outcome(i, float(i)))
+
+    assert len(log) == 5
+    assert log.total_recorded == 8
+    assert [o.observed_cost for o in log.since(6)] == [6.0, 7.0]
+    assert len(log.since(0)) == 5 # Older outcomes already left the window
+    assert log.since(8) == []
+
+
+@pytest.mark.asyncio
+async def test_incremental_retraining_tracks_price_drift(tmp_path):
+    engine = MLEngine(model_store=ModelStore(tmp_path))
+    await engine.train()
+    candidates = [CloudPricing(provider=CloudProvider.GCP, region="us-central1", instance_type="e2-standard-4", price_on_demand=0.13, price_spot=0.04)]
+    before = (await engine.predict(4.0, 16.0, candidates))[0].predicted_cost
+
+    log = OutcomeLog()
+    assert not await engine.retrain_incremental(log) # Nothing new yet
+
+    # Outcomes without pricing can't be encoded and are not learned from
+    for i in range(40):
+        log.record(Outcome(cpu_cores=4.0, memory_gb=16.0, cloud=CloudProvider.GCP, region="us-central1", observed_cost=30.0, observed_latency=30.0))
+    assert not await engine.retrain_incremental(log)
+
+    for i in range(40):
+        log.record(outcome(i, 30.0))
+    assert await engine.retrain_incremental(log, trees_per_update=100, max_trees=150)
+
+    forests = engine.model.estimators_
+    assert all(len(forest.estimators_) == 150 for forest in forests)
+    assert engine.model_version == 2
+    after = (await engine.predict(4.0, 16.0, candidates))[0].predicted_cost
+    assert after > before
+
+    # Already-learned outcomes are not replayed
+    assert not await engine.retrain_incremental(log)
+
+
+@pytest.mark.asyncio
+async def test_outcomes_recorded_during_retraining_are_kept_for_the_next_update():
+    engine = MLEngine()
+    await engine.train()
+    log = OutcomeLog()
+    for i in range(40):
+        log.record(outcome(i, 30.0))
+
+    run_training = engine._run_training
+
+    async def record_while_training(*args):
+        log.record(outcome(99, 31.0))
+        return await run_training(*args)
+
+    engine._run_training = record_while_training
+    assert await engine.retrain_incremental(log)
+    assert [o.observed_cost for o in log.since(engine._outcome_mark)] == [31.0]
+
+
+@pytest.mark.asyncio
+async def test_outcome_is_recorded_only_once_the_workload_is_seen_on_the_target():
+    placements = iter([(CloudProvider.AWS, "us-east-1", 10.0), (CloudProvider.AWS, "us-east-1", 10.0), (CloudProvider.GCP, "us-central1", 4.0)])
+
+    async def observe(name, namespace):
+        cloud, region, cost = next(placements)
+        return WorkloadCurrentState(workload_name=name, namespace=namespace, current_cloud=cloud, current_region=region, current_cost=cost, current_latency=30.0)
+
+    async def no_wait(seconds):
+        pass
+
+    log = OutcomeLog()
+    orchestrator = MigrationOrchestrator(outcome_log=log, state_observer=observe, sleep=no_wait, outcome_timeout=5.0, outcome_poll_interval=1.0)
+    recommendation = PlacementRecommendation(
+        workload_name="api",
+        namespace="default",
+        current_state=WorkloadCurrentState(workload_name="api", namespace="default", current_cloud=CloudProvider.AWS, current_region="us-east-1", current_cost=10.0, current_latency=40.0),
+        recommended_option=PlacementOption(cloud=CloudProvider.GCP, region="us-central1", predicted_cost=4.0, predicted_latency=30.0, confidence_score=0.9),
+        estimated_savings=6.0,
+        cpu_cores=2.0
+    )
+
+    # The cache still shows the source twice; the source's cost is not learned as the target's
+    assert await orchestrator.record_outcome(recommendation)
+    assert [(o.cloud, o.observed_cost) for o in log.window()] == [(CloudProvider.GCP, 4.0)]
+
+    # Never observed on the target: skipped instead of mislabeled
+    placements = iter([(CloudProvider.AWS, "us-east-1", 10.0)] * 10)
+    assert not await orchestrator.record_outcome(recommendation)
+    assert len(log) == 1
@@ -0,0 +1,108 @@
+import numpy as np
+from guardian.placement_solver import PlacementSolver
+from guardian.tables import OptionTable
+from guardian.models import (
+    CloudProvider,
+    FleetConstraints,
+    FleetWorkload,
+    PlacementOption,
+    WorkloadCurrentState,
+    WorkloadPlacementPolicy
+)
+
+
+def make_workload(i, cost=10.0, cpu=4.0):
+    state = WorkloadCurrentState(
+        workload_name=f"app-{i}",
+        namespace="default",
+        current_cloud=CloudProvider.AWS,
+        current_region="us-east-1",
+        current_cost=cost,
+        current_latency=40.0
+    )
+    return FleetWorkload(current_state=state, cpu_cores=cpu, memory_gb=16.0)
+
+
+OPTIONS = OptionTable.from_options([
+    PlacementOption(cloud=CloudProvider.GCP, region="us-central1", predicted_cost=3.0, predicted_latency=40.0, confidence_score=0.9),
+    PlacementOption(cloud=CloudProvider.AZURE, region="eastus", predicted_cost=5.0, predicted_latency=40.0, confidence_score=0.9),
+    PlacementOption(cloud=CloudProvider.AWS, region="us-east-1", predicted_cost=10.0, predicted_latency=40.0, confidence_score=0.9),
+])
+POLICY = WorkloadPlacementPolicy(workload_selector={})
+
+
+def test_capacity_prevents_stampede():
+    workloads = [make_workload(i) for i in range(10)]
+    constraints = FleetConstraints(region_capacity={"us-central1": 12.0, "eastus": 8.0})
+
+    plan = PlacementSolver().solve(workloads, [POLICY] * 10, [OPTIONS] * 10, constraints)
+
+    regions = [r.recommended_option.region for r in plan.migrations]
+    assert regions.count("us-central1") == 3
+    assert regions.count("eastus") == 2
+    assert plan.violations == []
+    assert plan.region_usage["us-east-1"] == 20.0
+
+
+def test_migration_and_budget_caps():
+    workloads = [make_workload(i) for i in range(10)]
+
+    plan = PlacementSolver().solve(workloads, [POLICY] * 10, [OPTIONS] * 10, FleetConstraints(max_migrations=4))
+    assert len(plan.migrations) == 4
+
+    constraints = FleetConstraints(cloud_budget={CloudProvider.GCP: 9.0, CloudProvider.AZURE: 10.0})
+    plan = PlacementSolver().solve(workloads, [POLICY] * 10, [OPTIONS] * 10, constraints)
+    clouds = [r.recommended_option.cloud for r in plan.migrations]
+    assert clouds.count(CloudProvider.GCP) == 3
+    assert clouds.count(CloudProvider.AZURE) == 2
+    assert plan.cloud_spend[CloudProvider.GCP] <= 9.0
+
+
+def test_repair_moves_workloads_off_over_budget_cloud():
+    # Current AWS spend is 30 against a cap of 20; a small-gain move is still taken
+    workloads = [make_workload(i) for i in range(3)]
+    options = OptionTable.from_options([
+        PlacementOption(cloud=CloudProvider.GCP, region="us-central1", predicted_cost=7.9, predicted_latency=40.0, confidence_score=0.9),
+    ])
+    constraints = FleetConstraints(cloud_budget={CloudProvider.AWS: 20.0}, max_migrations=1)
+
+    plan = PlacementSolver().solve(workloads, [POLICY] * 3, [options] * 3, constraints)
+    assert len(plan.migrations) == 1
+    assert plan.cloud_spend[CloudProvider.AWS] == 20.0
+
+
+
+def test_repair_ignores_savings_threshold():
+    # us-east-1 holds 12 cores against a capacity of 8; the only way out costs more
+    workloads = [make_workload(i) for i in range(3)]
+    options = OptionTable.from_options([
+        PlacementOption(cloud=CloudProvider.GCP, region="us-central1", predicted_cost=10.5, predicted_latency=40.0, confidence_score=0.9),
+        PlacementOption(cloud=CloudProvider.AZURE, region="eastus", predicted_cost=9.0, predicted_latency=500.0, confidence_score=0.9),
+    ])
+    constraints = FleetConstraints(region_capacity={"us-east-1": 8.0})
+
+    plan = PlacementSolver().solve(workloads, [POLICY] * 3, [options] * 3, constraints)
+    # One workload moves to the feasible option; eastus breaks the latency limit
+    assert [r.recommended_option.region for r in plan.migrations] == ["us-central1"]
+    assert plan.region_usage["us-east-1"] == 8.0
+    assert plan.violations == []
+
+def test_solver_scales_to_large_fleets():
+    rng = np.random.default_rng(1)
+    n_options = 200
+    clouds = list(CloudProvider)
+    tables = []
+    for shape in range(5):
+        tables.append(OptionTable.from_options([
+            PlacementOption(cloud=clouds[i % 3], region=f"region-{i % 50}", predicted_cost=float(c), predicted_latency=float(l), confidence_score=0.9)
+            for i, (c, l) in enumerate(zip(rng.uniform(1, 20, n_options), rng.uniform(10, 90, n_options)))
+        ]))
+
+    n = 2000
+    workloads = [make_workload(i, cost=20.0, cpu=2.0) for i in range(n)]
+    constraints = FleetConstraints(region_capacity={f"region-{r}": 40.0 for r in range(50)}, max_migrations=500)
+
+    plan = PlacementSolver().solve(workloads, [POLICY] * n, [tables[i % 5] for i in range(n)], constraints)
+    assert len(plan.migrations) == 500
+    assert plan.violations == []
+    assert all(plan.region_usage.get(f"region-{r}", 0.0) <= 40.0 for r in range(50))
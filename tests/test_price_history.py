@@ -0,0 +1,111 @@
+import pytest
+from guardian.price_history import PriceHistory
+from guardian.models import CloudPricing, CloudProvider
+
+
+class FakeClock:
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def price(spot, region="us-east-1", instance_type="m5.large", provider=CloudProvider.AWS):
+    return CloudPricing(provider=provider, region=region, instance_type=instance_type, price_on_demand=spot * 3, price_spot=spot)
+
+
+def fill(history, clock, prices, step=60.0, **sku):
+    for spot in prices:
+        history.append(price(spot, **sku), clock())
+        clock.now += step
+
+
+def test_window_stats_per_sku():
+    clock = FakeClock()
+    history = PriceHistory(clock=clock)
+    fill(history, clock, [float(p) for p in range(1, 101)]) # One sample a minute for 100 minutes
+    fill(history, clock, [9.0], region="us-west-2")
+
+    # The last 31 minutes hold 71..100 (and the other region does not leak in)
+    stats = history.stats(CloudProvider.AWS, "us-east-1", "m5.large", seconds=31 * 60, percentiles=(50, 95))
+    assert stats.samples == 30
+    assert (stats.minimum, stats.maximum, stats.current) == (71.0, 100.0, 100.0)
+    assert stats.mean == pytest.approx(85.5)
+    assert stats.percentiles[50.0] == pytest.approx(85.5)
+    assert stats.percentiles[95.0] == pytest.approx(98.55)
+
+    series = history.range(CloudProvider.AWS, "us-east-1", "m5.large", start=clock.now - 3 * 3600)
+    assert len(series) == 100
+    assert list(series.on_demand[:2]) == [3.0, 6.0]
+    assert history.stats(CloudProvider.GCP, "us-east-1", "m5.large", seconds=3600) is None
+    assert sorted(history.skus()) == [(CloudProvider.AWS, "us-east-1", "m5.large"), (CloudProvider.AWS, "us-west-2", "m5.large")]
+
+
+def test_rings_are_bounded_and_spill_to_segments(tmp_path):
+    clock = FakeClock()
+    history = PriceHistory(tmp_path, capacity=16, clock=clock)
+
+    fill(history, clock, [float(p) for p in range(10)])
+    history.flush()
+    # Overflowing the ring spills to disk on its own
+    fill(history, clock, [float(p) for p in range(10, 40)])
+    assert len(history._rings[next(iter(history._rings))]) == 16
+    history.flush()
+
+    # The rings only hold the last 16 samples; older ones are read from disk
+    series = history.range(CloudProvider.AWS, "us-east-1", "m5.large")
+    assert list(series.spot) == [float(p) for p in range(40)]
+
+    # A new process reads the same history back from the memory-mapped segments
+    reopened = PriceHistory(tmp_path, clock=clock)
+    assert list(reopened.range(CloudProvider.AWS, "us-east-1", "m5.large").spot) == [float(p) for p in range(40)]
+    assert reopened.range(CloudProvider.AZURE, "eastus", "D2s_v3").spot.size == 0
+
+
+def test_segments_past_retention_are_pruned(tmp_path):
+    clock = FakeClock()
+    history = PriceHistory(tmp_path, retention=3600.0, clock=clock)
+    fill(history, clock, [1.0, 2.0])
+    history.flush()
+
+    clock.now += 2 * 3600
+    fill(history, clock, [3.0])
+    history.flush()
+
+    assert len(list(tmp_path.glob("segment-*"))) == 1
+    assert list(PriceHistory(tmp_path, clock=clock).range(CloudProvider.AWS, "us-east-1", "m5.large").spot) == [3.0]
+
+
+def test_samples_sharing_a_flushed_timestamp_are_not_lost(tmp_path):
+    clock = FakeClock()
+    history = PriceHistory(tmp_path, capacity=4, clock=clock)
+    history.append(price(1.0), clock())
+    history.flush()
+
+    # Appended after the flush with the same timestamp, then more than a ring's worth
+    history.append(price(2.0), clock())
+    history.flush() # Same millisecond bounds as the first segment
+    for spot in (3.0, 4.0, 5.0, 6.0, 7.0, 8.0):
+        history.append(price(spot), clock())
+    history.flush()
+
+    reopened = PriceHistory(tmp_path, clock=clock)
+    assert sorted(reopened.range(CloudProvider.AWS, "us-east-1", "m5.large").spot) == [float(p) for p in range(1, 9)]
+    assert len(list(tmp_path.glob("segment-*"))) == 4
+
+
+def test_skus_include_segments_loaded_from_disk(tmp_path):
+    clock = FakeClock()
+    history = PriceHistory(tmp_path, clock=clock)
+    fill(history, clock, [1.0, 2.0])
+    fill(history, clock, [3.0], region="eu-west-1")
+    history.flush()
+
+    reopened = PriceHistory(tmp_path, clock=clock)
+    fill(reopened, clock, [4.0], provider=CloudProvider.GCP, region="us-central1", instance_type="e2-standard-2")
+    assert reopened.skus() == [
+        (CloudProvider.AWS, "us-east-1", "m5.large"),
+        (CloudProvider.AWS, "eu-west-1", "m5.large"),
+        (CloudProvider.GCP, "us-central1", "e2-standard-2"),
+    ]
@@ -0,0 +1,65 @@
+import pytest
+from aiohttp import web
+from guardian.metrics_collector import MetricsCollector
+from guardian.pricing_sources import AzureRetailPricingSource, PricingSource, ReplayPricingSource, mock_pricing, record_pricing
+from guardian.models import CloudProvider
+from datetime import datetime, timedelta
+
+@pytest.mark.asyncio
+async def test_azure_pricing_follows_pagination():
+    async def prices(request):
+        page = int(request.query.get("page", "1"))
+        items = [{"retailPrice": 0.1 * page, "location": "eastus", "skuName": f"D{page}s v3"}]
+        next_link = str(request.url.with_query(page=page + 1)) if page < 3 else None
+        return web.json_response({"Items": items, "NextPageLink": next_link})
+
+    app = web.Application()
+    app.router.add_get("/prices", prices)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = runner.addresses[0][1]
+
+    source = AzureRetailPricingSource(url=f"http://127.0.0.1:{port}/prices")
+    assert isinstance(source, PricingSource)
+    try:
+        items = [item async for item in source.stream()]
+        session = source._session
+        assert (await source.fetch())[2].instance_type == "D3s v3"
+        assert source._session is session # Session is reused across fetches
+    finally:
+        await source.close()
+        await runner.cleanup()
+
+    assert [item.instance_type for item in items] == ["D1s v3", "D2s v3", "D3s v3"]
+    assert all(item.provider == CloudProvider.AZURE for item in items)
+
+@pytest.mark.asyncio
+async def test_replay_source_drives_collector(tmp_path):
+    start = datetime(2024, 1, 1)
+    history = []
+    for step in range(3):
+        for item in mock_pricing():
+            history.append(item.model_copy(update={"timestamp": start + timedelta(minutes=step), "price_spot": item.price_spot + step}))
+
+    path = tmp_path / "pricing.csv"
+    assert record_pricing(path, history) == 12
+
+    source = ReplayPricingSource(path)
+    collector = MetricsCollector(sources=[source])
+
+    first = await collector.refresh()
+    second = await collector.refresh()
+    assert second.version == first.version + 1
+    assert len(second.items) == 4
+    assert second.items[0].price_spot == pytest.approx(history[0].price_spot + 1)
+
+    # Last step keeps being served once the history is exhausted
+    await collector.refresh()
+    last = await collector.refresh()
+    assert last.items[0].timestamp == start + timedelta(minutes=2)
+    assert source.steps_served == 3
+
+    rows = [item async for item in source.stream()]
+    assert len(rows) == 12
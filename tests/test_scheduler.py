@@ -0,0 +1,197 @@
+import pytest
+from guardian.decision_engine import DecisionEngine
+from guardian.metrics_collector import MetricsCollector, PricingSnapshot
+from guardian.ml_engine import MLEngine
+from guardian.scheduler import FleetOptimizer
+from guardian.tables import PricingTable
+from guardian.models import CloudPricing, CloudProvider, FleetWorkload, WorkloadCurrentState, WorkloadPlacementPolicy
+
+
+class CountingCollector(MetricsCollector):
+    def __init__(self):
+        super().__init__()
+        self.calls = 0
+
+    async def latest_snapshot(self):
+        self.calls += 1
+        return PricingSnapshot(version=self.calls, fetched_at={}, table=PricingTable.from_pricing([
+            CloudPricing(provider=CloudProvider.AWS, region="us-east-1", instance_type="m5.large", price_on_demand=0.096, price_spot=0.035),
+            CloudPricing(provider=CloudProvider.GCP, region="us-central1", instance_type="e2-standard-2", price_on_demand=0.067, price_spot=0.020),
+        ]))
+
+
+def make_resolver(calls):
+    async def resolve(namespace, policy):
+        calls.append(namespace)
+        state = WorkloadCurrentState(
+            workload_name="app",
+            namespace=namespace,
+            current_cloud=CloudProvider.AWS,
+            current_region="us-east-1",
+            current_cost=100.0,
+            current_latency=35.0
+        )
+        return [FleetWorkload(current_state=state, cpu_cores=4.0, memory_gb=16.0)]
+    return resolve
+
+
+@pytest.mark.asyncio
+async def test_policies_share_one_tick():
+    collector = CountingCollector()
+    resolved = []
+    optimizer = FleetOptimizer(collector, MLEngine(), DecisionEngine(), make_resolver(resolved))
+    policy = WorkloadPlacementPolicy(workload_selector={})
+
+    optimizer.register("a/p1", "a", policy)
+    optimizer.register("b/p2", "b", policy)
+
+    recs_a = await optimizer.recommendations_for("a/p1", "a", policy)
+    recs_b = await optimizer.recommendations_for("b/p2", "b", policy)
+
+    assert collector.calls == 1
+    assert sorted(resolved) == ["a", "b"]
+    assert len(recs_a) == 1 and recs_a[0].namespace == "a"
+    assert len(recs_b) == 1 and recs_b[0].namespace == "b"
+
+
+@pytest.mark.asyncio
+async def test_recommendations_are_handed_over_once():
+    received = []
+    optimizer = FleetOptimizer(
+        CountingCollector(), MLEngine(), DecisionEngine(), make_resolver([]),
+        on_recommendations=lambda key, recs: received.append((key, [r.workload_name for r in recs]))
+    )
+    policy = WorkloadPlacementPolicy(workload_selector={})
+
+    # The timer's read triggers the pass, which hands the recommendation over...
+    assert await optimizer.recommendations_for("a/p1", "a", policy) == []
+    assert received == [("a/p1", ["app"])]
+    # ...and later reads of the same pass have nothing left to act on
+    assert await optimizer.recommendations_for("a/p1", "a", policy) == []
+    assert optimizer.results == {"a/p1": []}
+    assert len(received) == 1
+
+
+@pytest.mark.asyncio
+async def test_new_policy_triggers_tick_and_unregister():
+    collector = CountingCollector()
+    optimizer = FleetOptimizer(collector, MLEngine(), DecisionEngine(), make_resolver([]))
+    policy = WorkloadPlacementPolicy(workload_selector={})
+
+    await optimizer.recommendations_for("a/p1", "a", policy)
+    await optimizer.recommendations_for("b/p2", "b", policy)
+    assert collector.calls == 2
+
+    optimizer.unregister("a/p1")
+    await optimizer.tick()
+    assert "a/p1" not in optimizer.results
+    assert "b/p2" in optimizer.results
+
+
+@pytest.mark.asyncio
+async def test_solver_mode_applies_fleet_constraints():
+    from guardian.placement_solver import PlacementSolver
+    from guardian.models import FleetConstraints
+
+    collector = CountingCollector()
+    optimizer = FleetOptimizer(
+        collector, MLEngine(), DecisionEngine(), make_resolver([]),
+        placement_solver=PlacementSolver(),
+        constraints=FleetConstraints(max_migrations=1)
+    )
+    policy = WorkloadPlacementPolicy(workload_selector={})
+    optimizer.register("a/p1", "a", policy)
+    optimizer.register("b/p2", "b", policy)
+
+    results = await optimizer.tick()
+    assert sum(len(recs) for recs in results.values()) == 1
+
+
+def make_fleet_resolver(calls):
+    """
+    Every namespace has two workloads on AWS, app-0 in us-east-1 and app-1 in us-west-2.
+    """
+    async def resolve(namespace, policy):
+        calls.append(namespace)
+        return [
+            FleetWorkload(
+                current_state=WorkloadCurrentState(
+                    workload_name=f"app-{i}", namespace=namespace, current_cloud=CloudProvider.AWS,
+                    current_region=region, current_cost=100.0, current_latency=35.0
+                ),
+                cpu_cores=4.0, memory_gb=16.0
+            )
+            for i, region in enumerate(["us-east-1", "us-west-2"])
+        ]
+    return resolve
+
+
+def diff(*changes):
+    from guardian.metrics_collector import PriceChange, PricingDiff
+    return PricingDiff(old_version=1, new_version=2, changes=tuple(PriceChange(*c) for c in changes))
+
+
+@pytest.mark.asyncio
+async def test_price_diffs_reevaluate_only_affected_pairs():
+    resolved = []
+    optimizer = FleetOptimizer(CountingCollector(), MLEngine(), DecisionEngine(), make_fleet_resolver(resolved))
+    optimizer.register("gcp-only/p", "gcp-only", WorkloadPlacementPolicy(workload_selector={}, allowed_clouds=[CloudProvider.GCP]))
+    optimizer.register("aws-only/p", "aws-only", WorkloadPlacementPolicy(workload_selector={}, allowed_clouds=[CloudProvider.AWS]))
+    await optimizer.tick()
+    assert optimizer.evaluations == 4
+    before = dict(optimizer.results)
+
+    # Small wiggles are ignored
+    optimizer.on_pricing_diff(diff((CloudProvider.GCP, "us-central1", "e2-standard-2", 0.020, 0.0205)))
+    assert optimizer._dirty == {}
+
+    # A GCP spike affects every workload of the GCP policy...
+    optimizer.on_pricing_diff(diff((CloudProvider.GCP, "us-central1", "e2-standard-2", 0.020, 0.060)))
+    # ...and an AWS change every workload of the AWS policy
+    optimizer.on_pricing_diff(diff((CloudProvider.AZURE, "eastus", "D2s_v3", 0.025, 0.05), (CloudProvider.AWS, "us-west-2", "m5.large", 0.04, None)))
+    assert optimizer._dirty == {"gcp-only/p": {"app-0", "app-1"}, "aws-only/p": {"app-0", "app-1"}}
+
+    optimizer._dirty = {}
+    optimizer.on_pricing_diff(diff((CloudProvider.AZURE, "westus2", "D2s_v3", 0.025, 0.05)))
+    assert optimizer._dirty == {}
+    # Clouds a policy does not allow only matter to workloads currently running there
+    optimizer.on_pricing_diff(diff((CloudProvider.AWS, "us-east-1", "m5.large", 0.035, 0.01)))
+    assert optimizer._dirty == {"aws-only/p": {"app-0", "app-1"}, "gcp-only/p": {"app-0"}}
+
+    # Only the given pair is evaluated again, other results are kept
+    fresh = await optimizer.reevaluate({"aws-only/p": {"app-1"}})
+    assert optimizer.evaluations == 5
+    assert set(fresh) == {"aws-only/p"}
+    assert optimizer.results["gcp-only/p"] == before["gcp-only/p"]
+    assert {r.workload_name for r in optimizer.results["aws-only/p"]} == {r.workload_name for r in before["aws-only/p"]}
+
+
+@pytest.mark.asyncio
+async def test_price_change_triggers_decision_without_waiting_for_sweep():
+    import asyncio
+    from guardian.metrics_collector import PriceChange, PricingDiff
+
+    collector = CountingCollector()
+    received = []
+    optimizer = FleetOptimizer(
+        collector, MLEngine(), DecisionEngine(), make_resolver([]),
+        interval=3600.0, debounce=0.01,
+        on_recommendations=lambda key, recs: received.append((key, [r.workload_name for r in recs]))
+    )
+    optimizer.register("a/p1", "a", WorkloadPlacementPolicy(workload_selector={}))
+    optimizer.start()
+    try:
+        # Published by the collector when a refresh sees the spike
+        for listener in collector._listeners:
+            listener(PricingDiff(old_version=1, new_version=2, changes=(
+                PriceChange(CloudProvider.GCP, "us-central1", "e2-standard-2", 0.020, 0.005),
+            )))
+
+        for _ in range(200):
+            if received:
+                break
+            await asyncio.sleep(0.02)
+        assert received == [("a/p1", ["app"])]
+    finally:
+        await optimizer.stop()
+    assert collector._listeners == []
@@ -0,0 +1,209 @@
+import asyncio
+import json
+import signal
+import sys
+from collections import Counter
+from datetime import datetime, timezone
+import pytest
+from aiohttp import web
+from guardian.pricing_sources import mock_pricing, record_pricing
+from guardian.sharding import HashRing, MemoryLeaseBackend, ShardCoordinator
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeLeaseApi:
+    """
+    Just enough of the Kubernetes Lease API: resourceVersion checks on writes, label selectors on lists.
+    """
+
+    def __init__(self):
+        self.leases = {}
+        self.version = 0
+        self.app = web.Application()
+        prefix = "/apis/coordination.k8s.io/v1/namespaces/{namespace}/leases"
+        self.app.router.add_get(prefix, self.list)
+        self.app.router.add_post(prefix, self.create)
+        self.app.router.add_get(prefix + "/{name}", self.get)
+        self.app.router.add_put(prefix + "/{name}", self.replace)
+        self.app.router.add_delete(prefix + "/{name}", self.delete)
+
+    def store(self, manifest):
+        self.version += 1
+        manifest["metadata"]["resourceVersion"] = str(self.version)
+        self.leases[manifest["metadata"]["name"]] = manifest
+        return web.json_response(manifest)
+
+    async def list(self, request):
+        key, _, value = request.query.get("labelSelector", "").partition("=")
+        items = [m for m in self.leases.values() if not key or m["metadata"].get("labels", {}).get(key) == value]
+        return web.json_response({"kind": "LeaseList", "items": items})
+
+    async def create(self, request):
+        manifest = await request.json()
+        if manifest["metadata"]["name"] in self.leases:
+            return web.json_response({"message": "already exists"}, status=409)
+        return self.store(manifest)
+
+    async def get(self, request):
+        if request.match_info["name"] not in self.leases:
+            return web.json_response({"message": "not found"}, status=404)
+        return web.json_response(self.leases[request.match_info["name"]])
+
+    async def replace(self, request):
+        manifest = await request.json()
+        current = self.leases.get(request.match_info["name"])
+        if current is None:
+            return web.json_response({"message": "not found"}, status=404)
+        if manifest["metadata"].get("resourceVersion") != current["metadata"]["resourceVersion"]:
+            return web.json_response({"message": "conflict"}, status=409)
+        return self.store(manifest)
+
+    async def delete(self, request):
+        options = await request.json()
+        current = self.leases.get(request.match_info["name"])
+        if current is None:
+            return web.json_response({"message": "not found"}, status=404)
+        if options["preconditions"]["resourceVersion"] != current["metadata"]["resourceVersion"]:
+            return web.json_response({"message": "conflict"}, status=409)
+        del self.leases[request.match_info["name"]]
+        return web.json_response({"status": "Success"})
+
+
+class Member:
+    def __init__(self, identity, process):
+        self.identity = identity
+        self.process = process
+        self.state = {}
+        self.reader = asyncio.create_task(self.read())
+
+    async def read(self):
+        async for line in self.process.stdout:
+            self.state = json.loads(line)
+
+
+async def wait_until(condition, timeout=20.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline, "timed out"
+        await asyncio.sleep(0.05)
+
+
+def test_hash_ring_balances_and_moves_only_departed_keys():
+    keys = [f"namespace-{i}" for i in range(3000)]
+    ring = HashRing(["r0", "r1", "r2", "r3"])
+    owners = {key: ring.owner(key) for key in keys}
+
+    assert all(600 < count < 900 for count in Counter(owners.values()).values())
+    assert HashRing(["r3", "r2", "r1", "r0"]).owner("namespace-7") == owners["namespace-7"] # Order does not matter
+
+    shrunk = HashRing(["r0", "r1", "r3"])
+    moved = [key for key in keys if shrunk.owner(key) != owners[key]]
+    assert moved and all(owners[key] == "r2" for key in moved)
+    assert HashRing().owner("namespace-1") is None
+
+
+@pytest.mark.asyncio
+async def test_coordinator_elects_one_leader_and_fails_over():
+    backend, clock = MemoryLeaseBackend(), FakeClock()
+    a, b = (ShardCoordinator(backend, name, address=f"{name}:8081", lease_duration=10, clock=clock) for name in ("a", "b"))
+    changes = []
+    b.add_listener(changes.append)
+    assert not a.owns("team-x") # Owns nothing before joining
+
+    await a.sync()
+    await b.sync()
+    await a.sync()
+    assert a.is_leader and not b.is_leader
+    assert b.leader_address == "a:8081"
+    assert a.members == b.members == ("a", "b")
+    keys = [f"team-{i}" for i in range(20)]
+    assert {k for k in keys if a.owns(k)} == {k for k in keys if not b.owns(k)}
+
+    # a stops renewing: b takes over once a's leases have gone unchanged for their
+    # duration since b first saw their latest version (at 6), whatever their renewTime
+    clock.now = 6
+    await b.sync()
+    clock.now = 15
+    await b.sync()
+    assert not b.is_leader and b.members == ("a", "b")
+    clock.now = 16
+    await b.sync()
+    assert b.is_leader and b.members == ("b",)
+    assert all(b.owns(k) for k in keys)
+    assert changes == [("a", "b"), ("b",)]
+    # The new leader cleaned up after the departed member
+    assert sorted(backend.leases) == ["leader", "member-b"]
+
+    # b leaves cleanly: its leases are released, so a leads right away
+    await b.stop()
+    clock.now = 17
+    await a.sync()
+    assert a.is_leader and a.members == ("a",)
+    assert not b.owns("team-1")
+
+
+@pytest.mark.asyncio
+async def test_replicas_shard_keys_and_share_pricing_across_processes(tmp_path):
+    api = FakeLeaseApi()
+    runner = web.AppRunner(api.app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    api_server = f"http://127.0.0.1:{runner.addresses[0][1]}"
+    pricing = tmp_path / "prices.csv"
+    now = datetime.now(timezone.utc)
+    record_pricing(pricing, [item.model_copy(update={"timestamp": now}) for item in mock_pricing()]) # One replay step
+    keys = [f"team-{i}" for i in range(30)]
+
+    async def spawn(identity):
+        process = await asyncio.create_subprocess_exec(
+            sys.executable, "-m", "guardian.sharding", "--api-server", api_server, "--identity", identity,
+            "--pricing", str(pricing), "--lease-duration", "1", "--refresh", "0.2", "--keys", *keys,
+            stdout=asyncio.subprocess.PIPE
+        )
+        return Member(identity, process)
+
+    members = [await spawn(f"r{i}") for i in range(3)]
+    try:
+        def settled(group, size):
+            # Everyone sees the same live leader, all members and the leader's pricing
+            if not all(len(m.state.get("members", [])) == size and m.state["items"] == 4 for m in group):
+                return False
+            leaders = {m.state["leader_identity"] for m in group}
+            return len(leaders) == 1 and leaders <= {m.identity for m in group}
+
+        await wait_until(lambda: settled(members, 3))
+        leaders = [m for m in members if m.state["leader"]]
+        assert len(leaders) == 1
+        owned = [set(m.state["owned"]) for m in members]
+        assert sum(map(len, owned)) == len(keys) and set().union(*owned) == set(keys)
+        # Only the leader calls the pricing source; followers copy its feed
+        assert leaders[0].state["fetched_upstream"]
+        assert all(m.state["replicated"] and not m.state["fetched_upstream"] for m in members if m is not leaders[0])
+
+        # The leader dies without releasing anything: the others elect a new one and take over its keys
+        leader = leaders[0]
+        leader.process.send_signal(signal.SIGKILL)
+        await leader.process.wait()
+        survivors = [m for m in members if m is not leader]
+        before = {m.identity: set(m.state["owned"]) for m in survivors}
+        await wait_until(lambda: settled(survivors, 2) and sum(len(m.state["owned"]) for m in survivors) == len(keys))
+        assert sum(m.state["leader"] for m in survivors) == 1
+        assert set().union(*(m.state["owned"] for m in survivors)) == set(keys)
+        assert all(before[m.identity] <= set(m.state["owned"]) for m in survivors) # Only the dead member's keys moved
+    finally:
+        for member in members:
+            if member.process.returncode is None:
+                member.process.terminate()
+            await member.process.wait()
+            await member.reader
+        await runner.cleanup()
+    assert [m.process.returncode for m in survivors] == [0, 0]
+    assert not api.leases # Members left cleanly and released their leases
@@ -0,0 +1,68 @@
+import json
+from datetime import datetime, timedelta, timezone
+import numpy as np
+from guardian.models import CloudPricing, CloudProvider, PlacementOption
+from guardian.pricing_sources import mock_pricing
+from guardian.tables import OptionTable, PriceRow, PricingTable
+
+
+def test_pricing_table_round_trips_through_row_views():
+    items = mock_pricing() + [
+        CloudPricing(provider=CloudProvider.AZURE, region="westeurope", instance_type="D2s_v3", price_on_demand=0.11, price_spot=0.03,
+                     currency="EUR", timestamp=datetime(2024, 3, 1, 12, tzinfo=timezone(timedelta(hours=2))))
+    ]
+    table = PricingTable.from_pricing(items)
+
+    assert len(table) == 5
+    # Categorical columns: sorted categories, one small code per row
+    assert list(table.region_names) == sorted({item.region for item in items})
+    assert table.region_codes.dtype == np.int32 and table.provider_codes.dtype == np.int8
+    assert list(table.regions) == [item.region for item in items]
+
+    row = table[4]
+    assert (row.provider, row.region, row.instance_type, row.currency) == (CloudProvider.AZURE, "westeurope", "D2s_v3", "EUR")
+    assert row.timestamp == datetime(2024, 3, 1, 10) # Normalized to naive UTC
+    assert table.to_pricing()[:4] == items[:4]
+
+    subset = table.take(np.array([2, 4]))
+    assert [r.region for r in subset] == ["us-central1", "westeurope"]
+    assert subset.region_names is table.region_names
+
+
+
+def test_feeds_concatenate_and_cross_the_wire_as_columns():
+    aws = PricingTable.from_rows([
+        PriceRow(CloudProvider.AWS, "us-east-1", "m5.large", 0.096, 0.035, "USD", datetime(2024, 1, 1)),
+    ])
+    azure = PricingTable.from_rows([
+        PriceRow(CloudProvider.AZURE, "westeurope", "D2s_v3", 0.11, 0.03, "EUR", datetime(2024, 1, 1)),
+        PriceRow(CloudProvider.AZURE, "eastus", "D2s_v3", 0.096, 0.025, "USD", datetime(2024, 1, 1)),
+    ])
+    empty = PricingTable.from_rows([])
+
+    table = PricingTable.concat([aws, empty, azure])
+    assert len(empty) == 0 and PricingTable.concat([empty, aws]) is aws
+    assert list(table.region_names) == ["eastus", "us-east-1", "westeurope"]
+    assert table.keys == [
+        (CloudProvider.AWS, "us-east-1", "m5.large"),
+        (CloudProvider.AZURE, "westeurope", "D2s_v3"),
+        (CloudProvider.AZURE, "eastus", "D2s_v3"),
+    ]
+    assert list(table.currencies) == ["USD", "EUR", "USD"]
+
+    copied = PricingTable.from_columns(json.loads(json.dumps(table.to_columns())))
+    assert copied.to_pricing() == table.to_pricing()
+
+def test_option_tables_share_pricing_columns():
+    pricing = PricingTable.from_pricing(mock_pricing())
+    costs = np.array([1.0, 2.0, 3.0, 4.0])
+    first = OptionTable.from_pricing(pricing, costs, costs * 10, np.full(4, 0.9))
+    second = OptionTable.from_pricing(pricing, costs * 2, costs * 10, np.full(4, 0.9))
+
+    assert first.regions is second.regions is pricing.regions
+    assert first.cloud_codes is pricing.provider_codes
+    assert first.option(2) == PlacementOption(
+        cloud=CloudProvider.GCP, region="us-central1", instance_type="e2-standard-2",
+        predicted_cost=3.0, predicted_latency=30.0, confidence_score=0.9
+    )
+    assert OptionTable.from_options(first.to_options()).regions.tolist() == first.regions.tolist()
@@ -0,0 +1,198 @@
+import pytest
+from guardian.metrics_collector import MetricsCollector
+from guardian.models import CloudPricing, CloudProvider
+from guardian.tables import PricingTable
+from guardian.workload_cache import WorkloadCache, parse_quantity
+
+
+class StaticSource:
+    name = "static"
+    ttl = float("inf")
+    timeout = None
+
+    def __init__(self, items):
+        self.table = PricingTable.from_pricing(items)
+
+    async def fetch(self):
+        return self.table
+
+    def fallback(self):
+        return self.table
+
+    async def close(self):
+        pass
+
+
+class CountingDict(dict):
+    """
+    Counts key lookups and full scans.
+    """
+
+    def __init__(self, *args):
+        super().__init__(*args)
+        self.reads = 0
+        self.scans = 0
+
+    def __getitem__(self, key):
+        self.reads += 1
+        return super().__getitem__(key)
+
+    def get(self, key, default=None):
+        self.reads += 1
+        return super().get(key, default)
+
+    def __iter__(self):
+        self.scans += 1
+        return super().__iter__()
+
+    def keys(self):
+        self.scans += 1
+        return super().keys()
+
+    def values(self):
+        self.scans += 1
+        return super().values()
+
+    def items(self):
+        self.scans += 1
+        return super().items()
+
+
+class FakeApiServer:
+    """
+    Holds objects and streams the watch events a real API server would send for them.
+    """
+
+    def __init__(self, cache):
+        self.handlers = {"deployments": cache.on_deployment, "pods": cache.on_pod, "nodes": cache.on_node}
+        self.objects = {}
+
+    def apply(self, kind, obj):
+        key = (kind, obj["metadata"].get("namespace"), obj["metadata"]["name"])
+        event_type = "MODIFIED" if key in self.objects else "ADDED"
+        self.objects[key] = obj
+        self.handlers[kind](event_type, obj)
+
+    def delete(self, kind, name, namespace=None):
+        obj = self.objects.pop((kind, namespace, name))
+        self.handlers[kind]("DELETED", obj)
+
+
+def deployment(name, labels, replicas=2, cpu="500m", memory="1Gi", namespace="shop"):
+    return {
+        "metadata": {"name": name, "namespace": namespace, "labels": labels},
+        "spec": {
+            "replicas": replicas,
+            "template": {"spec": {
+                "containers": [{"name": "app", "resources": {"requests": {"cpu": cpu, "memory": memory}}}],
+                "initContainers": [{"name": "migrate", "resources": {"requests": {"cpu": "100m"}}}],
+            }},
+        },
+    }
+
+
+def pod(name, owner, node, namespace="shop", template_hash="7d9f8c"):
+    return {
+        "metadata": {
+            "name": name, "namespace": namespace, "labels": {"pod-template-hash": template_hash},
+            "ownerReferences": [{"kind": "ReplicaSet", "name": f"{owner}-{template_hash}"}],
+        },
+        "spec": {"nodeName": node},
+        "status": {"phase": "Running"},
+    }
+
+
+def node(name, provider_id, region, instance_type, cpu="2"):
+    return {
+        "metadata": {"name": name, "labels": {
+            "topology.kubernetes.io/region": region, "node.kubernetes.io/instance-type": instance_type,
+        }},
+        "spec": {"providerID": provider_id},
+        "status": {"allocatable": {"cpu": cpu}},
+    }
+
+
+def test_parse_quantity():
+    assert parse_quantity("250m") == 0.25
+    assert parse_quantity("2") == 2.0
+    assert parse_quantity("512Mi") == 512 * 2 ** 20
+    assert parse_quantity("1G") == 1e9
+    with pytest.raises(ValueError):
+        parse_quantity("lots")
+
+
+def test_selectors_resolve_from_label_index():
+    cache = WorkloadCache()
+    api = FakeApiServer(cache)
+    api.apply("deployments", deployment("checkout", {"app": "checkout", "tier": "web"}, replicas=3))
+    api.apply("deployments", deployment("search", {"app": "search", "tier": "web"}))
+    api.apply("deployments", deployment("ledger", {"app": "ledger", "tier": "db"}, namespace="finance"))
+
+    assert [w.name for w in cache.resolve("shop", {"tier": "web"})] == ["checkout", "search"]
+    assert [w.name for w in cache.resolve("shop", {"tier": "web", "app": "search"})] == ["search"]
+    assert cache.resolve("shop", {"tier": "db"}) == []
+    assert [w.name for w in cache.resolve("finance", {})] == ["ledger"]
+
+    checkout = cache.get("shop", "checkout")
+    assert checkout.cpu_cores == pytest.approx(1.5) # 3 replicas x 500m
+    assert checkout.memory_gb == pytest.approx(3.0)
+
+    # Relabeling and deletion update the index
+    api.apply("deployments", deployment("search", {"app": "search", "tier": "batch"}))
+    assert [w.name for w in cache.resolve("shop", {"tier": "web"})] == ["checkout"]
+    api.delete("deployments", "checkout", "shop")
+    assert cache.resolve("shop", {"tier": "web"}) == []
+
+
+@pytest.mark.asyncio
+async def test_current_state_follows_pods_and_nodes():
+    cache = WorkloadCache()
+    api = FakeApiServer(cache)
+    api.apply("nodes", node("ip-10-0-0-1", "aws:///us-east-1a/i-0abc", "us-east-1", "m5.large"))
+    api.apply("nodes", node("gke-pool-1", "gce://proj/us-central1-a/gke-pool-1", "us-central1", "e2-standard-2"))
+    # Pods can arrive before their Deployment
+    api.apply("pods", pod("checkout-1", "checkout", "ip-10-0-0-1"))
+    api.apply("deployments", deployment("checkout", {"app": "checkout"}, replicas=2, cpu="1"))
+    api.apply("pods", pod("checkout-2", "checkout", "ip-10-0-0-1"))
+
+    collector = MetricsCollector(sources=[StaticSource([
+        CloudPricing(provider=CloudProvider.AWS, region="us-east-1", instance_type="m5.large", price_on_demand=0.1, price_spot=0.04)
+    ])], workload_cache=cache)
+    await collector.refresh()
+    state = await collector.get_current_state("checkout", "shop")
+    assert (state.current_cloud, state.current_region) == (CloudProvider.AWS, "us-east-1")
+    assert state.current_cost == pytest.approx(0.04 * 24) # Two pods, each half a 2-core node, at the spot price
+    assert state.current_latency == pytest.approx(20.0) # Not probed yet: nominal latency, not 0ms
+
+    # Rescheduled to GKE
+    api.delete("pods", "checkout-1", "shop")
+    api.delete("pods", "checkout-2", "shop")
+    api.apply("pods", pod("checkout-3", "checkout", "gke-pool-1"))
+    api.apply("pods", pod("checkout-4", "checkout", "gke-pool-1"))
+    state = await collector.get_current_state("checkout", "shop")
+    assert (state.current_cloud, state.current_region) == (CloudProvider.GCP, "us-central1")
+
+    with pytest.raises(LookupError):
+        await collector.get_current_state("unknown", "shop")
+
+
+def test_lookups_stay_fast_at_cluster_scale():
+    cache = WorkloadCache()
+    api = FakeApiServer(cache)
+    for n in range(200):
+        api.apply("nodes", node(f"node-{n}", "aws:///us-east-1a/i-0", "us-east-1", "m5.large", cpu="16"))
+    for d in range(2000):
+        api.apply("deployments", deployment(f"svc-{d}", {"app": f"svc-{d}", "team": f"team-{d % 50}"}, replicas=15, namespace="prod"))
+        for r in range(15):
+            api.apply("pods", pod(f"svc-{d}-{r}", f"svc-{d}", f"node-{(d + r) % 200}", namespace="prod"))
+    assert len(cache._pods) == 30000
+
+    # Count the work instead of timing it: lookups go through the indexes only
+    cache.workloads, cache._pods = CountingDict(cache.workloads), CountingDict(cache._pods)
+    for team in range(50):
+        matched = cache.resolve("prod", {"team": f"team-{team}"})
+        assert len(matched) == 40
+        assert all(cache.placement("prod", w.name).region == "us-east-1" for w in matched)
+    assert cache.workloads.scans == cache._pods.scans == 0
+    assert cache.workloads.reads == 50 * 40 * 2 # One read to resolve and one to place each match
+    assert cache._pods.reads == 50 * 40 * 15 # One per pod of the matched workloads